@@ -8,6 +8,15 @@ from .routes.auth import auth_routes
 from .routes.predict import predict_bp
 from .routes.model_params import model_params_bp
 from .routes.customer_transactions import customer_transaction_routes
+from .routes.analytics import analytics_routes
+from .utils.cache import feature_cache, prediction_cache
+from .utils.dashboard_stats import init_dashboard_stats
+from .utils.rollups import init_rollups
+from .utils.ingest import init_ingest
+from .utils.ingest_jobs import ingest_jobs
+from .utils.feature_engine import feature_engine
+from .utils.model_registry import model_registry
+from .utils.serializers import init_json
 # DISABLED: Removed scheduler import since we're not using automated test transactions
 # from .utils.scheduler import init_scheduler
 import os
@@ -25,6 +34,9 @@ def create_app(config_name='default'):
     # Load configuration from app/config.py
     app.config.from_object(config[config_name])
     
+    # jsonify() through orjson when it is installed
+    init_json(app)
+
     # Set up CORS
     CORS(app, resources={r"/*": {"origins": "*"}})
 
@@ -32,13 +44,34 @@ def create_app(config_name='default'):
     db.init_app(app)
     migrate = Migrate(app, db)
 
+    # Initialize the incremental sender feature store and the feature vector cache
+    feature_engine.init_app(app)
+    feature_cache.init_app(app)
+    prediction_cache.init_app(app, prefix="PREDICTION_CACHE")
+
+    # Configure lazy model loading
+    model_registry.init_app(app)
+
+    # Reconcile command and job for the materialized dashboard statistics
+    init_dashboard_stats(app)
+
+    # Rollup command and job for the /analytics time series
+    init_rollups(app)
+
+    # Background worker pool and resume command for CSV upload jobs
+    ingest_jobs.init_app(app)
+
+    # Dedupe command for MTNs loaded more than once before they were unique
+    init_ingest(app)
+
     # Initialize SocketIO with Flask app
     socketio.init_app(app, cors_allowed_origins="*")    # Register blueprints
     app.register_blueprint(transaction_routes, url_prefix="/transactions")
     app.register_blueprint(customer_transaction_routes, url_prefix="/customer-transactions")
     app.register_blueprint(auth_routes, url_prefix="/auth")
     app.register_blueprint(predict_bp, url_prefix="/model")
-    app.register_blueprint(model_params_bp, url_prefix="/model_params")# Create database tables
+    app.register_blueprint(model_params_bp, url_prefix="/model_params")
+    app.register_blueprint(analytics_routes, url_prefix="/analytics")# Create database tables
     with app.app_context():
         db.create_all()
     
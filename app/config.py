@@ -22,12 +22,62 @@ class Config:
     # Application configuration
     SECRET_KEY = os.getenv("SECRET_KEY", "fallback-app-secret-key-change-in-production")
 
+    # Feature engineering configuration
+    FEATURE_ENGINE_MODE = os.getenv("FEATURE_ENGINE_MODE", "incremental")  # "incremental" or "vectorized"
+    FEATURE_STATE_MAX_SENDERS = int(os.getenv("FEATURE_STATE_MAX_SENDERS", 10000))  # Senders kept in the incremental feature store
+    FEATURE_STATE_TTL = float(os.getenv("FEATURE_STATE_TTL", 3600))  # Seconds before a sender's incremental state is rebuilt from scratch anyway (0 disables)
+    FEATURE_STORE_READS = os.getenv("FEATURE_STORE_READS", "true").lower() == "true"  # Score from sender_features rows that are still current
+    FEATURE_CACHE_ENABLED = os.getenv("FEATURE_CACHE_ENABLED", "true").lower() == "true"  # In-process LRU/TTL cache of sender feature vectors
+    FEATURE_CACHE_MAX_SIZE = int(os.getenv("FEATURE_CACHE_MAX_SIZE", 10000))  # Senders kept in the cache
+    FEATURE_CACHE_TTL = float(os.getenv("FEATURE_CACHE_TTL", 30))  # Seconds before a cached vector is recomputed
+    FEATURE_CACHE_BACKEND = os.getenv("FEATURE_CACHE_BACKEND", "memory")  # "memory" (per worker) or "sqlite" (shared file)
+    FEATURE_CACHE_PATH = os.getenv("FEATURE_CACHE_PATH")  # SQLite file for the shared backend (default: in the temp dir)
+    PREDICTION_CACHE_ENABLED = os.getenv("PREDICTION_CACHE_ENABLED", "false").lower() == "true"  # Reuse model outputs for identical feature vectors
+    PREDICTION_CACHE_MAX_SIZE = int(os.getenv("PREDICTION_CACHE_MAX_SIZE", 10000))
+    PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", 300))
+    PREDICTION_CACHE_BACKEND = os.getenv("PREDICTION_CACHE_BACKEND", "memory")
+    PREDICTION_CACHE_PATH = os.getenv("PREDICTION_CACHE_PATH")
+
+    # Dashboard statistics configuration
+    DASHBOARD_STATS_RECONCILE_INTERVAL = float(os.getenv("DASHBOARD_STATS_RECONCILE_INTERVAL", 0))  # Seconds between full rebuilds of dashboard_stats (0 disables; see `flask reconcile-dashboard-stats`)
+
+    # Upload and export configuration
+    INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 50000))  # CSV rows parsed, inserted and committed per chunk
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))  # Background upload jobs run at once per process
+    INGEST_SPOOL_DIR = os.getenv("INGEST_SPOOL_DIR")  # Where uploads wait for their job (default: in the temp dir; share it between hosts)
+    INGEST_JOB_STALE_AFTER = float(os.getenv("INGEST_JOB_STALE_AFTER", 300))  # Seconds without a committed chunk before a running job counts as crashed
+    INGEST_RESUME_INTERVAL = float(os.getenv("INGEST_RESUME_INTERVAL", 0))  # Seconds between sweeps resuming crashed upload jobs (0 disables; see `flask resume-ingest-jobs`)
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 50000))  # Rows per Arrow record batch / Parquet row group in /export downloads
+    STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 5000))  # Rows fetched from the cursor and written per chunk by /all_stream
+    STREAM_GZIP_LEVEL = int(os.getenv("STREAM_GZIP_LEVEL", 6))  # zlib level (1 fastest .. 9 smallest) for gzip-encoded /all_stream responses
+
+    # Response serialization
+    JSON_ENCODER = os.getenv("JSON_ENCODER", "orjson")  # "orjson" (used when installed) or "stdlib" for jsonify() responses
+
+    # Analytics configuration
+    ROLLUP_INTERVAL = float(os.getenv("ROLLUP_INTERVAL", 0))  # Seconds between runs of the hourly/daily rollup job (0 disables; see `flask rollup-transactions`)
+
+    # Prediction configuration
+    PREDICT_BATCH_MAX_SIZE = int(os.getenv("PREDICT_BATCH_MAX_SIZE", 10000))  # Max transactions per /model/predict/batch call
+    INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "sklearn")  # "sklearn" or "compiled" (flat-array tree evaluator)
+
+    # Model loading configuration
+    MODEL_FILE = os.getenv("MODEL_FILE")  # Defaults to random_forest_model.pkl in the project root
+    MODEL_MMAP_MODE = os.getenv("MODEL_MMAP_MODE")  # e.g. "r" to memory-map model arrays shared across workers
+    MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR")  # Where the compiled export is written (default: <MODEL_FILE>.compiled)
+    MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "false").lower() == "true"  # Load at startup instead of on first request
+    MODEL_VERSION = os.getenv("MODEL_VERSION", "v1.0")  # Version recorded on transactions scored by MODEL_FILE
+    MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", 0))  # Seconds between checks for a replaced MODEL_FILE (0 disables)
+    MODEL_POINTER_FILE = os.getenv("MODEL_POINTER_FILE")  # Where /model/versions publishes the active version to every worker (default: active_model.json next to MODEL_FILE)
+    MODEL_SYNC_INTERVAL = float(os.getenv("MODEL_SYNC_INTERVAL", 5))  # Seconds between each worker's checks of MODEL_POINTER_FILE (0 disables)
+
 class DevelopmentConfig(Config):
     DEBUG = True
 
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    MODEL_SYNC_INTERVAL = 0  # Tests drive sync_active_version() themselves
 
 class ProductionConfig(Config):
     DEBUG = False
@@ -1,6 +1,8 @@
 from .database import db
+from .utils.serializers import row_serializer
 from sqlalchemy.sql import func
-from datetime import timedelta
+from datetime import datetime, timedelta
+import json
 
 
 class User(db.Model):
@@ -57,8 +59,25 @@ class Transaction(db.Model):
     compliance_release_date = db.Column(db.DateTime, nullable=True)
     sender_status_detail = db.Column(db.String(255), nullable=True)
 
+    # Indexes matching each listing's filter and ORDER BY sending_date DESC, id DESC
+    __table_args__ = (
+        db.Index('ix_transactions_sender_date', sender_id, sending_date.desc(), id.desc()),
+        db.Index('ix_transactions_beneficiary_date', beneficiary_client_id, sending_date.desc(), id.desc()),
+        db.Index('ix_transactions_status_date', status, sending_date.desc(), id.desc()),
+        db.Index('ix_transactions_sending_date', sending_date.desc(), id.desc()),
+        # Feature engineering: a sender's rows in id order, max(id)/count(id) watermarks
+        db.Index('ix_transactions_sender_id_id', sender_id, id),
+        # /transactions/stats: senders per predicted label
+        db.Index('ix_transactions_status_detail_sender', sender_status_detail, sender_id),
+        # Loading the same MTN again is a duplicate (rows without an MTN are not checked)
+        db.Index('uq_transactions_mtn', mtn, unique=True),
+    )
+
     def to_dict(self):
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return serialize_transaction(self)
+
+# Every column, by name: built once from the table instead of per row
+serialize_transaction = row_serializer(Transaction.__table__)
 
 class Notification(db.Model):
     __tablename__ = 'notifications'
@@ -75,6 +94,13 @@ class Notification(db.Model):
     created_at = db.Column(db.DateTime, default=func.now())  # Timestamp for the notification
     is_read = db.Column(db.Boolean, default=False)  # Whether the notification has been read
 
+    # /transactions/notifications filters (user_id, status, hours) newest first
+    __table_args__ = (
+        db.Index('ix_notifications_user_created', user_id, created_at.desc(), id.desc()),
+        db.Index('ix_notifications_status_created', status, created_at.desc(), id.desc()),
+        db.Index('ix_notifications_created', created_at.desc(), id.desc()),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -120,7 +146,7 @@ class SenderFeatures(db.Model):
     __tablename__ = 'sender_features'
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    sender_id = db.Column(db.String(50), nullable=False, index=True)
+    sender_id = db.Column(db.String(50), nullable=False, unique=True, index=True)  # One row per sender (upsert key)
     created_at = db.Column(db.DateTime, default=func.now())
     updated_at = db.Column(db.DateTime, default=func.now(), onupdate=func.now())
     
@@ -157,6 +183,11 @@ class SenderFeatures(db.Model):
     # Standard deviation features
     sd_trx_diff = db.Column(db.Float, nullable=False)
     sd_trx_vol = db.Column(db.Float, nullable=False)
+
+    # Watermark: highest transactions.id included when the features were computed
+    last_transaction_id = db.Column(db.Integer, nullable=True)
+    # ...and the sender's sender_revisions.revision at that time
+    revision = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     def to_dict(self):
         return {
@@ -179,10 +210,175 @@ class SenderFeatures(db.Model):
             "Paid %": self.paid_percentage,
             "SD Trx Diff": self.sd_trx_diff,
             "SD Trx Vol": self.sd_trx_vol,
+            "last_transaction_id": self.last_transaction_id,
+            "revision": self.revision,
             "created_at": self.created_at,
             "updated_at": self.updated_at
         }
 
+class SenderRevision(db.Model):
+    """
+    Per-sender change counter, bumped whenever a sender's transactions are
+    updated in place (an on_duplicate=update upload). Inserts and deletes
+    already move the (max id, count) watermark; an update moves neither, so
+    features computed before it carry an older revision and are recomputed.
+    Senders without a row are at revision 0.
+    """
+    __tablename__ = 'sender_revisions'
+
+    sender_id = db.Column(db.String(50), primary_key=True)
+    revision = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=func.now(), onupdate=func.now())
+
+class DashboardStats(db.Model):
+    """
+    Running totals behind the /stats endpoints, one row per transactions table.
+    Maintained by app/utils/dashboard_stats.py as rows are inserted.
+    """
+    __tablename__ = 'dashboard_stats'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    scope = db.Column(db.String(50), nullable=False, unique=True)  # "transactions" or "customer_transactions"
+
+    total_transactions = db.Column(db.Integer, nullable=False, default=0)
+    genuine_transactions = db.Column(db.Integer, nullable=False, default=0)
+    suspicious_transactions = db.Column(db.Integer, nullable=False, default=0)
+    total_customers = db.Column(db.Integer, nullable=False, default=0)
+    genuine_customers = db.Column(db.Integer, nullable=False, default=0)  # Customers with only Genuine transactions
+    suspicious_customers = db.Column(db.Integer, nullable=False, default=0)  # Customers with only Suspicious transactions
+    total_volume = db.Column(db.Float, nullable=False, default=0)
+    genuine_volume = db.Column(db.Float, nullable=False, default=0)
+    suspicious_volume = db.Column(db.Float, nullable=False, default=0)
+
+    is_stale = db.Column(db.Boolean, nullable=False, default=False)  # An incremental update failed; rebuilt on next read
+    reconciled_at = db.Column(db.DateTime, nullable=True)  # Last full rebuild
+    updated_at = db.Column(db.DateTime, default=func.now(), onupdate=func.now())
+
+    def to_dict(self):
+        return {
+            "total_transactions": self.total_transactions,
+            "total_customers": self.total_customers,
+            "genuine_transactions": self.genuine_transactions,
+            "suspicious_transactions": self.suspicious_transactions,
+            "genuine_customers": self.genuine_customers,
+            "suspicious_customers": self.suspicious_customers,
+            "mixed_customers": self.total_customers - self.genuine_customers - self.suspicious_customers,
+            "total_volume": self.total_volume,
+            "genuine_volume": self.genuine_volume,
+            "suspicious_volume": self.suspicious_volume,
+        }
+
+
+class DashboardSenderLabel(db.Model):
+    """Labels seen so far for each customer, used to keep the customer classification in DashboardStats current"""
+    __tablename__ = 'dashboard_sender_labels'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    scope = db.Column(db.String(50), nullable=False)
+    customer_id = db.Column(db.String(50), nullable=False)  # Transactions without a sender are grouped under ""
+    labels = db.Column(db.Integer, nullable=False, default=0)  # Bitmask: 1 = Genuine, 2 = Suspicious
+
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'customer_id', name='uq_dashboard_sender_labels_scope_customer'),
+    )
+
+
+class TransactionRollup(db.Model):
+    """
+    Hourly and daily totals per sending/payout country, channel and payment
+    method. Filled incrementally by app/utils/rollups.py and read by /analytics.
+    """
+    __tablename__ = 'transaction_rollups'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    scope = db.Column(db.String(50), nullable=False)  # "transactions" or "customer_transactions"
+    granularity = db.Column(db.String(10), nullable=False)  # "hour" or "day"
+    bucket_start = db.Column(db.DateTime, nullable=False)
+
+    # Dimensions ("" when the transaction had no value)
+    sending_country = db.Column(db.String(100), nullable=False, default="")
+    payout_country = db.Column(db.String(100), nullable=False, default="")
+    channel = db.Column(db.String(100), nullable=False, default="")
+    payment_method = db.Column(db.String(50), nullable=False, default="")
+
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    total_volume = db.Column(db.Float, nullable=False, default=0)
+    suspicious_count = db.Column(db.Integer, nullable=False, default=0)
+
+    # The upsert key; its (scope, granularity, bucket_start) prefix also serves the time-range reads
+    __table_args__ = (
+        db.UniqueConstraint(
+            'scope', 'granularity', 'bucket_start', 'sending_country', 'payout_country', 'channel', 'payment_method',
+            name='uq_transaction_rollups_bucket',
+        ),
+    )
+
+
+class RollupWatermark(db.Model):
+    """Highest transaction id already folded into transaction_rollups, and how many rows it covers, per scope"""
+    __tablename__ = 'rollup_watermarks'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    scope = db.Column(db.String(50), nullable=False, unique=True)
+    last_transaction_id = db.Column(db.Integer, nullable=False, default=0)
+    # Transactions with id <= last_transaction_id counted so far; NULL until reconcile_rollups() has checked them
+    transaction_count = db.Column(db.Integer, nullable=True, default=0)
+    updated_at = db.Column(db.DateTime, default=func.now(), onupdate=func.now())
+
+
+class IngestJob(db.Model):
+    """
+    A CSV upload being ingested in the background. The counters are saved
+    in the same transaction as each chunk, so they always describe what is
+    committed and a crashed job resumes after rows_read
+    """
+    __tablename__ = 'ingest_jobs'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    filename = db.Column(db.String(255), nullable=True)  # Name of the uploaded or local file
+    source_path = db.Column(db.String(1024), nullable=False)  # File the job reads
+    delete_source = db.Column(db.Boolean, nullable=False, default=False)  # Spooled upload, removed once ingested
+    on_duplicate = db.Column(db.String(10), nullable=False, default='skip')  # Rows whose MTN is already loaded: skip or update
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, completed, failed
+    rows_read = db.Column(db.Integer, nullable=False, default=0)
+    rows_inserted = db.Column(db.Integer, nullable=False, default=0)
+    rows_updated = db.Column(db.Integer, nullable=False, default=0)
+    rows_duplicate = db.Column(db.Integer, nullable=False, default=0)  # Rows skipped because their MTN was already loaded
+    skipped_rows = db.Column(db.Text, nullable=True)  # JSON list of {"index", "error"}
+    chunks = db.Column(db.Integer, nullable=False, default=0)
+    elapsed_seconds = db.Column(db.Float, nullable=False, default=0)  # Time spent ingesting, across resumes
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=func.now())
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)  # Last claim or committed chunk; stale means the worker died
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        skipped_rows = json.loads(self.skipped_rows) if self.skipped_rows else []
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "on_duplicate": self.on_duplicate,
+            "rows_read": self.rows_read,
+            "rows_inserted": self.rows_inserted,
+            "rows_updated": self.rows_updated,
+            "rows_duplicate": self.rows_duplicate,
+            "rows_skipped": len(skipped_rows),
+            "skipped_rows": skipped_rows,
+            "chunks": self.chunks,
+            "seconds": round(self.elapsed_seconds or 0, 3),
+            "rows_per_second": round(self.rows_inserted / self.elapsed_seconds, 1) if self.elapsed_seconds else 0,
+            "error": self.error,
+            "attempts": self.attempts,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "heartbeat_at": self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
 class CustomerTransaction(db.Model):
     """
     Model for live customer transactions (real transactions from customers)
@@ -244,8 +440,18 @@ class CustomerTransaction(db.Model):
     reviewed_by = db.Column(db.String(100), nullable=True)  # Who reviewed the transaction
     reviewed_at = db.Column(db.DateTime, nullable=True)  # When it was reviewed
 
+    # Indexes matching each listing's filter and ORDER BY
+    __table_args__ = (
+        db.Index('ix_customer_transactions_created', created_at.desc(), id.desc()),
+        db.Index('ix_customer_transactions_flagged_created', is_flagged, created_at.desc(), id.desc()),
+        db.Index('ix_customer_transactions_sending_date', sending_date.desc(), id.desc()),
+        db.Index('ix_customer_transactions_customer_date', customer_id, sending_date.desc(), id.desc()),
+        # /customer-transactions/stats: customers per predicted label
+        db.Index('ix_customer_transactions_status_detail_customer', sender_status_detail, customer_id),
+    )
+
     def to_dict(self):
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return serialize_customer_transaction(self)
 
     def to_dict_with_metadata(self):
         """Extended dict with additional metadata for frontend"""
@@ -253,6 +459,9 @@ class CustomerTransaction(db.Model):
         base_dict.update({
             'is_live_transaction': True,
             'transaction_type': 'customer',
-            'days_since_prediction': (func.now() - self.prediction_timestamp).days if self.prediction_timestamp else 0
+            'days_since_prediction': (datetime.now() - self.prediction_timestamp).days if self.prediction_timestamp else 0
         })
         return base_dict
+
+
+serialize_customer_transaction = row_serializer(CustomerTransaction.__table__)
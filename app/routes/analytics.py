@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+from flask import Blueprint, request, jsonify
+from sqlalchemy import func
+
+from ..database import db
+from ..models import TransactionRollup
+from ..utils.dashboard_stats import SCOPES
+from ..utils.rollups import DIMENSIONS, GRANULARITIES, rollup_status, truncate
+from ..utils.streaming import parse_iso_bound
+
+analytics_routes = Blueprint("analytics", __name__)
+
+# Window returned when no start date is given
+DEFAULT_SPAN = {"hour": timedelta(hours=48), "day": timedelta(days=90)}
+
+
+@analytics_routes.route("/timeseries", methods=["GET"])
+def get_timeseries():
+    """
+    Transaction count, volume, suspicious count and fraud rate per hour or day,
+    read from the rollup tables (never from the transactions themselves).
+
+    Query parameters: granularity (hour|day, default day), start/end (ISO
+    dates, inclusive; a bare end date includes that whole day; end defaults
+    to the latest bucket), group_by (one dimension), scope
+    (transactions|customer_transactions), and any dimension as a filter,
+    e.g. ?sending_country=US&channel=APP
+    """
+    try:
+        granularity = request.args.get("granularity", "day")
+        scope = request.args.get("scope", "transactions")
+        group_by = request.args.get("group_by")
+        if granularity not in GRANULARITIES:
+            return jsonify({"error": f"granularity must be one of {', '.join(GRANULARITIES)}"}), 400
+        if scope not in SCOPES:
+            return jsonify({"error": f"scope must be one of {', '.join(SCOPES)}"}), 400
+        if group_by is not None and group_by not in DIMENSIONS:
+            return jsonify({"error": f"group_by must be one of {', '.join(DIMENSIONS)}"}), 400
+
+        try:
+            start = request.args.get("start")
+            end = request.args.get("end")
+            start = parse_iso_bound(start)[0] if start else None
+            end, end_whole_day = parse_iso_bound(end) if end else (None, False)
+        except ValueError:
+            return jsonify({"error": "start and end must be ISO dates, e.g. 2024-01-31 or 2024-01-31T12:00"}), 400
+
+        R = TransactionRollup
+        query = db.session.query(R).filter(R.scope == scope, R.granularity == granularity)
+        for dimension in DIMENSIONS:
+            value = request.args.get(dimension)
+            if value is not None:
+                query = query.filter(getattr(R, dimension) == value)
+
+        if end is None:
+            end = db.session.query(func.max(R.bucket_start)).filter(
+                R.scope == scope, R.granularity == granularity
+            ).scalar() or datetime.now()
+        if start is None:
+            start = end - DEFAULT_SPAN[granularity]
+        start = truncate(start, granularity)
+
+        columns = [R.bucket_start] + ([getattr(R, group_by)] if group_by else [])
+        before_end = R.bucket_start < end + timedelta(days=1) if end_whole_day else R.bucket_start <= end
+        rows = query.filter(R.bucket_start >= start, before_end).with_entities(
+            *columns,
+            func.sum(R.transaction_count),
+            func.sum(R.total_volume),
+            func.sum(R.suspicious_count),
+        ).group_by(*columns).order_by(*columns).all()
+
+        series = []
+        for bucket, *group, count, volume, suspicious in rows:
+            count, suspicious = int(count), int(suspicious)
+            point = {"bucket": bucket.isoformat()}
+            if group_by:
+                point[group_by] = group[0]
+            point.update({
+                "transaction_count": count,
+                "total_volume": float(volume),
+                "suspicious_count": suspicious,
+                "fraud_rate": suspicious / count if count else 0,
+            })
+            series.append(point)
+
+        return jsonify({
+            "scope": scope,
+            "granularity": granularity,
+            "group_by": group_by,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "series": series,
+            "rollup": rollup_status([scope])[scope],  # Watermark and transactions not yet rolled up
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@analytics_routes.route("/rollups", methods=["GET"])
+def get_rollup_status():
+    """Rollup watermark and backlog per transactions table"""
+    try:
+        return jsonify(rollup_status()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,7 +1,14 @@
 from flask import Blueprint, request, jsonify
 from ..models import CustomerTransaction, Notification
 from ..database import db
+from ..utils.columnar import export_response
+from ..utils.dashboard_stats import read_dashboard_stats, record_inserts
+from ..utils.pagination import PaginationError, paginate
+from ..utils.serializers import FieldsError, project_fields
+from ..utils.stats import status_summary
+from ..utils.streaming import stream_response
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, date
 
 customer_transaction_routes = Blueprint("customer_transactions", __name__)
@@ -10,55 +17,39 @@ customer_transaction_routes = Blueprint("customer_transactions", __name__)
 def get_customer_transaction_stats():
     """Get statistics for live customer transactions only"""
     try:
-        total_transactions = CustomerTransaction.query.count()
-        genuine_transactions = CustomerTransaction.query.filter(CustomerTransaction.sender_status_detail == "Genuine").count()
-        suspicious_transactions = CustomerTransaction.query.filter(CustomerTransaction.sender_status_detail == "Suspicious").count()
-        
-        # Calculate unique customers (using customer_id as primary identifier)
-        total_customers = db.session.query(CustomerTransaction.customer_id).distinct().count()
-        
-        # Calculate pure genuine customers (customers with ONLY genuine transactions)
-        genuine_only_customers = db.session.query(CustomerTransaction.customer_id).filter(
-            CustomerTransaction.sender_status_detail == "Genuine"
-        ).distinct().except_(
-            db.session.query(CustomerTransaction.customer_id).filter(
-                CustomerTransaction.sender_status_detail == "Suspicious"
-            ).distinct()
-        ).count()
-        
-        # Calculate pure suspicious customers (customers with ONLY suspicious transactions)
-        suspicious_only_customers = db.session.query(CustomerTransaction.customer_id).filter(
-            CustomerTransaction.sender_status_detail == "Suspicious"
-        ).distinct().except_(
-            db.session.query(CustomerTransaction.customer_id).filter(
-                CustomerTransaction.sender_status_detail == "Genuine"
-            ).distinct()
-        ).count()
-        
-        # Calculate mixed customers (customers with both genuine and suspicious transactions)
-        mixed_customers = total_customers - genuine_only_customers - suspicious_only_customers
-        
-        # Calculate total transaction volume
-        total_volume = db.session.query(func.sum(CustomerTransaction.total_sale)).scalar() or 0
-        genuine_volume = db.session.query(func.sum(CustomerTransaction.total_sale)).filter(
-            CustomerTransaction.sender_status_detail == "Genuine").scalar() or 0
-        suspicious_volume = db.session.query(func.sum(CustomerTransaction.total_sale)).filter(
-            CustomerTransaction.sender_status_detail == "Suspicious").scalar() or 0
+        # Counts, customer classification and volumes from the maintained summary row
+        try:
+            stats = read_dashboard_stats("customer_transactions")
+        except Exception as e:
+            db.session.rollback()
+            print(f"[ERROR] Dashboard stats unavailable, computing live: {str(e)}")
+            stats = status_summary(CustomerTransaction, CustomerTransaction.customer_id)
+        stats["data_source"] = "live_customer_transactions"  # Indicator that this is live data
 
-        return jsonify({
-            "total_transactions": total_transactions,
-            "total_customers": total_customers,
-            "genuine_transactions": genuine_transactions,
-            "suspicious_transactions": suspicious_transactions,
-            "genuine_customers": genuine_only_customers,
-            "suspicious_customers": suspicious_only_customers,
-            "mixed_customers": mixed_customers,
-            "total_volume": total_volume,
-            "genuine_volume": genuine_volume,
-            "suspicious_volume": suspicious_volume,
-            "data_source": "live_customer_transactions"  # Indicator that this is live data
-        }), 200
+        return jsonify(stats), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@customer_transaction_routes.route("/export", methods=["GET"])
+def export_customer_transactions():
+    """Stream live customer transactions as Parquet or Arrow for offline training"""
+    try:
+        return export_response(CustomerTransaction)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ImportError as e:
+        return jsonify({"error": str(e)}), 501
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
+@customer_transaction_routes.route("/all_stream", methods=["GET"])
+def stream_customer_transactions():
+    """Stream live customer transactions as NDJSON (filters: start, end, customer_id, sender_id, status; fields; gzip if accepted)"""
+    try:
+        return stream_response(CustomerTransaction)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -66,26 +57,27 @@ def get_customer_transaction_stats():
 def get_all_customer_transactions():
     """Get all customer transactions with pagination"""
     try:
-        # Get pagination parameters
-        page = request.args.get('page', default=1, type=int)
-        per_page = request.args.get('per_page', default=50, type=int)
-        
-        # Query the database with pagination
-        transactions = CustomerTransaction.query.order_by(
-            CustomerTransaction.created_at.desc()
-        ).paginate(page=page, per_page=per_page, error_out=False)
+        # Select and return only the ?fields= columns, if given
+        query, serialize = project_fields(CustomerTransaction.query, CustomerTransaction,
+                                          CustomerTransaction.to_dict_with_metadata, keep=[CustomerTransaction.created_at])
+
+        # Query the database with pagination, newest first
+        transactions = paginate(query, CustomerTransaction.id, CustomerTransaction.created_at)
         
         # Serialize results
-        result = [transaction.to_dict_with_metadata() for transaction in transactions.items]
+        result = [serialize(transaction) for transaction in transactions.items]
         
         return jsonify({
             "total": transactions.total,
             "page": transactions.page,
             "per_page": transactions.per_page,
             "total_pages": transactions.pages,
+            **transactions.metadata(),
             "transactions": result,
             "data_source": "live_customer_transactions"
         }), 200
+    except (PaginationError, FieldsError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -100,33 +92,33 @@ def get_customer_transactions_by_date():
         if not start_date or not end_date:
             return jsonify({"error": "Start date and end date are required"}), 400
 
-        # Get pagination parameters
-        page = request.args.get('page', default=1, type=int)
-        per_page = request.args.get('per_page', default=50, type=int)
-        
         # Build the query with date filter
         query = CustomerTransaction.query.filter(
             CustomerTransaction.sending_date.between(start_date, end_date)
         )
         
-        # Add sorting for consistent pagination
-        query = query.order_by(CustomerTransaction.sending_date.desc(), CustomerTransaction.id.desc())
-        
-        # Apply pagination
-        paginated_transactions = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Select and return only the ?fields= columns, if given
+        query, serialize = project_fields(query, CustomerTransaction, CustomerTransaction.to_dict_with_metadata,
+                                          keep=[CustomerTransaction.sending_date])
+
+        # Apply pagination, sorted by date and then id
+        paginated_transactions = paginate(query, CustomerTransaction.id, CustomerTransaction.sending_date)
         
         # Serialize the paginated results
-        results = [t.to_dict_with_metadata() for t in paginated_transactions.items]
+        results = [serialize(t) for t in paginated_transactions.items]
         
         return jsonify({
             "total": paginated_transactions.total,
-            "page": page,
-            "per_page": per_page,
+            "page": paginated_transactions.page,
+            "per_page": paginated_transactions.per_page,
             "total_pages": paginated_transactions.pages,
+            **paginated_transactions.metadata(),
             "transactions": results,
             "data_source": "live_customer_transactions"
         }), 200
 
+    except (PaginationError, FieldsError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -139,32 +131,32 @@ def get_transactions_by_customer():
         if not customer_id:
             return jsonify({"error": "Customer ID is required"}), 400
 
-        # Get pagination parameters
-        page = request.args.get('page', default=1, type=int)
-        per_page = request.args.get('per_page', default=50, type=int)
-        
         # Build the query with customer filter
         query = CustomerTransaction.query.filter_by(customer_id=customer_id)
         
-        # Add sorting for consistent pagination
-        query = query.order_by(CustomerTransaction.sending_date.desc(), CustomerTransaction.id.desc())
-        
-        # Apply pagination
-        paginated_transactions = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Select and return only the ?fields= columns, if given
+        query, serialize = project_fields(query, CustomerTransaction, CustomerTransaction.to_dict_with_metadata,
+                                          keep=[CustomerTransaction.sending_date])
+
+        # Apply pagination, sorted by date and then id
+        paginated_transactions = paginate(query, CustomerTransaction.id, CustomerTransaction.sending_date)
         
         # Serialize the paginated results
-        results = [t.to_dict_with_metadata() for t in paginated_transactions.items]
+        results = [serialize(t) for t in paginated_transactions.items]
         
         return jsonify({
             "total": paginated_transactions.total,
-            "page": page,
-            "per_page": per_page,
+            "page": paginated_transactions.page,
+            "per_page": paginated_transactions.per_page,
             "total_pages": paginated_transactions.pages,
+            **paginated_transactions.metadata(),
             "transactions": results,
             "customer_id": customer_id,
             "data_source": "live_customer_transactions"
         }), 200
 
+    except (PaginationError, FieldsError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -212,6 +204,8 @@ def create_customer_transaction():
         )
 
         db.session.add(transaction)
+        db.session.flush()  # A missing customer_id fails here, before the dashboard is touched
+        record_inserts([transaction])
         db.session.commit()
 
         return jsonify({
@@ -219,6 +213,9 @@ def create_customer_transaction():
             "transaction": transaction.to_dict_with_metadata()
         }), 201
 
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify({"error": f"Invalid customer transaction: {e.orig}"}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -227,28 +224,30 @@ def create_customer_transaction():
 def get_flagged_transactions():
     """Get all flagged transactions requiring review"""
     try:
-        # Get pagination parameters
-        page = request.args.get('page', default=1, type=int)
-        per_page = request.args.get('per_page', default=50, type=int)
-        
         # Query flagged transactions
         query = CustomerTransaction.query.filter_by(is_flagged=True)
-        query = query.order_by(CustomerTransaction.created_at.desc())
         
-        # Apply pagination
-        paginated_transactions = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Select and return only the ?fields= columns, if given
+        query, serialize = project_fields(query, CustomerTransaction, CustomerTransaction.to_dict_with_metadata,
+                                          keep=[CustomerTransaction.created_at])
+
+        # Apply pagination, newest first
+        paginated_transactions = paginate(query, CustomerTransaction.id, CustomerTransaction.created_at)
         
         # Serialize results
-        results = [t.to_dict_with_metadata() for t in paginated_transactions.items]
+        results = [serialize(t) for t in paginated_transactions.items]
         
         return jsonify({
             "total": paginated_transactions.total,
-            "page": page,
-            "per_page": per_page,
+            "page": paginated_transactions.page,
+            "per_page": paginated_transactions.per_page,
             "total_pages": paginated_transactions.pages,
+            **paginated_transactions.metadata(),
             "transactions": results,
             "data_source": "flagged_customer_transactions"
         }), 200
+    except (PaginationError, FieldsError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
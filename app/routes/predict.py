@@ -1,226 +1,183 @@
-from flask import Blueprint, request, jsonify
-import joblib
-import numpy as np
+from flask import Blueprint, request, jsonify, current_app
+from collections import namedtuple
+from functools import wraps
+import hashlib
 import os
-import pandas as pd
+import numpy as np
 from flask_socketio import emit
 from sqlalchemy.orm.exc import NoResultFound
 from app import db, socketio
 from app.models import Transaction, CustomerTransaction, Notification, User, SenderFeatures
+from app.routes.auth import token_required
+from app.utils.cache import feature_cache, prediction_cache
+from app.utils.dashboard_stats import record_inserts
+from app.utils.feature_engine import feature_engine
+from app.utils.feature_kernel import features_for_senders
+from app.utils.feature_store import (
+    feature_store_stats, read_fresh_features, sender_feature_row, sender_revisions, upsert_sender_features
+)
+from app.utils.inference import FEATURES, Prediction
+from app.utils.model_registry import model_registry
 from datetime import datetime, timedelta
 from sqlalchemy import func
 
 # Define a new blueprint for predictions
 predict_bp = Blueprint('predict', __name__)
 
-# Load the trained ML model
-MODEL_FILE = os.path.join(os.path.dirname(__file__), '../../random_forest_model.pkl')
-
-if os.path.exists(MODEL_FILE):
-    model = joblib.load(MODEL_FILE)
-    print("✅ Model loaded successfully.")
-else:
-    model = None
-    print("❌ ERROR: Model file not found!")
-
-# Define the feature order used in model training
-FEATURES = [
-    "Total Trx", "Total Beneficiaries", "Total Paid out Trx", 
-    "Avg Top 05 Daily Trx", "SD of Top 5 Trx_M", "SD of Top 5 Trx_N",
-    "Avg top Volumes", "Std Dev Vol_M", "Std Dev Vol_N", 
-    "Date Differences Max", "Date Differences Avg", "Length of Seq",
-    "Avg Top 05 ATV", "Avg Bottom ATV", "Std Dev ATV", 
-    "Date Differences Avg", "Date Differences Max", "Paid %", 
-    "SD Trx Diff", "SD Trx Vol"
-]
+def get_inference():
+    """The active InferenceModel, loaded lazily by the model registry (None if the model file is missing)"""
+    return model_registry.get()
+
+# Where extract_features_for_sender found a sender's features: source is
+# "cache", "store" (a current SenderFeatures row) or "computed"; watermark
+# is the sender's Watermark when it was read from the database
+FeatureLookup = namedtuple("FeatureLookup", ["features", "source", "watermark"])
 
 def extract_features_for_sender(sender_id):
     """
-    Perform feature engineering on transactions for a specific sender_id
-    Returns a dictionary of features needed for model prediction
-    Also stores the features in the database for future use
+    Get the features needed for model prediction for a specific sender_id
+    Returns a FeatureLookup (features is None when the sender has no history,
+    or when there is no sender_id: transactions without a sender are not
+    treated as one sender's history)
+
+    Sources are tried cheapest first: the feature cache (shared between
+    workers with the sqlite backend), the stored SenderFeatures row if no
+    transaction arrived since it was written, and finally feature
+    engineering, which is maintained incrementally per sender (see
+    app/utils/feature_engine.py). Concurrent misses for the same sender are
+    computed once. Nothing is written to the database here;
+    store_sender_features() persists computed features as part of the
+    caller's transaction.
+
+    Cache entries carry the sender's revision and are ignored once another
+    worker has updated the sender's transactions in place.
+    """
+    if sender_id is None:
+        return FeatureLookup(None, "no sender", None)
+    lookup = {"source": "cache", "watermark": None}
+    revision = sender_revisions([sender_id]).get(sender_id, 0)
+
+    def load():
+        watermark = None
+        if current_app.config.get("FEATURE_STORE_READS", True):
+            fresh, watermarks = read_fresh_features([sender_id])
+            watermark = watermarks.get(sender_id)
+            if watermark is None:
+                return None  # No transactions yet
+            lookup["watermark"] = watermark
+            if sender_id in fresh:
+                lookup["source"] = "store"
+                return {"revision": watermark.revision, "features": fresh[sender_id]}
+        lookup["source"] = "computed"
+        # Catch the sender's running feature state up to the watermark the features will be stored at
+        features = feature_engine.features_for(sender_id, watermark)
+        if features is None:
+            return None
+        return {"revision": watermark.revision if watermark else revision, "features": features}
+
+    entry = feature_cache.get_or_compute(sender_id, load, valid=lambda entry: entry["revision"] == revision)
+    return FeatureLookup(entry["features"] if entry else None, lookup["source"], lookup["watermark"])
+
+def store_sender_features(sender_id, features, watermark=None):
+    """
+    Upsert the sender's features in the current session without committing.
+    watermark is the Watermark they were computed at.
+
+    The write runs in a SAVEPOINT so a failure here only discards the
+    feature row: the caller's scored transaction is still committed.
     """
-    # Get all transactions for this sender
-    transactions = Transaction.query.filter_by(sender_id=sender_id).all()
-    
-    if not transactions:
-        return None
-    
-    # Convert to DataFrame for easier manipulation
-    df = pd.DataFrame([t.to_dict() for t in transactions])
-    
-    # Convert date strings to datetime objects
-    df['sending_date'] = pd.to_datetime(df['sending_date'])
-    
-    # Sort by date
-    df = df.sort_values('sending_date')
-    
-    # Calculate features
-    features = {}
-    
-    # Basic count features
-    features["Total Trx"] = len(df)
-    features["Total Beneficiaries"] = df['beneficiary_client_id'].nunique()
-    features["Total Paid out Trx"] = len(df[df['status'] == 'Paid'])
-    
-    # Transaction frequency features
-    if len(df) >= 5:
-        # Daily transaction counts
-        df['date'] = df['sending_date'].dt.date
-        daily_counts = df.groupby('date').size()
-        top_5_daily = daily_counts.nlargest(5)
-        features["Avg Top 05 Daily Trx"] = top_5_daily.mean()
-        
-        # Standard deviation of top 5 transactions
-        features["SD of Top 5 Trx_M"] = top_5_daily.std() if len(top_5_daily) > 1 else 0
-        features["SD of Top 5 Trx_N"] = np.std(top_5_daily) if len(top_5_daily) > 1 else 0
-    else:
-        features["Avg Top 05 Daily Trx"] = 1
-        features["SD of Top 5 Trx_M"] = 0
-        features["SD of Top 5 Trx_N"] = 0
-    
-    # Volume features
-    if 'total_sale' in df.columns:
-        volumes = df['total_sale']
-        top_volumes = volumes.nlargest(5)
-        features["Avg top Volumes"] = top_volumes.mean() if not top_volumes.empty else 0
-        features["Std Dev Vol_M"] = volumes.std() if len(volumes) > 1 else 0
-        features["Std Dev Vol_N"] = np.std(volumes) if len(volumes) > 1 else 0
-    else:
-        features["Avg top Volumes"] = 0
-        features["Std Dev Vol_M"] = 0
-        features["Std Dev Vol_N"] = 0
-    
-    # Date difference features
-    if len(df) > 1:
-        date_diffs = []
-        sorted_dates = sorted(df['sending_date'])
-        for i in range(1, len(sorted_dates)):
-            diff = (sorted_dates[i] - sorted_dates[i-1]).days
-            date_diffs.append(diff)
-        
-        features["Date Differences Max"] = max(date_diffs) if date_diffs else 0
-        features["Date Differences Avg"] = sum(date_diffs) / len(date_diffs) if date_diffs else 0
-    else:
-        features["Date Differences Max"] = 0
-        features["Date Differences Avg"] = 0
-    
-    # Sequence length
-    features["Length of Seq"] = len(df)
-    
-    # Average Transaction Value features
-    if 'total_sale' in df.columns and len(df) >= 5:
-        atv = df['total_sale']
-        top_atv = atv.nlargest(5)
-        bottom_atv = atv.nsmallest(5)
-        
-        features["Avg Top 05 ATV"] = top_atv.mean() if not top_atv.empty else 0
-        features["Avg Bottom ATV"] = bottom_atv.mean() if not bottom_atv.empty else 0
-        features["Std Dev ATV"] = atv.std() if len(atv) > 1 else 0
-    else:
-        features["Avg Top 05 ATV"] = 0
-        features["Avg Bottom ATV"] = 0
-        features["Std Dev ATV"] = 0
-    
-    # Paid percentage
-    paid_count = len(df[df['status'] == 'Paid'])
-    features["Paid %"] = (paid_count / len(df)) * 100 if len(df) > 0 else 0
-    
-    # Standard deviation of transaction differences
-    if len(df) > 2:
-        trx_diffs = []
-        for i in range(1, len(df)):
-            if 'total_sale' in df.columns:
-                diff = abs(df.iloc[i]['total_sale'] - df.iloc[i-1]['total_sale'])
-                trx_diffs.append(diff)
-        
-        features["SD Trx Diff"] = np.std(trx_diffs) if len(trx_diffs) > 1 else 0
-    else:
-        features["SD Trx Diff"] = 0
-    
-    # Standard deviation of transaction volumes
-    if 'total_sale' in df.columns:
-        features["SD Trx Vol"] = df['total_sale'].std() if len(df) > 1 else 0
-    else:
-        features["SD Trx Vol"] = 0
-    
-    # Store the features in the database
     try:
         print(f"[DEBUG] Storing features for sender ID: {sender_id}")
-        
-        # Convert NumPy values to native Python types
-        db_features = {}
-        for key, value in features.items():
-            # Check if it's a NumPy type and convert to Python native type
-            if hasattr(value, 'item'):
-                db_features[key] = value.item()  # Convert NumPy types to native Python types
-            else:
-                db_features[key] = value
-        
-        # Check if we already have features for this sender
-        existing_features = SenderFeatures.query.filter_by(sender_id=sender_id).first()
-        
-        if existing_features:
-            # Update existing features
-            print(f"[DEBUG] Updating existing features for sender ID: {sender_id}")
-            existing_features.total_trx = db_features["Total Trx"]
-            existing_features.total_beneficiaries = db_features["Total Beneficiaries"]
-            existing_features.total_paid_out_trx = db_features["Total Paid out Trx"]
-            existing_features.avg_top_05_daily_trx = db_features["Avg Top 05 Daily Trx"]
-            existing_features.sd_of_top_5_trx_m = db_features["SD of Top 5 Trx_M"]
-            existing_features.sd_of_top_5_trx_n = db_features["SD of Top 5 Trx_N"]
-            existing_features.avg_top_volumes = db_features["Avg top Volumes"]
-            existing_features.std_dev_vol_m = db_features["Std Dev Vol_M"]
-            existing_features.std_dev_vol_n = db_features["Std Dev Vol_N"]
-            existing_features.date_differences_max = db_features["Date Differences Max"]
-            existing_features.date_differences_avg = db_features["Date Differences Avg"]
-            existing_features.length_of_seq = db_features["Length of Seq"]
-            existing_features.avg_top_05_atv = db_features["Avg Top 05 ATV"]
-            existing_features.avg_bottom_atv = db_features["Avg Bottom ATV"]
-            existing_features.std_dev_atv = db_features["Std Dev ATV"]
-            existing_features.paid_percentage = db_features["Paid %"]
-            existing_features.sd_trx_diff = db_features["SD Trx Diff"]
-            existing_features.sd_trx_vol = db_features["SD Trx Vol"]
-        else:
-            # Create new features entry
-            print(f"[DEBUG] Creating new features entry for sender ID: {sender_id}")
-            sender_features = SenderFeatures(
-                sender_id=sender_id,
-                total_trx=db_features["Total Trx"],
-                total_beneficiaries=db_features["Total Beneficiaries"],
-                total_paid_out_trx=db_features["Total Paid out Trx"],
-                avg_top_05_daily_trx=db_features["Avg Top 05 Daily Trx"],
-                sd_of_top_5_trx_m=db_features["SD of Top 5 Trx_M"],
-                sd_of_top_5_trx_n=db_features["SD of Top 5 Trx_N"],
-                avg_top_volumes=db_features["Avg top Volumes"],
-                std_dev_vol_m=db_features["Std Dev Vol_M"],
-                std_dev_vol_n=db_features["Std Dev Vol_N"],
-                date_differences_max=db_features["Date Differences Max"],
-                date_differences_avg=db_features["Date Differences Avg"],
-                length_of_seq=db_features["Length of Seq"],
-                avg_top_05_atv=db_features["Avg Top 05 ATV"],
-                avg_bottom_atv=db_features["Avg Bottom ATV"],
-                std_dev_atv=db_features["Std Dev ATV"],
-                paid_percentage=db_features["Paid %"],
-                sd_trx_diff=db_features["SD Trx Diff"],
-                sd_trx_vol=db_features["SD Trx Vol"]
-            )
-            db.session.add(sender_features)
-        
-        # Commit the changes
-        db.session.commit()
+        with db.session.begin_nested():
+            upsert_sender_features([sender_feature_row(sender_id, features, watermark)])
         print(f"[DEBUG] Features successfully stored for sender ID: {sender_id}")
     except Exception as e:
         print(f"[ERROR] Failed to store features in the database: {str(e)}")
-        db.session.rollback()
-    
-    return features
+
+def score_features(active_model, features_dict):
+    """Prediction for one feature dict, reusing cached model outputs when the prediction cache is enabled"""
+    inference = active_model.inference
+    if not prediction_cache.enabled:
+        return inference.predict_one(features_dict)
+    vector = inference.vectorize([features_dict])
+    key = f"{active_model.version}:{hashlib.sha1(vector.tobytes()).hexdigest()}"
+    return Prediction(**prediction_cache.get_or_compute(key, lambda: inference.predict_one(features_dict)._asdict()))
+
+def default_features(total_sale):
+    """Features used for a sender's first transaction, when there is no history yet"""
+    return {
+        "Total Trx": 1,
+        "Total Beneficiaries": 1,
+        "Total Paid out Trx": 0,
+        "Avg Top 05 Daily Trx": 1,
+        "SD of Top 5 Trx_M": 0,
+        "SD of Top 5 Trx_N": 0,
+        "Avg top Volumes": float(total_sale),
+        "Std Dev Vol_M": 0,
+        "Std Dev Vol_N": 0,
+        "Date Differences Max": 0,
+        "Date Differences Avg": 0,
+        "Length of Seq": 1,
+        "Avg Top 05 ATV": float(total_sale),
+        "Avg Bottom ATV": float(total_sale),
+        "Std Dev ATV": 0,
+        "Paid %": 0,
+        "SD Trx Diff": 0,
+        "SD Trx Vol": 0
+    }
+
+def build_customer_transaction(data, user_id, model_version=None):
+    """Create an unscored CustomerTransaction from a predict request payload"""
+    return CustomerTransaction(
+        customer_id=data.get("customer_id", user_id),  # Use customer_id if provided, fallback to user_id
+        session_id=data.get("session_id"),
+        sending_date=data.get("sending_date"),
+        mtn=data.get("mtn"),
+        sender_id=data.get("sender_id"),
+        sender_legal_name=data.get("sender_legal_name"),
+        channel=data.get("channel"),
+        payer_rep_code=data.get("payer_rep_code"),
+        sender_country=data.get("sender_country"),
+        sender_status=data.get("sender_status"),
+        sender_date_of_birth=data.get("sender_date_of_birth"),
+        sender_email=data.get("sender_email"),
+        sender_mobile=data.get("sender_mobile"),
+        sender_phone=data.get("sender_phone"),
+        beneficiary_client_id=data.get("beneficiary_client_id"),
+        beneficiary_name=data.get("beneficiary_name"),
+        beneficiary_first_name=data.get("beneficiary_first_name"),
+        beneficiary_country=data.get("beneficiary_country"),
+        beneficiary_email=data.get("beneficiary_email"),
+        beneficiary_mobile=data.get("beneficiary_mobile"),
+        beneficiary_phone=data.get("beneficiary_phone"),
+        sending_country=data.get("sending_country"),
+        payout_country=data.get("payout_country"),
+        status="Pending",  # Default status before prediction
+        total_sale=data.get("total_sale"),
+        sending_currency=data.get("sending_currency"),
+        payment_method=data.get("payment_method"),
+        compliance_release_date=data.get("compliance_release_date"),
+        sender_status_detail=None,  # Initially None, will be updated after prediction
+        prediction_confidence=None,  # Will be set after prediction
+        model_version=model_version  # Version of the model that scored it
+    )
 
 @predict_bp.route('/predict', methods=['POST'])
 def predict():
+    """
+    Score one transaction and store it.
+
+    Features and the prediction are computed before anything is written, so
+    the CustomerTransaction is inserted already scored, the sender's
+    features and the notification join the same database transaction, and
+    there is a single commit. If anything fails before that commit nothing
+    is stored; a failure storing the features alone is rolled back to its
+    savepoint and does not stop the transaction from being saved.
+    """
     try:
         # Check if model is loaded
-        if model is None:
+        inference = get_inference()
+        if inference is None:
             return jsonify({'error': 'Model not found. Please check the model file path.'}), 500
 
         print("[DEBUG] Starting prediction process...")
@@ -235,107 +192,58 @@ def predict():
         # if not user:
         #     return jsonify({'error': f'User with id {user_id} does not exist.'}), 400
         
-        print(f"[DEBUG] Using user_id: {user_id}")        # Create and store the new customer transaction first
-        transaction = CustomerTransaction(
-            customer_id=data.get("customer_id", user_id),  # Use customer_id if provided, fallback to user_id
-            session_id=data.get("session_id"),
-            sending_date=data.get("sending_date"),
-            mtn=data.get("mtn"),
-            sender_id=data.get("sender_id"),
-            sender_legal_name=data.get("sender_legal_name"),
-            channel=data.get("channel"),
-            payer_rep_code=data.get("payer_rep_code"),
-            sender_country=data.get("sender_country"),
-            sender_status=data.get("sender_status"),
-            sender_date_of_birth=data.get("sender_date_of_birth"),
-            sender_email=data.get("sender_email"),
-            sender_mobile=data.get("sender_mobile"),
-            sender_phone=data.get("sender_phone"),
-            beneficiary_client_id=data.get("beneficiary_client_id"),
-            beneficiary_name=data.get("beneficiary_name"),
-            beneficiary_first_name=data.get("beneficiary_first_name"),
-            beneficiary_country=data.get("beneficiary_country"),
-            beneficiary_email=data.get("beneficiary_email"),
-            beneficiary_mobile=data.get("beneficiary_mobile"),
-            beneficiary_phone=data.get("beneficiary_phone"),            sending_country=data.get("sending_country"),
-            payout_country=data.get("payout_country"),
-            status="Pending",  # Default status before prediction
-            total_sale=data.get("total_sale"),
-            sending_currency=data.get("sending_currency"),
-            payment_method=data.get("payment_method"),
-            compliance_release_date=data.get("compliance_release_date"),
-            sender_status_detail=None,  # Initially None, will be updated after prediction
-            prediction_confidence=None,  # Will be set after prediction
-            model_version="v1.0"  # Track model version
-        )
-        
-        # Save customer transaction to DB
-        print("[DEBUG] Saving customer transaction to database...")
-        db.session.add(transaction)
-        db.session.commit()
-        print(f"[DEBUG] Customer transaction saved with ID: {transaction.id}")
+        print(f"[DEBUG] Using user_id: {user_id}")
 
         # Get the sender_id to filter transactions
         sender_id = data.get("sender_id")
         print(f"[DEBUG] Extracting features for sender ID: {sender_id}")
         
-        # Perform feature engineering on all transactions for this sender
-        features_dict = extract_features_for_sender(sender_id)
+        # Cached or stored features, or feature engineering on all transactions for this sender
+        lookup = extract_features_for_sender(sender_id)
+        features_dict = lookup.features
+        has_history = bool(features_dict)
+        print(f"[DEBUG] Features source: {lookup.source}")
         
         # If this is the first transaction, use default values for features
-        if not features_dict:
+        if not has_history:
             print("[DEBUG] First transaction for this sender, using default features")
-            features_dict = {
-                "Total Trx": 1,
-                "Total Beneficiaries": 1,
-                "Total Paid out Trx": 0,
-                "Avg Top 05 Daily Trx": 1,
-                "SD of Top 5 Trx_M": 0,
-                "SD of Top 5 Trx_N": 0,
-                "Avg top Volumes": float(data.get("total_sale", 0)),
-                "Std Dev Vol_M": 0,
-                "Std Dev Vol_N": 0,
-                "Date Differences Max": 0,
-                "Date Differences Avg": 0,
-                "Length of Seq": 1,
-                "Avg Top 05 ATV": float(data.get("total_sale", 0)),
-                "Avg Bottom ATV": float(data.get("total_sale", 0)),
-                "Std Dev ATV": 0,
-                "Paid %": 0,
-                "SD Trx Diff": 0,
-                "SD Trx Vol": 0
-            }
+            features_dict = default_features(data.get("total_sale", 0))
         else:
             print(f"[DEBUG] Extracted features: {features_dict}")
         
-        # Create feature array in the correct order
-        print("[DEBUG] Creating feature array for model prediction")
-        features_array = np.array([features_dict.get(feature, 0) for feature in FEATURES]).reshape(1, -1)
-        print(f"[DEBUG] Feature array shape: {features_array.shape}")
-        
-        # Predict using the model
+        # Predict using the model (single predict_proba call). The active
+        # version is pinned while scoring so a hot swap cannot unload it.
         print("[DEBUG] Running model prediction...")
-        prediction = model.predict(features_array)
-        prediction_proba = model.predict_proba(features_array)[0]
-        predicted_label = int(prediction[0])
-        print(f"[DEBUG] Raw prediction: {prediction}, Probabilities: {prediction_proba}")
+        with model_registry.acquire() as active_model:
+            prediction = score_features(active_model, features_dict)
+            model_version = active_model.version
+        print(f"[DEBUG] Scored with model version: {model_version}")
+        print(f"[DEBUG] Probabilities: {prediction.probabilities}")
         
         # Map prediction output to human-readable format
-        label_map = {0: "Genuine", 1: "Suspicious"}
-        predicted_status = label_map.get(predicted_label, "Unknown")
-        confidence = max(prediction_proba) * 100
-        print(f"[DEBUG] Predicted status: {predicted_status}, Confidence: {confidence:.1f}%")        # Update customer transaction with prediction result
-        print("[DEBUG] Updating customer transaction with prediction result")
-        
-        # Convert numpy values to native Python types for database storage
-        confidence_python = float(confidence) if hasattr(confidence, 'item') else float(confidence)
-        risk_score_python = float(confidence_python if predicted_status == "Suspicious" else (100 - confidence_python))
-        
+        predicted_status = prediction.label
+        confidence_python = prediction.confidence
+        risk_score_python = prediction.risk_score
+        print(f"[DEBUG] Predicted status: {predicted_status}, Confidence: {confidence_python:.1f}%")
+
+        # Create the customer transaction with the prediction already filled in
+        transaction = build_customer_transaction(data, user_id, model_version)
         transaction.status = f"Predicted: {predicted_status}"
         transaction.sender_status_detail = predicted_status
         transaction.prediction_confidence = confidence_python
         transaction.risk_score = risk_score_python
-        db.session.commit()        # Create notification for the user (only if user_id is provided)
+
+        # Flush to get the transaction ID; nothing is committed yet
+        print("[DEBUG] Saving customer transaction to database...")
+        db.session.add(transaction)
+        db.session.flush()
+        print(f"[DEBUG] Customer transaction saved with ID: {transaction.id}")
+        record_inserts([transaction])
+
+        if has_history and lookup.source == "computed":
+            store_sender_features(sender_id, features_dict, lookup.watermark)
+
+        # Create notification for the user (only if user_id is provided)
         if user_id is not None:
             print("[DEBUG] Creating notification")
             notification = Notification(
@@ -349,10 +257,13 @@ def predict():
                 high_alert_date=datetime.now() if predicted_status == "Suspicious" else None
             )
             db.session.add(notification)
-            db.session.commit()
         else:
             print("[DEBUG] No user_id provided, skipping notification creation")
-          # Emit real-time notification
+
+        # Single commit for the transaction, features and notification
+        db.session.commit()
+
+        # Emit real-time notification
         print("[DEBUG] Emitting real-time notification")
         emit("new_transaction", {
             "message": f"New transaction added. Predicted category: {predicted_status}",
@@ -371,6 +282,7 @@ def predict():
             "predicted_label": predicted_status,
             "confidence": f"{confidence_python:.1f}%",
             "risk_score": risk_score_python,
+            "model_version": model_version,
             "features_used": features_dict
         }), 201
 
@@ -381,16 +293,268 @@ def predict():
         db.session.rollback()  # Rollback any failed DB transactions
         return jsonify({'error': str(e)}), 500
 
+@predict_bp.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Score many transactions in one request.
+
+    Accepts a JSON array of predict payloads (or {"transactions": [...]}).
+    Features for all senders are loaded with one query, the model is called
+    once on the stacked feature matrix and all CustomerTransaction,
+    Notification and SenderFeatures rows are written in a single commit. Results are returned
+    in input order.
+    """
+    try:
+        inference = get_inference()
+        if inference is None:
+            return jsonify({'error': 'Model not found. Please check the model file path.'}), 500
+
+        data = request.get_json(force=True)
+        items = data.get("transactions") if isinstance(data, dict) else data
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return jsonify({'error': 'Expected a JSON array of transactions'}), 400
+        if not items:
+            return jsonify({"count": 0, "results": []}), 200
+
+        max_size = current_app.config.get("PREDICT_BATCH_MAX_SIZE", 10000)
+        if len(items) > max_size:
+            return jsonify({'error': f'Batch size {len(items)} exceeds the limit of {max_size}'}), 413
+
+        print(f"[DEBUG] Scoring batch of {len(items)} transactions")
+
+        # Stored features that are still current, then feature engineering
+        # for every other distinct sender in one pass
+        # Items without a sender_id have no history and are scored with the default features
+        sender_ids = list(dict.fromkeys(item["sender_id"] for item in items if item.get("sender_id") is not None))
+        revisions = sender_revisions(sender_ids)
+        cached = feature_cache.get_many(sender_ids, valid=lambda sid, entry: entry["revision"] == revisions.get(sid))
+        fresh, watermarks = {sid: entry["features"] for sid, entry in cached.items()}, {}
+        if current_app.config.get("FEATURE_STORE_READS", True):
+            stored, watermarks = read_fresh_features([sid for sid in sender_ids if sid not in cached])
+            fresh.update(stored)
+        sender_features = features_for_senders([sid for sid in sender_ids if sid not in fresh])
+        feature_cache.set_many({
+            sid: {"revision": watermarks[sid].revision if sid in watermarks else revisions[sid], "features": f}
+            for sid, f in {**fresh, **sender_features}.items()
+            if f
+        })
+
+        features_dicts = []
+        for item in items:
+            sender_id = item.get("sender_id")
+            features_dict = fresh.get(sender_id) or sender_features.get(sender_id)
+            if not features_dict:
+                features_dict = default_features(item.get("total_sale", 0))
+            features_dicts.append(features_dict)
+
+        # One model call over the stacked feature matrix, pinned to one model version
+        with model_registry.acquire() as active_model:
+            predictions = active_model.inference.predict(features_dicts)
+            model_version = active_model.version
+
+        transactions = []
+        for item, prediction in zip(items, predictions):
+            transaction = build_customer_transaction(item, item.get("user_id"), model_version)
+            transaction.status = f"Predicted: {prediction.label}"
+            transaction.sender_status_detail = prediction.label
+            transaction.prediction_confidence = prediction.confidence
+            transaction.risk_score = prediction.risk_score
+            transactions.append(transaction)
+
+        # Insert the transactions in bulk; flush assigns their IDs for the notifications
+        db.session.add_all(transactions)
+        db.session.flush()
+        record_inserts(transactions)
+
+        notifications = [
+            Notification(
+                user_id=item.get("user_id"),
+                message=f"New transaction added. Predicted category: {transaction.sender_status_detail} (Confidence: {transaction.prediction_confidence:.1f}%)",
+                transaction_id=transaction.id,
+                sender_name=transaction.sender_legal_name,
+                mobile_number=transaction.sender_mobile,
+                amount=transaction.total_sale,
+                status=transaction.sender_status_detail,
+                high_alert_date=datetime.now() if transaction.sender_status_detail == "Suspicious" else None
+            )
+            for item, transaction in zip(items, transactions)
+            if item.get("user_id") is not None
+        ]
+        db.session.add_all(notifications)
+
+        # Upsert every sender with history in one statement (savepoint: a failure keeps the batch)
+        feature_rows = [
+            sender_feature_row(sender_id, features, watermarks.get(sender_id))
+            for sender_id, features in sender_features.items()
+            if features
+        ]
+        try:
+            with db.session.begin_nested():
+                upsert_sender_features(feature_rows)
+        except Exception as e:
+            print(f"[ERROR] Failed to store batch features in the database: {str(e)}")
+
+        db.session.commit()
+        print(f"[DEBUG] Batch committed: {len(transactions)} transactions, {len(notifications)} notifications")
+
+        for transaction in transactions:
+            emit("new_transaction", {
+                "message": f"New transaction added. Predicted category: {transaction.sender_status_detail}",
+                "transaction_id": transaction.id,
+                "sender_name": transaction.sender_legal_name,
+                "mobile_number": transaction.sender_mobile,
+                "amount": transaction.total_sale,
+                "status": transaction.sender_status_detail,
+                "high_alert_date": datetime.now().isoformat() if transaction.sender_status_detail == "Suspicious" else None,
+                "confidence": f"{transaction.prediction_confidence:.1f}%"
+            }, broadcast=True, namespace="/")
+
+        return jsonify({
+            "message": "Customer transactions added and predicted successfully.",
+            "count": len(transactions),
+            "model_version": model_version,
+            "results": [
+                {
+                    "index": index,
+                    "transaction_id": transaction.id,
+                    "sender_id": transaction.sender_id,
+                    "predicted_label": transaction.sender_status_detail,
+                    "confidence": f"{transaction.prediction_confidence:.1f}%",
+                    "risk_score": transaction.risk_score
+                }
+                for index, transaction in enumerate(transactions)
+            ]
+        }), 201
+
+    except Exception as e:
+        print(f"[ERROR] Exception in batch prediction: {str(e)}")
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @predict_bp.route('/ping', methods=['GET'])
 def ping():
     """Check model status and return feature importance if available"""
     try:
-        if model is None:
+        inference = get_inference()
+        if inference is None:
             return jsonify({'error': 'Model not found'}), 500
-        return jsonify({'status': 'Model loaded', 'feature_importance': model.feature_importances_.tolist()}), 200
+        return jsonify({'status': 'Model loaded', 'feature_importance': inference.model.feature_importances_.tolist()}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@predict_bp.route('/stats', methods=['GET'])
+def inference_stats():
+    """Per-call timing and tree traversal counters for the loaded model"""
+    inference = get_inference()
+    if inference is None:
+        return jsonify({'error': 'Model not found'}), 500
+    return jsonify({
+        'engine': inference.engine,
+        'n_trees': inference.n_trees,
+        'inference': inference.stats.to_dict()
+    }), 200
+
+@predict_bp.route('/feature-store/stats', methods=['GET'])
+def feature_store_statistics():
+    """How often predictions were served from cached or stored sender features, and how stale the misses were"""
+    return jsonify({
+        'enabled': current_app.config.get("FEATURE_STORE_READS", True),
+        'feature_store': feature_store_stats.to_dict(),
+        'cache': feature_cache.info(),
+        'prediction_cache': prediction_cache.info()
+    }), 200
+
+@predict_bp.route('/info', methods=['GET'])
+def model_info():
+    """Model load time, source (pickle or mmap) and this worker's resident memory"""
+    return jsonify(model_registry.info()), 200
+
+def admin_required(f):
+    """token_required plus a check that the caller is an admin"""
+    @token_required
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        if current_user.role != "admin":
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated
+
+@predict_bp.route('/versions', methods=['GET'])
+@admin_required
+def list_model_versions():
+    """Loaded model versions, which one is active and how many requests each is serving"""
+    return jsonify(model_registry.info()), 200
+
+@predict_bp.route('/versions', methods=['POST'])
+@admin_required
+def load_model_version():
+    """
+    Load a model file as a new version next to the active one.
+    Body: {"version": "v1.1", "path": "random_forest_model_v1.1.pkl", "activate": false}
+    Paths are resolved relative to (and must stay inside) the model directory.
+    The version is published to the other workers, which switch to it too
+    when it is activated.
+    """
+    try:
+        data = request.get_json(force=True) or {}
+        version = data.get("version")
+        path = data.get("path")
+        if not version or not path:
+            return jsonify({'error': 'version and path are required'}), 400
+
+        model_dir = os.path.dirname(os.path.abspath(model_registry.model_file))
+        full_path = os.path.abspath(os.path.join(model_dir, path))
+        if os.path.commonpath([model_dir, full_path]) != model_dir:
+            return jsonify({'error': 'Model path must be inside the model directory'}), 400
+
+        print(f"[DEBUG] Loading model version {version} from {full_path}")
+        activate = bool(data.get("activate"))
+        entry = model_registry.load_version(version, full_path, activate=activate)
+        model_registry.publish(entry, activate=activate)
+        return jsonify({
+            "message": f"Model version {version} loaded successfully",
+            "active_version": model_registry.active_version,
+            "version": entry.to_dict()
+        }), 201
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        print(f"[ERROR] Exception in loading model version: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@predict_bp.route('/versions/<version>/activate', methods=['POST'])
+@admin_required
+def activate_model_version(version):
+    """
+    Atomically switch scoring to a loaded version, in every worker. With
+    {"retire_previous": true} the old version is unloaded once its in-flight
+    requests finish.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        model_registry.switch_to(version, retire_previous=bool(data.get("retire_previous")))
+    except KeyError as e:
+        return jsonify({'error': str(e.args[0])}), 404
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    print(f"[DEBUG] Activated model version {version}")
+    return jsonify({"message": f"Model version {version} is now active", "active_version": version}), 200
+
+@predict_bp.route('/versions/<version>', methods=['DELETE'])
+@admin_required
+def unload_model_version(version):
+    """Unload an inactive version after draining its in-flight requests"""
+    try:
+        drained = model_registry.unload(version)
+    except KeyError as e:
+        return jsonify({'error': str(e.args[0])}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    model_registry.unpublish(version)
+    return jsonify({"message": f"Model version {version} unloaded", "drained": drained}), 200
+
 @predict_bp.route('/features', methods=['GET'])
 def get_all_features():
     """
@@ -1,11 +1,19 @@
-from flask import Blueprint, request, jsonify,Response,stream_with_context
-from ..models import Transaction, Notification
+from flask import Blueprint, request, jsonify,Response,stream_with_context,url_for
+from ..models import IngestJob, Transaction, Notification
 from ..database import db
-import pandas as pd
+from ..utils.cache import feature_cache
+from ..utils.columnar import export_response
+from ..utils.dashboard_stats import read_dashboard_stats, record_inserts
+from ..utils.ingest import ON_DUPLICATE, IngestError, check_header, file_format
+from ..utils.ingest_jobs import ingest_jobs
+from ..utils.pagination import PaginationError, paginate
+from ..utils.serializers import FieldsError, project_fields
+from ..utils.stats import status_summary
+from ..utils.streaming import stream_response
 import os
-import json
 from sqlalchemy import func
-from datetime import datetime, date
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
 
 transaction_routes = Blueprint("transactions", __name__)
 
@@ -17,25 +25,34 @@ def upload_transactions():
         file = request.files.get("file")
         if not file:
             return jsonify({"error": "No file provided"}), 400
-        if not file.filename.endswith(".csv"):
-            return jsonify({"error": "Invalid file type. Please upload a CSV file."}), 400
-
-        # Read the CSV file into a DataFrame
-        df = pd.read_csv(file)
-
-        # Validate and clean the data
-        cleaned_data, skipped_rows = clean_transaction_data(df)
-
-        # Bulk insert cleaned data into the database
-        transactions = [Transaction(**row) for row in cleaned_data]
-        db.session.bulk_save_objects(transactions)
-        db.session.commit()
+        fmt = file_format(file.filename)
+        if fmt is None:
+            return jsonify({"error": "Invalid file type. Please upload a CSV, Parquet or Arrow file."}), 400
+        # Rows whose MTN is already loaded: "skip" (default) or "update" them with the file's values
+        on_duplicate = request.form.get("on_duplicate") or request.args.get("on_duplicate", "skip")
+        if on_duplicate not in ON_DUPLICATE:
+            return jsonify({"error": f"on_duplicate must be one of {', '.join(ON_DUPLICATE)}"}), 400
+
+        # Spool the file and ingest it in the background; poll the job for progress
+        path = ingest_jobs.spool_upload(file)
+        try:
+            check_header(path, fmt)
+        except Exception:
+            os.remove(path)
+            raise
+        job = ingest_jobs.enqueue(path, filename=file.filename, delete_source=True, on_duplicate=on_duplicate)
 
         return jsonify({
-            "message": "Transactions uploaded successfully.",
-            "skipped_rows": skipped_rows
-        }), 201
-
+            "message": "Transactions upload queued.",
+            "job_id": job.id,
+            "status_url": url_for("transactions.get_upload_job", job_id=job.id),
+            "job": job.to_dict()
+        }), 202
+
+    except IngestError as e:
+        return jsonify({"error": str(e)}), 400
+    except ImportError as e:
+        return jsonify({"error": str(e)}), 501
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -51,25 +68,73 @@ def upload_local_transactions():
             return jsonify({"error": "File path not provided"}), 400
         if not os.path.exists(file_path):
             return jsonify({"error": "File does not exist"}), 404
-        if not file_path.endswith(".csv"):
-            return jsonify({"error": "Invalid file type. Please provide a CSV file."}), 400
+        fmt = file_format(file_path)
+        if fmt is None:
+            return jsonify({"error": "Invalid file type. Please provide a CSV, Parquet or Arrow file."}), 400
+        on_duplicate = data.get("on_duplicate", "skip")
+        if on_duplicate not in ON_DUPLICATE:
+            return jsonify({"error": f"on_duplicate must be one of {', '.join(ON_DUPLICATE)}"}), 400
 
-        # Load the CSV file into a Pandas DataFrame
-        df = pd.read_csv(file_path)
+        # Ingest the file in the background; poll the job for progress
+        check_header(file_path, fmt)
+        job = ingest_jobs.enqueue(file_path, on_duplicate=on_duplicate)
 
-        # Clean and validate the data
-        cleaned_data, skipped_rows = clean_transaction_data(df)
+        return jsonify({
+            "message": "Local transactions upload queued.",
+            "job_id": job.id,
+            "status_url": url_for("transactions.get_upload_job", job_id=job.id),
+            "job": job.to_dict()
+        }), 202
+
+    except IngestError as e:
+        return jsonify({"error": str(e)}), 400
+    except ImportError as e:
+        return jsonify({"error": str(e)}), 501
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        # Bulk insert cleaned data into the database
-        transactions = [Transaction(**row) for row in cleaned_data]
-        db.session.bulk_save_objects(transactions)
-        db.session.commit()
 
+# GET: Progress of a background upload
+@transaction_routes.route("/upload/jobs/<int:job_id>", methods=["GET"])
+def get_upload_job(job_id):
+    try:
+        job = db.session.get(IngestJob, job_id)
+        if job is None:
+            return jsonify({"error": "Upload job not found"}), 404
+        return jsonify({**job.to_dict(), "resumable": ingest_jobs.is_resumable(job)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# POST: Carry on with a failed or stalled upload after its last committed chunk
+@transaction_routes.route("/upload/jobs/<int:job_id>/resume", methods=["POST"])
+def resume_upload_job(job_id):
+    try:
+        job = db.session.get(IngestJob, job_id)
+        if job is None:
+            return jsonify({"error": "Upload job not found"}), 404
+        if not ingest_jobs.is_resumable(job):
+            return jsonify({"error": f"Upload job is {job.status}"}), 409
+
+        ingest_jobs.submit(job.id)
         return jsonify({
-            "message": "Local transactions uploaded successfully.",
-            "skipped_rows": skipped_rows
-        }), 201
+            "message": "Upload job resumed.",
+            "job_id": job.id,
+            "status_url": url_for("transactions.get_upload_job", job_id=job.id),
+            "job": job.to_dict()
+        }), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
+# GET: Stream transactions as Parquet or Arrow for offline training
+@transaction_routes.route("/export", methods=["GET"])
+def export_transactions():
+    try:
+        return export_response(Transaction)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ImportError as e:
+        return jsonify({"error": str(e)}), 501
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -82,12 +147,15 @@ def get_all_transactions():
         
         # Query the database and limit the results
         # transactions = Transaction.query.all()
-        transactions = Transaction.query.limit(limit).all()
+        query, serialize = project_fields(Transaction.query, Transaction, Transaction.to_dict)
+        transactions = query.limit(limit).all()
         
         # Serialize the results
-        result = [transaction.to_dict() for transaction in transactions]
+        result = [serialize(transaction) for transaction in transactions]
         
         return jsonify(result), 200
+    except FieldsError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
@@ -95,39 +163,36 @@ def get_all_transactions():
 @transaction_routes.route("/all_page", methods=["GET"])
 def get_all_page_transactions():
     try:
-        # Get pagination parameters
-        page = request.args.get('page', default=1, type=int)  # Default to page 1
-        per_page = request.args.get('per_page', default=100, type=int)  # Default 100 records per page
-        
-        # Query the database with pagination
-        transactions = Transaction.query.paginate(page=page, per_page=per_page, error_out=False)
+        # Select and return only the ?fields= columns, if given
+        query, serialize = project_fields(Transaction.query, Transaction, Transaction.to_dict)
+
+        # Paginate by id (page/per_page, or cursor for keyset pagination; default 100 records per page)
+        transactions = paginate(query, Transaction.id, descending=False, default_per_page=100)
         
         # Serialize results
-        result = [transaction.to_dict() for transaction in transactions.items]
+        result = [serialize(transaction) for transaction in transactions.items]
         
         return jsonify({
             "total": transactions.total,
             "page": transactions.page,
             "per_page": transactions.per_page,
+            **transactions.metadata(),
             "transactions": result
         }), 200
+    except (PaginationError, FieldsError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-def json_serial(obj):
-    """JSON serializer for objects not serializable by default"""
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    raise TypeError(f"Type {type(obj)} not serializable")
-
 @transaction_routes.route("/all_stream", methods=["GET"])
 def stream_transactions():
-    def generate():
-        query = Transaction.query.yield_per(500)  # Fetch 500 rows at a time
-        for transaction in query:
-            yield json.dumps(transaction.to_dict(), default=json_serial) + "\n"
-    
-    return Response(stream_with_context(generate()), content_type="application/json")
+    """Stream transactions as NDJSON (filters: start, end, sender_id, status; fields; gzip if accepted)"""
+    try:
+        return stream_response(Transaction)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 # GET : transaction by id
 @transaction_routes.route("/<int:transaction_id>", methods=["GET"])
@@ -154,36 +219,32 @@ def get_transactions_by_date():
         if not start_date or not end_date:
             return jsonify({"error": "Start date and end date are required"}), 400
 
-        # Get pagination parameters
-        page = request.args.get('page', default=1, type=int)  # Default to page 1
-        per_page = request.args.get('per_page', default=50, type=int)  # Default 50 records per page
-        
         # Build the query with date filter
         query = Transaction.query.filter(
             Transaction.sending_date.between(start_date, end_date)
         )
         
-        # Add sorting for consistent pagination (sort by date and then id)
-        query = query.order_by(Transaction.sending_date.desc(), Transaction.id.desc())
-        
-        # Apply pagination
-        paginated_transactions = query.paginate(page=page, per_page=per_page, error_out=False)
-        
-        # Get total count for metadata
-        total_count = paginated_transactions.total
+        # Select and return only the ?fields= columns, if given
+        query, serialize = project_fields(query, Transaction, Transaction.to_dict, keep=[Transaction.sending_date])
+
+        # Apply pagination, sorted by date and then id (default 50 records per page)
+        paginated_transactions = paginate(query, Transaction.id, Transaction.sending_date)
         
         # Serialize the paginated results
-        results = [t.to_dict() for t in paginated_transactions.items]
+        results = [serialize(t) for t in paginated_transactions.items]
         
         # Return paginated response with metadata
         return jsonify({
-            "total": total_count,
-            "page": page,
-            "per_page": per_page,
+            "total": paginated_transactions.total,
+            "page": paginated_transactions.page,
+            "per_page": paginated_transactions.per_page,
             "total_pages": paginated_transactions.pages,
+            **paginated_transactions.metadata(),
             "transactions": results
         }), 200
 
+    except (PaginationError, FieldsError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
@@ -195,31 +256,30 @@ def get_transactions_by_sender():
         if not sender_id:
             return jsonify({"error": "Sender ID is required"}), 400
 
-        # Get pagination parameters
-        page = request.args.get('page', default=1, type=int)  # Default to page 1
-        per_page = request.args.get('per_page', default=50, type=int)  # Default 50 records per page
-        
         # Build the query with sender filter
         query = Transaction.query.filter_by(sender_id=sender_id)
         
-        # Add sorting for consistent pagination
-        query = query.order_by(Transaction.sending_date.desc(), Transaction.id.desc())
-        
-        # Apply pagination
-        paginated_transactions = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Select and return only the ?fields= columns, if given
+        query, serialize = project_fields(query, Transaction, Transaction.to_dict, keep=[Transaction.sending_date])
+
+        # Apply pagination, sorted by date and then id (default 50 records per page)
+        paginated_transactions = paginate(query, Transaction.id, Transaction.sending_date)
         
         # Serialize the paginated results
-        results = [t.to_dict() for t in paginated_transactions.items]
+        results = [serialize(t) for t in paginated_transactions.items]
         
         # Return paginated response with metadata
         return jsonify({
             "total": paginated_transactions.total,
-            "page": page,
-            "per_page": per_page,
+            "page": paginated_transactions.page,
+            "per_page": paginated_transactions.per_page,
             "total_pages": paginated_transactions.pages,
+            **paginated_transactions.metadata(),
             "transactions": results
         }), 200
 
+    except (PaginationError, FieldsError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -231,31 +291,30 @@ def get_transactions_by_beneficiary():
         if not beneficiary_id:
             return jsonify({"error": "Beneficiary ID is required"}), 400
 
-        # Get pagination parameters
-        page = request.args.get('page', default=1, type=int)  # Default to page 1
-        per_page = request.args.get('per_page', default=50, type=int)  # Default 50 records per page
-        
         # Build the query with beneficiary filter
         query = Transaction.query.filter_by(beneficiary_client_id=beneficiary_id)
         
-        # Add sorting for consistent pagination
-        query = query.order_by(Transaction.sending_date.desc(), Transaction.id.desc())
-        
-        # Apply pagination
-        paginated_transactions = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Select and return only the ?fields= columns, if given
+        query, serialize = project_fields(query, Transaction, Transaction.to_dict, keep=[Transaction.sending_date])
+
+        # Apply pagination, sorted by date and then id (default 50 records per page)
+        paginated_transactions = paginate(query, Transaction.id, Transaction.sending_date)
         
         # Serialize the paginated results
-        results = [t.to_dict() for t in paginated_transactions.items]
+        results = [serialize(t) for t in paginated_transactions.items]
         
         # Return paginated response with metadata
         return jsonify({
             "total": paginated_transactions.total,
-            "page": page,
-            "per_page": per_page,
+            "page": paginated_transactions.page,
+            "per_page": paginated_transactions.per_page,
             "total_pages": paginated_transactions.pages,
+            **paginated_transactions.metadata(),
             "transactions": results
         }), 200
 
+    except (PaginationError, FieldsError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -277,82 +336,45 @@ def get_transactions_by_status():
         if not status:
             return jsonify({"error": "Status is required"}), 400
 
-        # Get pagination parameters
-        page = request.args.get('page', default=1, type=int)  # Default to page 1
-        per_page = request.args.get('per_page', default=50, type=int)  # Default 50 records per page
-        
         # Build the query with status filter
         query = Transaction.query.filter_by(status=status)
         
-        # Add sorting for consistent pagination
-        query = query.order_by(Transaction.sending_date.desc(), Transaction.id.desc())
-        
-        # Apply pagination
-        paginated_transactions = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Select and return only the ?fields= columns, if given
+        query, serialize = project_fields(query, Transaction, Transaction.to_dict, keep=[Transaction.sending_date])
+
+        # Apply pagination, sorted by date and then id (default 50 records per page)
+        paginated_transactions = paginate(query, Transaction.id, Transaction.sending_date)
         
         # Serialize the paginated results
-        results = [t.to_dict() for t in paginated_transactions.items]
+        results = [serialize(t) for t in paginated_transactions.items]
         
         # Return paginated response with metadata
         return jsonify({
             "total": paginated_transactions.total,
-            "page": page,
-            "per_page": per_page,
+            "page": paginated_transactions.page,
+            "per_page": paginated_transactions.per_page,
             "total_pages": paginated_transactions.pages,
+            **paginated_transactions.metadata(),
             "transactions": results
         }), 200
 
+    except (PaginationError, FieldsError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
 @transaction_routes.route("/stats", methods=["GET"])
 def get_transaction_stats():
     try:
-        total_transactions = Transaction.query.count()
-        genuine_transactions = Transaction.query.filter(Transaction.sender_status_detail == "Genuine").count()
-        suspicious_transactions = Transaction.query.filter(Transaction.sender_status_detail == "Suspicious").count()
-        
-        # Calculate unique customers (using sender_id as primary identifier)
-        total_customers = db.session.query(Transaction.sender_id).distinct().count()
-          # Calculate pure genuine customers (customers with ONLY genuine transactions)
-        genuine_only_customers = db.session.query(Transaction.sender_id).filter(
-            Transaction.sender_status_detail == "Genuine"
-        ).distinct().except_(
-            db.session.query(Transaction.sender_id).filter(
-                Transaction.sender_status_detail == "Suspicious"
-            ).distinct()
-        ).count()
-        
-        # Calculate pure suspicious customers (customers with ONLY suspicious transactions)
-        suspicious_only_customers = db.session.query(Transaction.sender_id).filter(
-            Transaction.sender_status_detail == "Suspicious"
-        ).distinct().except_(
-            db.session.query(Transaction.sender_id).filter(
-                Transaction.sender_status_detail == "Genuine"
-            ).distinct()
-        ).count()
-        
-        # Calculate mixed customers (customers with both genuine and suspicious transactions)
-        mixed_customers = total_customers - genuine_only_customers - suspicious_only_customers
-          # Calculate total transaction volume
-        total_volume = db.session.query(func.sum(Transaction.total_sale)).scalar() or 0
-        genuine_volume = db.session.query(func.sum(Transaction.total_sale)).filter(
-            Transaction.sender_status_detail == "Genuine").scalar() or 0
-        suspicious_volume = db.session.query(func.sum(Transaction.total_sale)).filter(
-            Transaction.sender_status_detail == "Suspicious").scalar() or 0
+        # Counts, customer classification and volumes from the maintained summary row
+        try:
+            stats = read_dashboard_stats("transactions")
+        except Exception as e:
+            db.session.rollback()
+            print(f"[ERROR] Dashboard stats unavailable, computing live: {str(e)}")
+            stats = status_summary(Transaction, Transaction.sender_id)
 
-        return jsonify({
-            "total_transactions": total_transactions,
-            "total_customers": total_customers,
-            "genuine_transactions": genuine_transactions,
-            "suspicious_transactions": suspicious_transactions,
-            "genuine_customers": genuine_only_customers,
-            "suspicious_customers": suspicious_only_customers,
-            "mixed_customers": mixed_customers,
-            "total_volume": total_volume,
-            "genuine_volume": genuine_volume,
-            "suspicious_volume": suspicious_volume
-        }), 200
+        return jsonify(stats), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -394,66 +416,26 @@ def create_transaction():
         )
 
         db.session.add(transaction)
+        db.session.flush()  # A duplicate MTN fails here, before the dashboard is touched
+        record_inserts([transaction])
         db.session.commit()
+        feature_cache.invalidate(transaction.sender_id)
 
         return jsonify({
             "message": "Transaction created successfully",
             "transaction": transaction.to_dict()
         }), 201
 
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": f"A transaction with MTN {data.get('mtn')} already exists"}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
     
-# Function to clean transaction data
-def clean_transaction_data(df):
-    cleaned_data = []
-    skipped_rows = []
-
-    for index, row in df.iterrows():
-        try:
-            # Perform any necessary validation and cleaning
-            cleaned_row = {
-                "sending_date": row["SENDINGDATE"],
-                "mtn": row["MTN"],
-                "sender_id": row["SENDER_ID"],
-                "sender_legal_name": row["SENDER_LEGALNAME"],
-                "channel": row["CHANNEL"],
-                "payer_rep_code": row["PAYER_REPCODE"],
-                "sender_country": row["SENDER_COUNTRY"],
-                "sender_status": row["SENDER_STATUS"],
-                "sender_date_of_birth": row["SENDER_DATEOFBIRTH"],
-                "sender_email": row["SENDER_EMAIL"],
-                "sender_mobile": row["SENDER_MOBILE"],
-                "sender_phone": row["SENDER_PHONE"],
-                "beneficiary_client_id": row["BENEFICIARY_CLIENTID"],
-                "beneficiary_name": row["BENEFICIARY_NAME"],
-                "beneficiary_first_name": row["BENEFICIARY_FIRSTNAME"],
-                "beneficiary_country": row["BENEFICIARY_COUNTRY"],
-                "beneficiary_email": row["BENEFICIARY_EMAIL"],
-                "beneficiary_mobile": row["BENEFICIARY_MOBILE"],
-                "beneficiary_phone": row["BENEFICIARY_PHONE"],
-                "sending_country": row["SENDING_COUNTRY"],
-                "payout_country": row["PAYOUTCOUNTRY"],
-                "status": row["STATUS"],
-                "total_sale": row["TOTALSALE"],
-                "sending_currency": row["SENDINGCURRENCY"],
-                "payment_method": row["PAYMENTMETHOD"],
-                "compliance_release_date": row["COMPLIANCERELEASEDATE"],
-                "sender_status_detail": row.get("Sender_Status", None),
-            }
-            cleaned_data.append(cleaned_row)
-        except Exception as e:
-            skipped_rows.append({"index": index, "error": str(e)})
-
-    return cleaned_data, skipped_rows
-
 @transaction_routes.route("/notifications", methods=["GET"])
 def get_all_notifications():
     try:
-        # Get pagination parameters
-        page = request.args.get('page', default=1, type=int)  # Default to page 1
-        per_page = request.args.get('per_page', default=20, type=int)  # Default 20 records per page
         user_id = request.args.get('user_id')  # Optional user_id filter
         
         # Get new filtering parameters
@@ -477,22 +459,22 @@ def get_all_notifications():
             cutoff_time = datetime.utcnow() - timedelta(hours=hours)
             query = query.filter(Notification.created_at >= cutoff_time)
             
-        # Order by creation date, newest first
-        query = query.order_by(Notification.created_at.desc())
-        
-        # Apply pagination
-        notifications = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Apply pagination, newest first (default 20 records per page)
+        notifications = paginate(query, Notification.id, Notification.created_at, default_per_page=20)
         
         # Serialize results
         result = [notification.to_dict() for notification in notifications.items]
         
         return jsonify({
             "total": notifications.total,
-            "totalPages": (notifications.total + per_page - 1) // per_page,  # Calculate total pages
+            "totalPages": notifications.pages,  # Calculate total pages
             "page": notifications.page,
             "per_page": notifications.per_page,
+            **notifications.metadata(),
             "notifications": result
         }), 200
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -0,0 +1,404 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Default file for the shared (cross-worker) backend
+SHARED_CACHE_FILE = os.path.join(tempfile.gettempdir(), "fraud_detection_cache.sqlite3")
+
+
+class CacheStats:
+    """Counters for one cache"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expirations = 0
+            self.invalidations = 0
+            self.stale = 0
+            self.computations = 0
+            self.coalesced = 0
+
+    def record(self, **counts):
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def to_dict(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale": self.stale,
+                "computations": self.computations,
+                "coalesced": self.coalesced,
+            }
+
+
+class MemoryBackend:
+    """
+    Per-process store: an OrderedDict with LRU eviction and a per-entry TTL.
+    Values are returned as stored (shared), so callers must not mutate them.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_size=10000, ttl=30, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, stats):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                stats.record(expirations=1)
+                return None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, stats):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            stats.record(evictions=evicted)
+
+    def delete_many(self, keys):
+        with self._lock:
+            return sum(self._entries.pop(key, None) is not None for key in set(keys))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @contextmanager
+    def lease(self, key, timeout):
+        # Within one process the per-key lock in Cache already serializes computations
+        yield True
+
+    def wait_for(self, key, timeout, stats):
+        return None
+
+
+class SQLiteBackend:
+    """
+    Store shared by every worker on the host: one SQLite file in WAL mode.
+
+    Values are JSON encoded. Entries expire by wall-clock time, and once the
+    namespace grows past max_size the entries closest to expiry (the oldest
+    writes) are removed. A lease table lets one worker compute a missing key
+    while the others wait for its result (see Cache.get_or_compute).
+    """
+
+    name = "sqlite"
+    prune_every = 100  # sets between size/expiry sweeps
+
+    def __init__(self, path=SHARED_CACHE_FILE, namespace="default", max_size=10000, ttl=30, clock=time.time):
+        self.path = path
+        self.namespace = namespace
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._local = threading.local()
+        self._sets = 0
+
+    def _connection(self):
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_leases ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def __len__(self):
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+
+    def get(self, key, stats):
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, str(key)),
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] <= self.clock():
+            stats.record(expirations=1)
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value, stats):
+        if self.max_size <= 0:
+            return
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (self.namespace, str(key), json.dumps(value, default=_json_default), self.clock() + self.ttl),
+        )
+        self._sets += 1
+        if self._sets % self.prune_every == 0:
+            stats.record(evictions=self.prune())
+
+    def prune(self):
+        """Remove expired entries and trim the namespace to max_size; returns how many were evicted"""
+        conn = self._connection()
+        conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?", (self.namespace, self.clock()))
+        evicted = conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+            "SELECT key FROM cache_entries WHERE namespace = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_size),
+        ).rowcount
+        return evicted
+
+    def delete_many(self, keys):
+        keys = [(self.namespace, str(key)) for key in set(keys)]
+        if not keys:
+            return 0
+        conn = self._connection()
+        before = conn.total_changes
+        conn.executemany("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", keys)
+        return conn.total_changes - before
+
+    def clear(self):
+        conn = self._connection()
+        conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+        conn.execute("DELETE FROM cache_leases WHERE namespace = ?", (self.namespace,))
+
+    @contextmanager
+    def lease(self, key, timeout):
+        """Try to become the one worker computing `key`; yields whether the lease was acquired"""
+        conn = self._connection()
+        now = self.clock()
+        conn.execute(
+            "DELETE FROM cache_leases WHERE namespace = ? AND key = ? AND expires_at <= ?",
+            (self.namespace, str(key), now),
+        )
+        acquired = conn.execute(
+            "INSERT OR IGNORE INTO cache_leases (namespace, key, expires_at) VALUES (?, ?, ?)",
+            (self.namespace, str(key), now + timeout),
+        ).rowcount == 1
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute("DELETE FROM cache_leases WHERE namespace = ? AND key = ?", (self.namespace, str(key)))
+
+    def wait_for(self, key, timeout, stats, poll_interval=0.01):
+        """Poll for a value another worker is computing; None if its lease is released or expires first"""
+        conn = self._connection()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            value = self.get(key, stats)
+            if value is not None:
+                return value
+            leased = conn.execute(
+                "SELECT 1 FROM cache_leases WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self.namespace, str(key), self.clock()),
+            ).fetchone()
+            if not leased:
+                return self.get(key, stats)
+            time.sleep(poll_interval)
+        return None
+
+
+def _json_default(value):
+    # NumPy scalars and arrays
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class Cache:
+    """
+    Cache front end with pluggable storage.
+
+    The "memory" backend keeps entries in this process (LRU + TTL); the
+    "sqlite" backend keeps them in a file shared by every gunicorn worker on
+    the host, so one worker's result serves the others and an invalidation
+    reaches all of them. get_or_compute() protects against stampedes: when
+    several requests miss on the same key at once, one computes the value
+    and the rest wait for it, in-process through a per-key lock and across
+    workers through a lease row in the shared backend.
+
+    Lookups can pass valid(value), which rejects entries written before a
+    change the cache was not told about (e.g. one made by another worker
+    with the memory backend): a rejected entry is dropped and counts as
+    stale and as a miss.
+    """
+
+    def __init__(self, backend=None, enabled=True, namespace="default", lease_timeout=10):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.enabled = enabled
+        self.namespace = namespace
+        self.lease_timeout = lease_timeout
+        self.stats = CacheStats()
+        self._key_locks = {}
+        self._key_locks_lock = threading.Lock()
+
+    def init_app(self, app, prefix="FEATURE_CACHE"):
+        self.enabled = app.config.get(f"{prefix}_ENABLED", self.enabled)
+        max_size = app.config.get(f"{prefix}_MAX_SIZE", self.backend.max_size)
+        ttl = app.config.get(f"{prefix}_TTL", self.backend.ttl)
+        backend = app.config.get(f"{prefix}_BACKEND", self.backend.name)
+        if backend == "sqlite":
+            path = app.config.get(f"{prefix}_PATH") or SHARED_CACHE_FILE
+            self.backend = SQLiteBackend(path, namespace=self.namespace, max_size=max_size, ttl=ttl)
+        elif backend == "memory":
+            self.backend = MemoryBackend(max_size=max_size, ttl=ttl)
+            # A fresh app starts with an empty in-process cache; a shared cache outlives it
+            self.clear()
+        else:
+            raise ValueError(f"Unknown cache backend: {backend}")
+
+    def __len__(self):
+        return len(self.backend)
+
+    def _lookup(self, key, valid):
+        """The backend's value for key, or None when it is missing or rejected (and dropped) by valid()"""
+        value = self.backend.get(key, self.stats)
+        if value is not None and valid is not None and not valid(value):
+            self.backend.delete_many([key])
+            self.stats.record(stale=1)
+            return None
+        return value
+
+    def get(self, key, default=None, valid=None):
+        if not self.enabled:
+            return default
+        value = self._lookup(key, valid)
+        if value is None:
+            self.stats.record(misses=1)
+            return default
+        self.stats.record(hits=1)
+        return value
+
+    def get_many(self, keys, valid=None):
+        """{key: value} for the keys that are cached, unexpired and pass valid(key, value)"""
+        found = {}
+        for key in dict.fromkeys(keys):
+            check = None if valid is None else (lambda value, key=key: valid(key, value))
+            value = self.get(key, valid=check)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set(self, key, value):
+        if self.enabled and value is not None:
+            self.backend.set(key, value, self.stats)
+
+    def set_many(self, items):
+        for key, value in items.items():
+            self.set(key, value)
+
+    @contextmanager
+    def _key_lock(self, key):
+        with self._key_locks_lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._key_locks_lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+    def get_or_compute(self, key, compute, valid=None):
+        """
+        Return the cached value for `key`, or compute, cache and return it.
+        Concurrent misses on the same key run compute() once. None results
+        are not cached.
+        """
+        if not self.enabled:
+            return compute()
+        value = self.get(key, valid=valid)
+        if value is not None:
+            return value
+
+        with self._key_lock(key):
+            # Another thread may have filled it while we waited for the lock
+            value = self._lookup(key, valid)
+            if value is not None:
+                self.stats.record(coalesced=1)
+                return value
+            with self.backend.lease(key, self.lease_timeout) as acquired:
+                if not acquired:
+                    value = self.backend.wait_for(key, self.lease_timeout, self.stats)
+                    if value is not None and (valid is None or valid(value)):
+                        self.stats.record(coalesced=1)
+                        return value
+                value = compute()
+                self.stats.record(computations=1)
+                self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        self.invalidate_many([key])
+
+    def invalidate_many(self, keys):
+        removed = self.backend.delete_many(keys)
+        if removed:
+            self.stats.record(invalidations=removed)
+
+    def clear(self):
+        self.backend.clear()
+
+    def info(self):
+        return dict(
+            self.stats.to_dict(),
+            enabled=self.enabled,
+            backend=self.backend.name,
+            size=len(self.backend),
+            max_size=self.backend.max_size,
+            ttl_seconds=self.backend.ttl,
+        )
+
+
+# Sender feature vectors keyed by sender_id
+feature_cache = Cache(namespace="sender_features")
+
+# Model outputs keyed by model version and feature vector
+prediction_cache = Cache(enabled=False, namespace="predictions")
@@ -0,0 +1,212 @@
+import io
+import logging
+
+import pandas as pd
+from flask import Response, current_app, request, stream_with_context
+from sqlalchemy import Boolean, DateTime, Float, Integer, select
+
+from ..database import db
+from .streaming import row_filters
+
+logger = logging.getLogger(__name__)
+
+# File extension -> columnar format ("arrow" is Arrow IPC, file or stream flavour)
+COLUMNAR_EXTENSIONS = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".arrows": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+EXPORT_MIMETYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+EXPORT_EXTENSIONS = {"parquet": "parquet", "arrow": "arrows"}
+
+
+def require_pyarrow():
+    """Import pyarrow on first use, so CSV-only deployments don't need it"""
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ImportError("Parquet and Arrow support needs pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+# ---------------- Reading ----------------
+
+def _open_ipc(path):
+    """(schema, record batch iterator) for an Arrow IPC file, memory-mapped, or stream"""
+    pa = require_pyarrow()
+    try:
+        reader = pa.ipc.open_file(pa.memory_map(path))
+        return reader.schema, (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        reader = pa.ipc.open_stream(pa.memory_map(path))
+        return reader.schema, iter(reader)
+
+
+def column_names(path, fmt):
+    """Column names from the file's schema, without reading any data"""
+    pa = require_pyarrow()
+    if fmt == "parquet":
+        return pa.parquet.read_schema(path).names
+    return _open_ipc(path)[0].names
+
+
+def _record_batches(path, fmt, columns, batch_size, offset):
+    """Record batches of at most batch_size rows, starting after the first offset rows"""
+    pa = require_pyarrow()
+    if fmt == "parquet":
+        parquet_file = pa.parquet.ParquetFile(path)
+        # Skip whole row groups from the metadata, then slice into the first one kept
+        first_group = 0
+        while first_group < parquet_file.num_row_groups:
+            rows = parquet_file.metadata.row_group(first_group).num_rows
+            if offset < rows:
+                break
+            offset -= rows
+            first_group += 1
+        batches = parquet_file.iter_batches(
+            batch_size=batch_size, columns=columns,
+            row_groups=range(first_group, parquet_file.num_row_groups),
+        )
+    else:
+        batches = (batch.select(columns) for batch in _open_ipc(path)[1])
+
+    for batch in batches:
+        if offset >= batch.num_rows:
+            offset -= batch.num_rows
+            continue
+        batch, offset = batch.slice(offset), 0
+        for start in range(0, batch.num_rows, batch_size):
+            yield batch.slice(start, batch_size)
+
+
+def read_frames(path, fmt, headers, string_headers, batch_size, offset=0):
+    """
+    Typed DataFrame chunks of a Parquet or Arrow file, read column batch by
+    column batch. headers maps each accepted file column name to the name the
+    frame should use; string_headers are cast to text (the file may type an
+    MTN or phone number as an integer). The index continues from offset, so
+    it is the row's position in the file.
+    """
+    columns = [name for name in column_names(path, fmt) if name in headers]
+    for batch in _record_batches(path, fmt, columns, batch_size, offset):
+        frame = batch.to_pandas().rename(columns=headers)
+        frame.index = pd.RangeIndex(offset, offset + len(frame))
+        offset += len(frame)
+        for name in frame.columns:
+            column = frame[name]
+            if isinstance(column.dtype, pd.DatetimeTZDtype):
+                frame[name] = column.dt.tz_convert(None)
+            elif name in string_headers and not pd.api.types.is_string_dtype(column):
+                frame[name] = column.astype("string").astype(object)
+        yield frame
+
+
+# ---------------- Writing ----------------
+
+def arrow_schema(table):
+    """Arrow schema for a SQLAlchemy table's columns"""
+    pa = require_pyarrow()
+
+    def arrow_type(column_type):
+        if isinstance(column_type, Boolean):
+            return pa.bool_()
+        if isinstance(column_type, Integer):
+            return pa.int64()
+        if isinstance(column_type, Float):
+            return pa.float64()
+        if isinstance(column_type, DateTime):
+            return pa.timestamp("us")
+        return pa.string()
+
+    return pa.schema([(column.name, arrow_type(column.type)) for column in table.columns])
+
+
+class _Drain(io.RawIOBase):
+    """Write-only sink whose buffered bytes are handed out and dropped after each batch"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def export_batches(connection, statement, table, fmt, batch_size):
+    """
+    Stream the rows of statement (selecting table's columns) as a Parquet file
+    or an Arrow IPC stream: rows are fetched batch_size at a time from a
+    server-side cursor, turned into one Arrow record batch, written and
+    yielded as bytes, so neither the rows nor the file are ever held whole.
+    Each Parquet batch becomes one row group.
+    """
+    pa = require_pyarrow()
+    schema = arrow_schema(table)
+    sink = _Drain()
+    writer = pa.parquet.ParquetWriter(sink, schema) if fmt == "parquet" else pa.ipc.new_stream(sink, schema)
+
+    result = connection.execution_options(stream_results=True).execute(statement)
+    try:
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            writer.write_batch(pa.record_batch([pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                                  schema=schema))
+            yield sink.drain()
+    finally:
+        result.close()
+        writer.close()
+    yield sink.drain()
+
+
+def export_response(model):
+    """
+    Streaming Parquet/Arrow download of a transactions table for offline
+    training, in id order. Query parameters: format (parquet|arrow, default
+    parquet), the row_filters ones (start/end ISO dates on sending_date,
+    sender_id, status, customer_id) and batch_size (rows per record batch /
+    row group). Raises ValueError for bad parameters and ImportError when
+    pyarrow is missing, before anything is streamed.
+    """
+    fmt = request.args.get("format", "parquet")
+    if fmt not in EXPORT_MIMETYPES:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_MIMETYPES)}")
+    batch_size = request.args.get("batch_size", default=current_app.config.get("EXPORT_BATCH_SIZE", 50000), type=int)
+    if not batch_size or batch_size < 1:
+        raise ValueError("batch_size must be a positive integer")
+
+    table = model.__table__
+    conditions = row_filters(table)
+    require_pyarrow()
+
+    statement = select(*table.columns).where(*conditions).order_by(table.c.id)
+
+    filename = f"{table.name}.{EXPORT_EXTENSIONS[fmt]}"
+    logger.info(f"Exporting {table.name} as {fmt} in batches of {batch_size}")
+    return Response(
+        stream_with_context(export_batches(db.session.connection(), statement, table, fmt, batch_size)),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
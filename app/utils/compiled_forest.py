@@ -0,0 +1,164 @@
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+# Arrays written by CompiledForest.save(), one .npy file each
+ARRAY_NAMES = (
+    "feature", "threshold", "left", "right", "missing_left", "value", "roots",
+    "classes_", "feature_importances_",
+)
+
+
+class CompiledForest:
+    """
+    A fitted RandomForestClassifier exported to flat NumPy arrays.
+
+    All trees are concatenated into one node table (feature, threshold, left,
+    right, missing_go_to_left and per-node class probabilities). Leaves point
+    to themselves, so every row advances through all trees together for
+    max_depth vectorized steps without any per-call validation or joblib
+    dispatch. The arithmetic mirrors scikit-learn exactly: inputs are cast to
+    float32, NaNs follow missing_go_to_left, and tree probabilities are summed
+    in estimator order before dividing by the number of trees, so results
+    are bit-for-bit equal to model.predict_proba.
+    """
+
+    def __init__(self, feature, threshold, left, right, missing_left, value, roots, max_depth, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = classes
+        self.n_features_in_ = None
+        self.feature_importances_ = None
+
+    @classmethod
+    def from_estimator(cls, model):
+        import sklearn
+        from sklearn.utils.fixes import parse_version
+
+        # Before scikit-learn 1.4 tree_.value held weighted class counts, which
+        # predict_proba divided by their sum (0 sums left as they are)
+        leaf_counts = parse_version(sklearn.__version__) < parse_version("1.4")
+
+        features, thresholds, lefts, rights, missing, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            missing.append(tree.missing_go_to_left.astype(bool))
+            value = tree.value[:, 0, :model.n_classes_]
+            if leaf_counts:
+                normalizer = value.sum(axis=1, keepdims=True)
+                normalizer[normalizer == 0.0] = 1.0
+                value = value / normalizer
+            values.append(value)
+            offset += tree.node_count
+
+        compiled = cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            missing_left=np.concatenate(missing),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.array(roots, dtype=np.intp),
+            max_depth=max(estimator.tree_.max_depth for estimator in model.estimators_),
+            classes=model.classes_,
+        )
+        compiled.n_features_in_ = model.n_features_in_
+        compiled.feature_importances_ = model.feature_importances_
+        return compiled
+
+    def save(self, directory, metadata=None):
+        """
+        Write the arrays as .npy files so they can be memory-mapped by load().
+        The directory is written under a temporary name and renamed into
+        place, so concurrent workers never see a partial export.
+        """
+        tmp_directory = f"{directory}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(tmp_directory)
+        try:
+            for name in ARRAY_NAMES:
+                np.save(os.path.join(tmp_directory, f"{name}.npy"), getattr(self, name))
+            with open(os.path.join(tmp_directory, "meta.json"), "w") as f:
+                json.dump(dict(metadata or {}, max_depth=int(self.max_depth), n_features_in_=int(self.n_features_in_)), f)
+            os.rename(tmp_directory, directory)
+        except OSError:
+            # Another worker got there first (or the target is not writable)
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            if not os.path.isdir(directory):
+                raise
+
+    @staticmethod
+    def read_metadata(directory):
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def load(cls, directory, mmap_mode=None):
+        """Load an export written by save(); with mmap_mode="r" the arrays are shared page cache"""
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in ARRAY_NAMES
+        }
+        metadata = cls.read_metadata(directory)
+        compiled = cls(
+            feature=arrays["feature"],
+            threshold=arrays["threshold"],
+            left=arrays["left"],
+            right=arrays["right"],
+            missing_left=arrays["missing_left"],
+            value=arrays["value"],
+            roots=arrays["roots"],
+            max_depth=metadata["max_depth"],
+            classes=np.asarray(arrays["classes_"]),
+        )
+        compiled.n_features_in_ = metadata["n_features_in_"]
+        compiled.feature_importances_ = arrays["feature_importances_"]
+        return compiled
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def apply(self, X):
+        """Leaf index of every (tree, row) pair, shape (n_trees, n_rows)"""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected input of shape (n_rows, {self.n_features_in_}), got {X.shape}")
+        if np.isinf(X).any():
+            raise ValueError("Input X contains infinity or a value too large for dtype('float32').")
+
+        rows = np.arange(X.shape[0])
+        nodes = np.repeat(self.roots[:, None], X.shape[0], axis=1)
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[nodes]]
+            go_left = (x <= self.threshold[nodes]) | (np.isnan(x) & self.missing_left[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        leaf_values = self.value[self.apply(X)]
+        # cumsum adds the trees one after another, the same order sklearn uses
+        return leaf_values.cumsum(axis=0)[-1] / self.n_trees
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
@@ -0,0 +1,273 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import case, delete, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+
+from ..database import db
+from ..models import CustomerTransaction, DashboardSenderLabel, DashboardStats, Transaction
+from .feature_store import dialect_insert
+from .scheduler import schedule_app_job
+from .stats import GENUINE, SUSPICIOUS, status_summary
+
+logger = logging.getLogger(__name__)
+
+GENUINE_BIT = 1
+SUSPICIOUS_BIT = 2
+
+# Summary scope -> (model, column identifying the customer)
+SCOPES = {
+    "transactions": (Transaction, Transaction.sender_id),
+    "customer_transactions": (CustomerTransaction, CustomerTransaction.customer_id),
+}
+
+LABEL_CHUNK_SIZE = 500  # Customers per label lookup / write
+
+
+def scope_for(model):
+    for scope, (scope_model, _) in SCOPES.items():
+        if scope_model is model:
+            return scope
+    raise ValueError(f"No dashboard stats for {model.__name__}")
+
+
+def label_bits(status):
+    if status == GENUINE:
+        return GENUINE_BIT
+    if status == SUSPICIOUS:
+        return SUSPICIOUS_BIT
+    return 0
+
+
+def classify(labels):
+    """Customer class from its label bits: genuine-only, suspicious-only, or None (mixed or unlabelled)"""
+    if labels == GENUINE_BIT:
+        return "genuine"
+    if labels == SUSPICIOUS_BIT:
+        return "suspicious"
+    return None
+
+
+def _customer_key(customer_id):
+    # Transactions without a sender are counted as one customer, like the DISTINCT in status_summary
+    return customer_id if customer_id is not None else ""
+
+
+def _apply_inserts(scope, rows):
+    """Add (customer_id, status, total_sale) rows to the scope's totals; False if the summary isn't built yet"""
+    stats = DashboardStats.__table__
+    deltas = dict(total_transactions=0, genuine_transactions=0, suspicious_transactions=0,
+                  total_volume=0.0, genuine_volume=0.0, suspicious_volume=0.0)
+    seen = {}
+    for customer_id, status, total_sale in rows:
+        bits = label_bits(status)
+        volume = total_sale or 0.0
+        deltas["total_transactions"] += 1
+        deltas["total_volume"] += volume
+        if bits == GENUINE_BIT:
+            deltas["genuine_transactions"] += 1
+            deltas["genuine_volume"] += volume
+        elif bits == SUSPICIOUS_BIT:
+            deltas["suspicious_transactions"] += 1
+            deltas["suspicious_volume"] += volume
+        key = _customer_key(customer_id)
+        seen[key] = seen.get(key, 0) | bits
+
+    # Updating the summary row first also takes its row lock, so concurrent writers apply
+    # their label changes below one at a time
+    applied = db.session.execute(
+        update(stats).where(stats.c.scope == scope)
+        .values(updated_at=func.now(), **{name: stats.c[name] + delta for name, delta in deltas.items()})
+    ).rowcount
+    if not applied:
+        return False
+
+    labels = DashboardSenderLabel.__table__
+    customers = dict(total_customers=0, genuine_customers=0, suspicious_customers=0)
+    keys = list(seen)
+    for start in range(0, len(keys), LABEL_CHUNK_SIZE):
+        chunk = keys[start:start + LABEL_CHUNK_SIZE]
+        existing = dict(db.session.execute(
+            select(labels.c.customer_id, labels.c.labels)
+            .where(labels.c.scope == scope, labels.c.customer_id.in_(chunk))
+        ).all())
+        new_rows, changed_rows = [], []
+        for key in chunk:
+            old = existing.get(key)
+            new = (old or 0) | seen[key]
+            if old is None:
+                customers["total_customers"] += 1
+                new_rows.append({"scope": scope, "customer_id": key, "labels": new})
+            elif new != old:
+                changed_rows.append({"scope": scope, "customer_id": key, "labels": new})
+            else:
+                continue
+            before, after = classify(old or 0), classify(new)
+            if before != after:
+                if before:
+                    customers[f"{before}_customers"] -= 1
+                if after:
+                    customers[f"{after}_customers"] += 1
+        if new_rows:
+            db.session.execute(insert(labels), new_rows)
+        for row in changed_rows:
+            db.session.execute(
+                update(labels)
+                .where(labels.c.scope == row["scope"], labels.c.customer_id == row["customer_id"])
+                .values(labels=row["labels"])
+            )
+
+    if any(customers.values()):
+        db.session.execute(
+            update(stats).where(stats.c.scope == scope)
+            .values(**{name: stats.c[name] + delta for name, delta in customers.items()})
+        )
+    return True
+
+
+def record_inserts(transactions):
+    """
+    Fold newly inserted Transaction or CustomerTransaction objects (one model per
+    call) into the dashboard totals, in the caller's transaction without committing.
+
+    Runs in a SAVEPOINT so a failure only affects the summary: the inserted rows
+    are still committed and the summary is flagged stale, which makes the next
+    read rebuild it.
+    """
+    transactions = list(transactions)
+    if not transactions:
+        return
+    model = type(transactions[0])
+    key = SCOPES[scope_for(model)][1].key
+    _record(model, [(getattr(t, key), t.sender_status_detail, t.total_sale) for t in transactions])
+
+
+def record_insert_rows(model, rows):
+    """record_inserts() for rows written with Core statements, given as column dicts"""
+    key = SCOPES[scope_for(model)][1].key
+    _record(model, [(row.get(key), row.get("sender_status_detail"), row.get("total_sale")) for row in rows])
+
+
+def _record(model, rows):
+    if not rows:
+        return
+    scope = scope_for(model)
+    try:
+        with db.session.begin_nested():
+            _apply_inserts(scope, rows)
+    except Exception as e:
+        logger.error(f"Failed to update dashboard stats for {scope}: {str(e)}")
+        mark_dashboard_stats_stale(model)
+
+
+def mark_dashboard_stats_stale(model):
+    """
+    Flag the model's summary for a rebuild on its next read, in the caller's
+    transaction; for changes record_inserts() cannot express (updates, deletes)
+    """
+    scope = scope_for(model)
+    try:
+        with db.session.begin_nested():
+            db.session.execute(update(DashboardStats).where(DashboardStats.scope == scope).values(is_stale=True))
+    except Exception as e:
+        logger.error(f"Failed to flag dashboard stats for {scope} as stale: {str(e)}")
+
+
+def _create_summary_row(scope):
+    """
+    Insert the scope's summary row, flagged stale, unless it exists: concurrent
+    first reads race to create it and all but one insert are no-ops
+    """
+    insert_row = dialect_insert(db.session.get_bind().dialect.name)
+    if insert_row is not None:
+        db.session.execute(
+            insert_row(DashboardStats.__table__)
+            .values(scope=scope, is_stale=True)
+            .on_conflict_do_nothing(index_elements=["scope"])
+        )
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(DashboardStats(scope=scope, is_stale=True))
+    except IntegrityError:
+        pass  # Another reader created it first
+
+
+def rebuild_dashboard_stats(scope):
+    """Recompute the scope's summary row and customer labels from the transactions table (does not commit)"""
+    model, customer_column = SCOPES[scope]
+    labels = DashboardSenderLabel.__table__
+
+    # Lock the summary row first so concurrent inserts and rebuilds wait for this one instead of racing it;
+    # a missing row is created first, as there would be nothing to lock
+    lock = select(DashboardStats).where(DashboardStats.scope == scope).with_for_update()
+    row = db.session.execute(lock).scalar_one_or_none()
+    if row is None:
+        _create_summary_row(scope)
+        row = db.session.execute(lock).scalar_one()
+
+    for name, value in status_summary(model, customer_column).items():
+        if name != "mixed_customers":
+            setattr(row, name, value)
+    row.is_stale = False
+    row.reconciled_at = datetime.now()
+
+    customer_key = func.coalesce(customer_column, "")
+    status = model.sender_status_detail
+    bits = (
+        func.max(case((status == GENUINE, GENUINE_BIT), else_=0))
+        + func.max(case((status == SUSPICIOUS, SUSPICIOUS_BIT), else_=0))
+    )
+    db.session.execute(delete(labels).where(labels.c.scope == scope))
+    db.session.execute(insert(labels).from_select(
+        ["scope", "customer_id", "labels"],
+        select(literal(scope), customer_key, bits).group_by(customer_key),
+    ))
+    db.session.flush()
+    return row
+
+
+def read_dashboard_stats(scope):
+    """
+    The /stats figures for a scope from its summary row: a single-row lookup,
+    rebuilding the summary first if it has never been built or was flagged stale
+    """
+    row = DashboardStats.query.filter_by(scope=scope).one_or_none()
+    if row is None or row.is_stale:
+        logger.info(f"Rebuilding dashboard stats for {scope}")
+        row = rebuild_dashboard_stats(scope)
+        db.session.commit()
+    return row.to_dict()
+
+
+def reconcile_dashboard_stats():
+    """Rebuild every summary from scratch; returns {scope: {stat: (summary value, recomputed value)}} for the stats that had drifted"""
+    drift = {}
+    for scope in SCOPES:
+        before = DashboardStats.query.filter_by(scope=scope).one_or_none()
+        before = before.to_dict() if before is not None else None
+        after = rebuild_dashboard_stats(scope).to_dict()
+        db.session.commit()
+        if before is None:
+            # First build: nothing to compare against
+            continue
+        changed = {name: (before[name], value) for name, value in after.items() if before[name] != value}
+        if changed:
+            drift[scope] = changed
+            logger.warning(f"Dashboard stats for {scope} had drifted: {changed}")
+    return drift
+
+
+def init_dashboard_stats(app):
+    """Register the reconcile CLI command and, if configured, the periodic reconcile job"""
+
+    @app.cli.command("reconcile-dashboard-stats")
+    def reconcile_command():
+        """Rebuild the dashboard_stats summary from the transactions tables."""
+        drift = reconcile_dashboard_stats()
+        print(f"Dashboard stats rebuilt; drift: {drift or 'none'}")
+
+    interval = app.config.get("DASHBOARD_STATS_RECONCILE_INTERVAL", 0)
+    if interval:
+        schedule_app_job(app, reconcile_dashboard_stats, interval, 'dashboard_stats_reconcile',
+                         'Dashboard stats reconcile')
@@ -0,0 +1,359 @@
+import heapq
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+from ..database import db
+from ..models import Transaction
+from .feature_kernel import features_for_senders
+from .feature_store import transaction_watermarks
+
+logger = logging.getLogger(__name__)
+
+# Feature names in the order extract_features_for_sender has always returned them
+FEATURE_NAMES = [
+    "Total Trx", "Total Beneficiaries", "Total Paid out Trx",
+    "Avg Top 05 Daily Trx", "SD of Top 5 Trx_M", "SD of Top 5 Trx_N",
+    "Avg top Volumes", "Std Dev Vol_M", "Std Dev Vol_N",
+    "Date Differences Max", "Date Differences Avg", "Length of Seq",
+    "Avg Top 05 ATV", "Avg Bottom ATV", "Std Dev ATV",
+    "Paid %", "SD Trx Diff", "SD Trx Vol"
+]
+
+TOP_K = 5
+
+# Columns needed to maintain the per-sender state
+STATE_COLUMNS = (
+    Transaction.id,
+    Transaction.sending_date,
+    Transaction.total_sale,
+    Transaction.status,
+    Transaction.beneficiary_client_id,
+)
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _mean(values):
+    """Mean of a top-k list; 0 when it is empty, like the original `... if not top_volumes.empty else 0`"""
+    return sum(values) / len(values) if values else 0
+
+
+def _std(values, ddof):
+    """Two-pass standard deviation over a handful of values (top-k lists)"""
+    n = len(values)
+    if n - ddof <= 0:
+        return float("nan")
+    mean = sum(values) / n
+    return math.sqrt(sum((v - mean) ** 2 for v in values) / (n - ddof))
+
+
+class Welford:
+    """Running mean and variance of a stream of floats"""
+
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def std(self, ddof):
+        if self.count - ddof <= 0:
+            return float("nan")
+        return math.sqrt(self.m2 / (self.count - ddof))
+
+
+class SenderFeatureState:
+    """
+    Running aggregates for one sender's transaction history.
+
+    Rows must be applied in (sending_date, id) order. Each apply() is O(log k)
+    in the size of the top-k structures; features() is O(k). The resulting
+    features match the pandas implementation in extract_features_for_sender
+    up to floating point rounding of the running variance.
+
+    Rows without a sending_date sort last (as pandas does) and are excluded
+    from the daily-count and date-gap features.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built_at = time.monotonic()
+        self.revision = 0  # the sender's sender_revisions.revision when the rows were read
+        self.last_id = 0
+        self.count = 0
+        self.paid_count = 0
+        self.beneficiaries = set()
+
+        # Amounts: Welford over non-null total_sale plus top/bottom heaps
+        self.volumes = Welford()
+        self.top_volumes = []  # min-heap of the k largest amounts
+        self.bottom_volumes = []  # min-heap of the negated k smallest amounts
+
+        # Daily counts and the k busiest days
+        self.daily_counts = {}
+        self.top_days = {}
+
+        # Gaps between consecutive dated transactions
+        self.last_date = None
+        self.has_undated = False
+        self.gap_count = 0
+        self.gap_sum = 0
+        self.gap_max = None
+
+        # Absolute differences between consecutive amounts
+        self.last_sale = None
+        self.sale_diffs = Welford()
+        self.sale_diffs_nan = False
+
+    def accepts(self, sending_date):
+        """Whether a row with this date can be appended without a rebuild"""
+        if self.has_undated:
+            return False
+        if sending_date is None:
+            return True
+        return self.last_date is None or sending_date >= self.last_date
+
+    def apply(self, row_id, sending_date, total_sale, status, beneficiary_client_id):
+        if not self.accepts(sending_date):
+            raise ValueError("Transaction is older than the sender's latest transaction")
+
+        sale = float("nan") if _is_missing(total_sale) else float(total_sale)
+
+        if self.count > 0:
+            diff = abs(sale - self.last_sale)
+            if math.isnan(diff):
+                self.sale_diffs_nan = True
+            else:
+                self.sale_diffs.add(diff)
+        self.last_sale = sale
+
+        self.count += 1
+        self.last_id = max(self.last_id, row_id)
+        if status == "Paid":
+            self.paid_count += 1
+        if not _is_missing(beneficiary_client_id):
+            self.beneficiaries.add(beneficiary_client_id)
+
+        if not math.isnan(sale):
+            self.volumes.add(sale)
+            if len(self.top_volumes) < TOP_K:
+                heapq.heappush(self.top_volumes, sale)
+                heapq.heappush(self.bottom_volumes, -sale)
+            else:
+                heapq.heappushpop(self.top_volumes, sale)
+                heapq.heappushpop(self.bottom_volumes, -sale)
+
+        if sending_date is None:
+            self.has_undated = True
+            return
+
+        day = sending_date.date()
+        day_count = self.daily_counts.get(day, 0) + 1
+        self.daily_counts[day] = day_count
+        # Counts only ever grow, so a day outside the top k can only enter
+        # it by overtaking the current minimum
+        if day in self.top_days or len(self.top_days) < TOP_K:
+            self.top_days[day] = day_count
+        else:
+            min_day = min(self.top_days, key=self.top_days.get)
+            if day_count > self.top_days[min_day]:
+                del self.top_days[min_day]
+                self.top_days[day] = day_count
+
+        if self.last_date is not None:
+            gap = (sending_date - self.last_date).days
+            self.gap_count += 1
+            self.gap_sum += gap
+            self.gap_max = gap if self.gap_max is None else max(self.gap_max, gap)
+        self.last_date = sending_date
+
+    def features(self):
+        n = self.count
+        features = {}
+
+        features["Total Trx"] = n
+        features["Total Beneficiaries"] = len(self.beneficiaries)
+        features["Total Paid out Trx"] = self.paid_count
+
+        if n >= 5:
+            top_daily = list(self.top_days.values())
+            # No dated rows: the original took the mean of an empty Series, which is NaN
+            features["Avg Top 05 Daily Trx"] = _mean(top_daily) if top_daily else float("nan")
+            features["SD of Top 5 Trx_M"] = _std(top_daily, 1) if len(top_daily) > 1 else 0
+            features["SD of Top 5 Trx_N"] = _std(top_daily, 0) if len(top_daily) > 1 else 0
+        else:
+            features["Avg Top 05 Daily Trx"] = 1
+            features["SD of Top 5 Trx_M"] = 0
+            features["SD of Top 5 Trx_N"] = 0
+
+        top_volumes = self.top_volumes
+        bottom_volumes = [-v for v in self.bottom_volumes]
+        features["Avg top Volumes"] = _mean(top_volumes)
+        features["Std Dev Vol_M"] = self.volumes.std(1) if n > 1 else 0
+        features["Std Dev Vol_N"] = self.volumes.std(0) if n > 1 else 0
+
+        if self.gap_count:
+            features["Date Differences Max"] = self.gap_max
+            features["Date Differences Avg"] = self.gap_sum / self.gap_count
+        else:
+            features["Date Differences Max"] = 0
+            features["Date Differences Avg"] = 0
+
+        features["Length of Seq"] = n
+
+        if n >= 5:
+            features["Avg Top 05 ATV"] = _mean(top_volumes)
+            features["Avg Bottom ATV"] = _mean(bottom_volumes)
+            features["Std Dev ATV"] = self.volumes.std(1)
+        else:
+            features["Avg Top 05 ATV"] = 0
+            features["Avg Bottom ATV"] = 0
+            features["Std Dev ATV"] = 0
+
+        features["Paid %"] = (self.paid_count / n) * 100 if n > 0 else 0
+
+        if n > 2:
+            features["SD Trx Diff"] = float("nan") if self.sale_diffs_nan else self.sale_diffs.std(0)
+        else:
+            features["SD Trx Diff"] = 0
+
+        features["SD Trx Vol"] = self.volumes.std(1) if n > 1 else 0
+
+        return features
+
+
+class FeatureEngine:
+    """
+    Per-process store of SenderFeatureState objects.
+
+    features_for() catches a sender's state up with the transactions
+    inserted since it was last read (by this or any other worker) using a
+    single query on last_id < id <= max id, so the cost of a request is
+    proportional to the number of new rows rather than the sender's full
+    history. The state is then checked against the sender's (max id, count,
+    revision) watermark: rows committed out of id order (a long ingest chunk
+    finishing after a later insert), deleted rows, rows updated in place by
+    any worker (which bumps the revision) and a back-dated transaction all
+    force a rebuild of that sender's state from scratch, and so does a state
+    older than FEATURE_STATE_TTL seconds.
+
+    In "vectorized" mode no state is kept and every call recomputes the
+    features from the sender's column arrays (see feature_kernel.py).
+    """
+
+    def __init__(self, max_senders=10000, mode="incremental", ttl=3600):
+        self.max_senders = max_senders
+        self.mode = mode
+        self.ttl = ttl
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_senders = app.config.get("FEATURE_STATE_MAX_SENDERS", self.max_senders)
+        self.mode = app.config.get("FEATURE_ENGINE_MODE", self.mode)
+        self.ttl = app.config.get("FEATURE_STATE_TTL", self.ttl)
+
+    def _get_state(self, sender_id):
+        with self._lock:
+            state = self._states.get(sender_id)
+            if state is None:
+                state = SenderFeatureState()
+                self._states[sender_id] = state
+            self._states.move_to_end(sender_id)
+            while len(self._states) > self.max_senders:
+                self._states.popitem(last=False)
+            return state
+
+    def _fetch_rows(self, sender_id, after_id=0, up_to_id=None):
+        query = select(*STATE_COLUMNS).where(Transaction.sender_id == sender_id)
+        if after_id:
+            query = query.where(Transaction.id > after_id)
+        if up_to_id is not None:
+            query = query.where(Transaction.id <= up_to_id)
+        query = query.order_by(
+            Transaction.sending_date.is_(None),
+            Transaction.sending_date,
+            Transaction.id,
+        )
+        return db.session.execute(query).all()
+
+    def _rebuild(self, sender_id, up_to_id=None):
+        state = SenderFeatureState()
+        for row in self._fetch_rows(sender_id, up_to_id=up_to_id):
+            state.apply(*row)
+        return state
+
+    def _stale_reason(self, state, rows, count, revision):
+        """Why the state can't simply take rows (None if it can)"""
+        if self.ttl and time.monotonic() - state.built_at > self.ttl:
+            return "expired"
+        if state.count and state.revision != revision:
+            return "transactions updated in place"
+        if not all(state.accepts(row.sending_date) for row in rows):
+            return "back-dated transaction"
+        if state.count + len(rows) != count:
+            return "transactions committed out of id order or deleted"
+        return None
+
+    def features_for(self, sender_id, watermark=None):
+        """
+        Return the feature dict for a sender, or None if they have no history.
+        watermark is the sender's Watermark from transaction_watermarks,
+        looked up here when not given; the features cover the sender's
+        transactions up to its max id, at its revision.
+        """
+        if self.mode == "vectorized":
+            return features_for_senders([sender_id])[sender_id]
+
+        if watermark is None:
+            watermark = transaction_watermarks([sender_id]).get(sender_id)
+            if watermark is None:
+                self.invalidate(sender_id)
+                return None
+        max_id, count, revision = watermark
+
+        state = self._get_state(sender_id)
+        with state.lock:
+            rows = self._fetch_rows(sender_id, after_id=state.last_id, up_to_id=max_id)
+            reason = self._stale_reason(state, rows, count, revision)
+            if reason is None:
+                for row in rows:
+                    state.apply(*row)
+                state.revision = revision
+            else:
+                logger.info(f"Rebuilding feature state for sender {sender_id} ({reason})")
+                rebuilt = self._rebuild(sender_id, up_to_id=max_id)
+                rebuilt.revision = revision
+                with self._lock:
+                    if self._states.get(sender_id) is state:
+                        self._states[sender_id] = rebuilt
+                state = rebuilt
+
+            if state.count == 0:
+                return None
+            return state.features()
+
+    def invalidate(self, sender_id=None):
+        """Drop the cached state for one sender, or for everyone"""
+        with self._lock:
+            if sender_id is None:
+                self._states.clear()
+            else:
+                self._states.pop(sender_id, None)
+
+
+feature_engine = FeatureEngine()
@@ -0,0 +1,171 @@
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy import select
+
+from ..database import db
+from ..models import Transaction
+
+NS_PER_DAY = 86400 * 10**9
+TOP_K = 5
+
+# Column arrays for one sender's history
+SenderColumns = namedtuple(
+    "SenderColumns", ["sending_date", "total_sale", "status", "beneficiary_client_id"]
+)
+
+
+def columns_from_rows(rows):
+    """Build SenderColumns from (sending_date, total_sale, status, beneficiary) tuples"""
+    if not rows:
+        empty = np.array([], dtype=object)
+        return SenderColumns(np.array([], dtype="datetime64[ns]"), np.array([], dtype=np.float64), empty, empty)
+    dates, sales, statuses, beneficiaries = zip(*rows)
+    return SenderColumns(
+        np.array([np.datetime64("NaT") if d is None else d for d in dates], dtype="datetime64[ns]"),
+        np.array([np.nan if s is None else s for s in sales], dtype=np.float64),
+        np.array(statuses, dtype=object),
+        np.array(beneficiaries, dtype=object),
+    )
+
+
+def _top_k(values, k=TOP_K, largest=True):
+    if len(values) <= k:
+        return values
+    if largest:
+        return np.partition(values, len(values) - k)[-k:]
+    return np.partition(values, k - 1)[:k]
+
+
+def _std(values, ddof):
+    return float(np.std(values, ddof=ddof)) if len(values) > ddof else float("nan")
+
+
+def _mean(values):
+    """Mean of a top-k array; 0 when it is empty, like the original `... if not top_volumes.empty else 0`"""
+    return float(np.mean(values)) if len(values) else 0
+
+
+def compute_features(columns):
+    """
+    Compute the sender feature dict from column arrays.
+
+    Same semantics as the original DataFrame-based extract_features_for_sender:
+    rows are ordered by sending_date (undated rows last) before the
+    consecutive-difference features are taken, nlargest/nsmallest ignore
+    missing amounts and standard deviations use ddof=1 (pandas) or ddof=0
+    (np.std) exactly where the original did.
+    """
+    n = len(columns.sending_date)
+    if n == 0:
+        return None
+
+    date_ns = columns.sending_date.astype(np.int64)
+    dated = ~np.isnat(columns.sending_date)
+
+    # Order by date with undated rows last, keeping the incoming order for ties
+    order = np.concatenate([
+        np.flatnonzero(dated)[np.argsort(date_ns[dated], kind="stable")],
+        np.flatnonzero(~dated),
+    ])
+    sales = columns.total_sale[order]
+    sorted_ns = date_ns[order][: np.count_nonzero(dated)]
+    valid_sales = sales[~np.isnan(sales)]
+
+    paid_count = int(np.count_nonzero(columns.status == "Paid"))
+    beneficiaries = {b for b in columns.beneficiary_client_id.tolist() if b is not None}
+
+    features = {}
+    features["Total Trx"] = n
+    features["Total Beneficiaries"] = len(beneficiaries)
+    features["Total Paid out Trx"] = paid_count
+
+    if n >= 5:
+        if len(sorted_ns):
+            day_ordinals = sorted_ns // NS_PER_DAY
+            daily_counts = np.bincount(day_ordinals - day_ordinals[0])
+            daily_counts = daily_counts[daily_counts > 0].astype(np.float64)
+        else:
+            daily_counts = np.array([], dtype=np.float64)
+        top_daily = _top_k(daily_counts)
+        # No dated rows: the original took the mean of an empty Series, which is NaN
+        features["Avg Top 05 Daily Trx"] = _mean(top_daily) if len(top_daily) else float("nan")
+        features["SD of Top 5 Trx_M"] = _std(top_daily, 1) if len(top_daily) > 1 else 0
+        features["SD of Top 5 Trx_N"] = _std(top_daily, 0) if len(top_daily) > 1 else 0
+    else:
+        features["Avg Top 05 Daily Trx"] = 1
+        features["SD of Top 5 Trx_M"] = 0
+        features["SD of Top 5 Trx_N"] = 0
+
+    top_volumes = _top_k(valid_sales)
+    features["Avg top Volumes"] = _mean(top_volumes)
+    features["Std Dev Vol_M"] = _std(valid_sales, 1) if n > 1 else 0
+    features["Std Dev Vol_N"] = _std(valid_sales, 0) if n > 1 else 0
+
+    if len(sorted_ns) > 1:
+        date_diffs = np.diff(sorted_ns) // NS_PER_DAY
+        features["Date Differences Max"] = int(date_diffs.max())
+        features["Date Differences Avg"] = int(date_diffs.sum()) / len(date_diffs)
+    else:
+        features["Date Differences Max"] = 0
+        features["Date Differences Avg"] = 0
+
+    features["Length of Seq"] = n
+
+    if n >= 5:
+        features["Avg Top 05 ATV"] = _mean(top_volumes)
+        features["Avg Bottom ATV"] = _mean(_top_k(valid_sales, largest=False))
+        features["Std Dev ATV"] = _std(valid_sales, 1)
+    else:
+        features["Avg Top 05 ATV"] = 0
+        features["Avg Bottom ATV"] = 0
+        features["Std Dev ATV"] = 0
+
+    features["Paid %"] = (paid_count / n) * 100
+
+    if n > 2:
+        features["SD Trx Diff"] = float(np.std(np.abs(np.diff(sales))))
+    else:
+        features["SD Trx Diff"] = 0
+
+    features["SD Trx Vol"] = _std(valid_sales, 1) if n > 1 else 0
+
+    return features
+
+
+def load_sender_columns(sender_ids, chunk_size=500):
+    """
+    Load the feature columns for many senders with one query per chunk of
+    sender ids. Returns {sender_id: SenderColumns} for senders with history;
+    a None sender_id is skipped.
+    """
+    sender_ids = [sender_id for sender_id in dict.fromkeys(sender_ids) if sender_id is not None]
+    grouped = {}
+    for i in range(0, len(sender_ids), chunk_size):
+        query = (
+            select(
+                Transaction.sender_id,
+                Transaction.sending_date,
+                Transaction.total_sale,
+                Transaction.status,
+                Transaction.beneficiary_client_id,
+            )
+            .where(Transaction.sender_id.in_(sender_ids[i:i + chunk_size]))
+            .order_by(Transaction.sender_id, Transaction.id)
+        )
+        for sender_id, *row in db.session.execute(query):
+            grouped.setdefault(sender_id, []).append(row)
+    return {sender_id: columns_from_rows(rows) for sender_id, rows in grouped.items()}
+
+
+def features_for_senders(sender_ids):
+    """
+    Compute feature dicts for many senders; senders without history map to
+    None, and so does a None sender_id: transactions without a sender are
+    not one sender's history
+    """
+    columns = load_sender_columns(sender_ids)
+    return {
+        sender_id: compute_features(columns[sender_id]) if sender_id in columns else None
+        for sender_id in sender_ids
+    }
@@ -0,0 +1,252 @@
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from ..database import db
+from ..models import SenderFeatures, SenderRevision, Transaction
+
+# Model feature name -> sender_features column
+FEATURE_COLUMNS = {
+    "Total Trx": "total_trx",
+    "Total Beneficiaries": "total_beneficiaries",
+    "Total Paid out Trx": "total_paid_out_trx",
+    "Avg Top 05 Daily Trx": "avg_top_05_daily_trx",
+    "SD of Top 5 Trx_M": "sd_of_top_5_trx_m",
+    "SD of Top 5 Trx_N": "sd_of_top_5_trx_n",
+    "Avg top Volumes": "avg_top_volumes",
+    "Std Dev Vol_M": "std_dev_vol_m",
+    "Std Dev Vol_N": "std_dev_vol_n",
+    "Date Differences Max": "date_differences_max",
+    "Date Differences Avg": "date_differences_avg",
+    "Length of Seq": "length_of_seq",
+    "Avg Top 05 ATV": "avg_top_05_atv",
+    "Avg Bottom ATV": "avg_bottom_atv",
+    "Std Dev ATV": "std_dev_atv",
+    "Paid %": "paid_percentage",
+    "SD Trx Diff": "sd_trx_diff",
+    "SD Trx Vol": "sd_trx_vol",
+}
+
+# A sender's position in their transaction history: stored features, cached
+# features and incremental feature state are current only at the same one
+Watermark = namedtuple("Watermark", ["max_id", "count", "revision"])
+
+# Rows per INSERT statement (and senders per IN list); keeps SQLite under its bound-parameter limit
+UPSERT_CHUNK_SIZE = 500
+
+
+class FeatureStoreStats:
+    """Hit/miss counters for reads served from the sender_features table"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.hits = 0
+        self.stale = 0
+        self.missing = 0
+        self.stale_transactions_total = 0
+        self.stale_transactions_max = 0
+        self.stale_age_seconds_total = 0.0
+
+    def record(self, hits=0, missing=0, stale_lags=()):
+        """stale_lags: (transactions behind, seconds since the row was written) per stale row"""
+        with self._lock:
+            self.hits += hits
+            self.missing += missing
+            for transactions_behind, age_seconds in stale_lags:
+                self.stale += 1
+                self.stale_transactions_total += transactions_behind
+                self.stale_transactions_max = max(self.stale_transactions_max, transactions_behind)
+                self.stale_age_seconds_total += age_seconds
+
+    def to_dict(self):
+        with self._lock:
+            reads = self.hits + self.stale + self.missing
+            return {
+                "reads": reads,
+                "hits": self.hits,
+                "stale": self.stale,
+                "missing": self.missing,
+                "hit_rate": self.hits / reads if reads else 0,
+                "avg_stale_transactions": self.stale_transactions_total / self.stale if self.stale else 0,
+                "max_stale_transactions": self.stale_transactions_max,
+                "avg_stale_age_seconds": self.stale_age_seconds_total / self.stale if self.stale else 0,
+            }
+
+
+feature_store_stats = FeatureStoreStats()
+
+
+def sender_revisions(sender_ids, chunk_size=UPSERT_CHUNK_SIZE):
+    """{sender_id: revision} for the given senders (0 for those never updated in place)"""
+    sender_ids = [sid for sid in dict.fromkeys(sender_ids) if sid is not None]
+    revisions = dict.fromkeys(sender_ids, 0)
+    for i in range(0, len(sender_ids), chunk_size):
+        stmt = select(SenderRevision.sender_id, SenderRevision.revision).where(
+            SenderRevision.sender_id.in_(sender_ids[i:i + chunk_size])
+        )
+        revisions.update(db.session.execute(stmt).all())
+    return revisions
+
+
+def bump_sender_revisions(sender_ids, chunk_size=UPSERT_CHUNK_SIZE):
+    """
+    Increment the revision of each sender, in the current session's
+    transaction, after their transactions were updated in place. Every
+    worker compares it with the revision its cached features, its
+    incremental state and the stored features were computed at, so the
+    change is seen by all of them once the caller commits.
+    """
+    sender_ids = [sid for sid in dict.fromkeys(sender_ids) if sid is not None]
+    if not sender_ids:
+        return
+    table = SenderRevision.__table__
+    insert = dialect_insert(db.session.get_bind().dialect.name)
+    if insert is None:
+        existing = {row.sender_id: row for row in SenderRevision.query.filter(SenderRevision.sender_id.in_(sender_ids))}
+        for sender_id in sender_ids:
+            if sender_id in existing:
+                existing[sender_id].revision += 1
+            else:
+                db.session.add(SenderRevision(sender_id=sender_id, revision=1))
+        db.session.flush()
+        return
+
+    for start in range(0, len(sender_ids), chunk_size):
+        stmt = insert(table).values([{"sender_id": sid, "revision": 1} for sid in sender_ids[start:start + chunk_size]])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.sender_id],
+            set_={"revision": table.c.revision + 1, "updated_at": func.now()},
+        ))
+
+
+def transaction_watermarks(sender_ids, chunk_size=UPSERT_CHUNK_SIZE):
+    """
+    {sender_id: Watermark(max transaction id, transaction count, revision)}
+    for senders with history.
+
+    A stored feature row is current when it was computed at exactly this
+    watermark: a new transaction raises the max id, a deleted one lowers
+    the count and an in-place update bumps the revision.
+    """
+    sender_ids = [sid for sid in dict.fromkeys(sender_ids) if sid is not None]
+    watermarks = {}
+    for i in range(0, len(sender_ids), chunk_size):
+        stmt = (
+            select(Transaction.sender_id, func.max(Transaction.id), func.count(Transaction.id))
+            .where(Transaction.sender_id.in_(sender_ids[i:i + chunk_size]))
+            .group_by(Transaction.sender_id)
+        )
+        counts = db.session.execute(stmt).all()
+        revisions = sender_revisions([sender_id for sender_id, _, _ in counts], chunk_size)
+        for sender_id, max_id, count in counts:
+            watermarks[sender_id] = Watermark(max_id, count, revisions[sender_id])
+    return watermarks
+
+
+def stored_features(row):
+    """Model feature dict from a SenderFeatures row"""
+    return {name: getattr(row, column) for name, column in FEATURE_COLUMNS.items()}
+
+
+def read_fresh_features(sender_ids, chunk_size=UPSERT_CHUNK_SIZE):
+    """
+    Look up stored feature vectors that are still current.
+
+    Returns (fresh, watermarks): fresh maps sender_id to its stored features
+    for every sender whose row was written at its current transaction
+    watermark; the other senders need recomputing, and their watermark
+    should be stored with the new row. Senders without any transactions
+    appear in neither dict.
+    """
+    watermarks = transaction_watermarks(sender_ids, chunk_size)
+    senders = list(watermarks)
+    rows = {}
+    for i in range(0, len(senders), chunk_size):
+        for row in SenderFeatures.query.filter(SenderFeatures.sender_id.in_(senders[i:i + chunk_size])):
+            rows[row.sender_id] = row
+
+    fresh, stale_lags, missing = {}, [], 0
+    now = datetime.now()
+    for sender_id, (max_id, count, revision) in watermarks.items():
+        row = rows.get(sender_id)
+        if row is None:
+            missing += 1
+        elif row.last_transaction_id == max_id and row.total_trx == count and row.revision == revision:
+            fresh[sender_id] = stored_features(row)
+        else:
+            written_at = row.updated_at or row.created_at
+            age_seconds = (now - written_at).total_seconds() if written_at else 0.0
+            stale_lags.append((abs(count - row.total_trx), max(age_seconds, 0.0)))
+    feature_store_stats.record(hits=len(fresh), missing=missing, stale_lags=stale_lags)
+    return fresh, watermarks
+
+
+def sender_feature_row(sender_id, features, watermark=None):
+    """
+    Column values for one sender_features row, with NumPy scalars converted
+    to Python types. watermark is the Watermark the features were computed
+    at (None marks the row as never fresh).
+    """
+    row = {
+        "sender_id": sender_id,
+        "last_transaction_id": watermark.max_id if watermark else None,
+        "revision": watermark.revision if watermark else 0,
+    }
+    for name, column in FEATURE_COLUMNS.items():
+        value = features[name]
+        row[column] = value.item() if hasattr(value, "item") else value
+    return row
+
+
+def dialect_insert(dialect_name):
+    """The dialect's insert() with on_conflict_do_update (PostgreSQL, SQLite), or None"""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+
+def upsert_sender_features(rows, chunk_size=UPSERT_CHUNK_SIZE):
+    """
+    Insert or update sender_features rows, keyed on the unique sender_id.
+
+    On PostgreSQL and SQLite this is one INSERT ... ON CONFLICT (sender_id)
+    DO UPDATE per chunk of rows, so there is no SELECT first and concurrent
+    writers for the same sender cannot create duplicates. Other databases
+    fall back to a query-then-update per row. Runs in the current session's
+    transaction; the caller commits.
+    """
+    # ON CONFLICT cannot touch the same row twice in one statement: keep the last row per sender
+    rows = list({row["sender_id"]: row for row in rows}.values())
+    if not rows:
+        return 0
+
+    table = SenderFeatures.__table__
+    insert = dialect_insert(db.session.get_bind().dialect.name)
+    if insert is None:
+        for row in rows:
+            existing = SenderFeatures.query.filter_by(sender_id=row["sender_id"]).first()
+            if existing:
+                for column, value in row.items():
+                    setattr(existing, column, value)
+            else:
+                db.session.add(SenderFeatures(**row))
+        db.session.flush()
+        return len(rows)
+
+    for start in range(0, len(rows), chunk_size):
+        stmt = insert(table).values(rows[start:start + chunk_size])
+        updates = {column: stmt.excluded[column] for column in FEATURE_COLUMNS.values()}
+        updates["last_transaction_id"] = stmt.excluded.last_transaction_id
+        updates["revision"] = stmt.excluded.revision
+        updates["updated_at"] = func.now()
+        db.session.execute(stmt.on_conflict_do_update(index_elements=[table.c.sender_id], set_=updates))
+    return len(rows)
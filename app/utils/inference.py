@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from .compiled_forest import CompiledForest
+
+# Define the feature order used in model training
+FEATURES = [
+    "Total Trx", "Total Beneficiaries", "Total Paid out Trx",
+    "Avg Top 05 Daily Trx", "SD of Top 5 Trx_M", "SD of Top 5 Trx_N",
+    "Avg top Volumes", "Std Dev Vol_M", "Std Dev Vol_N",
+    "Date Differences Max", "Date Differences Avg", "Length of Seq",
+    "Avg Top 05 ATV", "Avg Bottom ATV", "Std Dev ATV",
+    "Date Differences Avg", "Date Differences Max", "Paid %",
+    "SD Trx Diff", "SD Trx Vol"
+]
+
+# Map model output classes to human-readable labels
+LABEL_MAP = {0: "Genuine", 1: "Suspicious"}
+
+Prediction = namedtuple("Prediction", ["label", "confidence", "risk_score", "probabilities"])
+
+
+class InferenceStats:
+    """Call counters and timings for one InferenceModel"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.rows = 0
+        self.tree_traversals = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = 0.0
+
+    def record(self, rows, trees, seconds):
+        with self._lock:
+            self.calls += 1
+            self.rows += rows
+            self.tree_traversals += rows * trees
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            self.last_seconds = seconds
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "rows": self.rows,
+                "tree_traversals": self.tree_traversals,
+                "avg_call_ms": (self.total_seconds / self.calls) * 1000 if self.calls else 0,
+                "max_call_ms": self.max_seconds * 1000,
+                "last_call_ms": self.last_seconds * 1000,
+            }
+
+
+class InferenceModel:
+    """
+    Wraps a loaded classifier for the predict hot path.
+
+    The label for each row is taken from the argmax of a single predict_proba
+    call (which is what the classifier's own predict() does internally), so
+    every tree is walked once per row instead of twice. Output labels and the
+    FEATURES column order are resolved once at construction: feature dicts
+    are turned into a vector of unique feature values and expanded to the
+    model's columns with an index gather, which takes care of the repeated
+    "Date Differences Avg"/"Max" columns.
+
+    With engine="compiled" the forest is exported once into flat arrays
+    (see compiled_forest.py) and evaluated without going through sklearn.
+    The compiled evaluator wins on single rows and small batches; larger
+    batches still go to sklearn, whose per-tree Cython loop is faster there.
+    Both return identical probabilities. A CompiledForest can also be passed
+    in place of the sklearn model (e.g. one memory-mapped from disk), in
+    which case it serves every batch size.
+    """
+
+    compiled_max_rows = 64
+
+    def __init__(self, model, features=FEATURES, label_map=LABEL_MAP, engine="sklearn"):
+        if engine not in ("sklearn", "compiled"):
+            raise ValueError(f"Unknown inference engine: {engine}")
+        if isinstance(model, CompiledForest):
+            engine = "compiled"
+            self.compiled = model
+        else:
+            self.compiled = CompiledForest.from_estimator(model) if engine == "compiled" else None
+        self.model = model
+        self.engine = engine
+        self.feature_names = list(dict.fromkeys(features))
+        self.column_index = np.array([self.feature_names.index(name) for name in features])
+        self.labels = np.array([label_map.get(int(c), "Unknown") for c in model.classes_], dtype=object)
+        self.n_trees = len(getattr(model, "estimators_", ())) or getattr(model, "n_trees", 1)
+        self.stats = InferenceStats()
+
+    def vectorize(self, features_dicts):
+        """Stack feature dicts into the (n_rows, n_model_columns) input matrix"""
+        unique_values = np.array(
+            [[features.get(name, 0) for name in self.feature_names] for features in features_dicts],
+            dtype=np.float64,
+        ).reshape(len(features_dicts), len(self.feature_names))
+        return unique_values[:, self.column_index]
+
+    def predict_proba(self, features_matrix):
+        started = time.perf_counter()
+        if self.compiled is self.model or (self.compiled is not None and len(features_matrix) <= self.compiled_max_rows):
+            probabilities = self.compiled.predict_proba(features_matrix)
+        else:
+            probabilities = self.model.predict_proba(features_matrix)
+        self.stats.record(len(features_matrix), self.n_trees, time.perf_counter() - started)
+        return probabilities
+
+    def predict(self, features_dicts):
+        """Score a list of feature dicts; returns one Prediction per dict"""
+        probabilities = self.predict_proba(self.vectorize(features_dicts))
+        best = probabilities.argmax(axis=1)
+        labels = self.labels[best]
+        confidences = probabilities[np.arange(len(best)), best] * 100
+
+        predictions = []
+        for label, confidence, row in zip(labels, confidences.tolist(), probabilities):
+            risk_score = confidence if label == "Suspicious" else 100 - confidence
+            predictions.append(Prediction(label, confidence, risk_score, row))
+        return predictions
+
+    def predict_one(self, features_dict):
+        return self.predict([features_dict])[0]
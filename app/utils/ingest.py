@@ -0,0 +1,481 @@
+import io
+import logging
+import os
+import time
+
+import click
+import pandas as pd
+from sqlalchemy import Column, Integer, MetaData, Table, delete, exists, func, insert, select, update
+from sqlalchemy.schema import CreateTable
+
+from ..database import db
+from ..models import Notification, SenderFeatures, Transaction
+from .cache import feature_cache
+from .columnar import COLUMNAR_EXTENSIONS, column_names, read_frames
+from .dashboard_stats import mark_dashboard_stats_stale, record_insert_rows
+from .feature_engine import feature_engine
+from .feature_store import bump_sender_revisions, dialect_insert
+from .rollups import adjust_rollups
+
+logger = logging.getLogger(__name__)
+
+INGEST_CHUNK_SIZE = 50000  # CSV rows parsed, written and committed at a time
+ON_DUPLICATE = ("skip", "update")  # What a row whose MTN is already loaded does
+DEDUPE_KEEP = ("first", "last")  # Which copy of a repeated MTN dedupe_transactions() keeps
+
+# CSV header -> transactions column
+CSV_COLUMNS = {
+    "SENDINGDATE": "sending_date",
+    "MTN": "mtn",
+    "SENDER_ID": "sender_id",
+    "SENDER_LEGALNAME": "sender_legal_name",
+    "CHANNEL": "channel",
+    "PAYER_REPCODE": "payer_rep_code",
+    "SENDER_COUNTRY": "sender_country",
+    "SENDER_STATUS": "sender_status",
+    "SENDER_DATEOFBIRTH": "sender_date_of_birth",
+    "SENDER_EMAIL": "sender_email",
+    "SENDER_MOBILE": "sender_mobile",
+    "SENDER_PHONE": "sender_phone",
+    "BENEFICIARY_CLIENTID": "beneficiary_client_id",
+    "BENEFICIARY_NAME": "beneficiary_name",
+    "BENEFICIARY_FIRSTNAME": "beneficiary_first_name",
+    "BENEFICIARY_COUNTRY": "beneficiary_country",
+    "BENEFICIARY_EMAIL": "beneficiary_email",
+    "BENEFICIARY_MOBILE": "beneficiary_mobile",
+    "BENEFICIARY_PHONE": "beneficiary_phone",
+    "SENDING_COUNTRY": "sending_country",
+    "PAYOUTCOUNTRY": "payout_country",
+    "STATUS": "status",
+    "TOTALSALE": "total_sale",
+    "SENDINGCURRENCY": "sending_currency",
+    "PAYMENTMETHOD": "payment_method",
+    "COMPLIANCERELEASEDATE": "compliance_release_date",
+    "Sender_Status": "sender_status_detail",
+}
+OPTIONAL_CSV_COLUMNS = {"Sender_Status"}  # Label column, only present in labelled extracts
+DATE_COLUMNS = ["SENDINGDATE", "SENDER_DATEOFBIRTH", "COMPLIANCERELEASEDATE"]
+NUMERIC_COLUMNS = ["TOTALSALE"]
+
+# Per-connection scratch table each chunk is loaded into before being merged
+# into transactions with set-based statements
+STAGING_TABLE = Table(
+    "transactions_staging",
+    MetaData(),
+    *[Column(name, Transaction.__table__.c[name].type) for name in CSV_COLUMNS.values()],
+    prefixes=["TEMPORARY"],
+)
+
+# Per-connection scratch table listing the extra copies of repeated MTNs and
+# the id of the copy each one is folded into
+DUPLICATES_TABLE = Table(
+    "transactions_duplicates",
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("keep_id", Integer, nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+# Everything is read as text: no per-chunk type inference, identifiers such as
+# phone numbers and MTNs keep their leading zeros, and dates and amounts are
+# converted by the cleaner, which reports the values it cannot convert
+CSV_DTYPES = {header: str for header in CSV_COLUMNS}
+
+
+class IngestError(ValueError):
+    """The file cannot be ingested (the routes turn it into a 400)"""
+
+
+class IngestProgress:
+    """
+    Counters for one ingest, updated after every chunk. A resumed ingest
+    starts from the counters saved with its last committed chunk.
+    """
+
+    def __init__(self, rows_read=0, rows_inserted=0, skipped_rows=None, chunks=0, elapsed=0.0,
+                 rows_updated=0, rows_duplicate=0):
+        self.rows_read = rows_read
+        self.rows_inserted = rows_inserted
+        self.rows_updated = rows_updated
+        self.rows_duplicate = rows_duplicate
+        self.skipped_rows = list(skipped_rows or [])
+        self.chunks = chunks
+        self.started_at = time.monotonic() - elapsed
+        self.elapsed = elapsed
+
+    @property
+    def rows_per_second(self):
+        return self.rows_inserted / self.elapsed if self.elapsed else 0
+
+    def add_chunk(self, rows_read, result):
+        self.rows_read += rows_read
+        self.rows_inserted += len(result.inserted)
+        self.rows_updated += result.updated
+        self.rows_duplicate += result.duplicates
+        self.chunks += 1
+        self.elapsed = time.monotonic() - self.started_at
+
+    def to_dict(self):
+        return {
+            "rows_read": self.rows_read,
+            "rows_inserted": self.rows_inserted,
+            "rows_updated": self.rows_updated,
+            "rows_duplicate": self.rows_duplicate,
+            "rows_skipped": len(self.skipped_rows),
+            "chunks": self.chunks,
+            "seconds": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+
+def validate_header(columns):
+    missing = [header for header in CSV_COLUMNS if header not in columns and header not in OPTIONAL_CSV_COLUMNS]
+    if missing:
+        raise IngestError(f"Missing columns: {', '.join(missing)}")
+
+
+def file_format(filename):
+    """"csv", "parquet" or "arrow" from the file name's extension, or None"""
+    extension = os.path.splitext(filename)[1].lower()
+    return "csv" if extension == ".csv" else COLUMNAR_EXTENSIONS.get(extension)
+
+
+def _columnar_headers():
+    """Accepted Parquet/Arrow column names -> CSV headers: the CSV headers themselves or the transactions columns"""
+    return {**{header: header for header in CSV_COLUMNS}, **{column: header for header, column in CSV_COLUMNS.items()}}
+
+
+def check_header(source, fmt="csv"):
+    """Read just the header (or schema) of a file and validate it"""
+    if fmt != "csv":
+        try:
+            names = column_names(source, fmt)
+        except (ValueError, OSError) as e:
+            raise IngestError(f"Cannot read the {fmt} file: {e}")
+        headers = _columnar_headers()
+        validate_header({headers[name] for name in names if name in headers})
+        return
+    try:
+        validate_header(pd.read_csv(source, nrows=0).columns)
+    except pd.errors.EmptyDataError:
+        raise IngestError("The file is empty")
+
+
+def _to_datetime(values):
+    converted = pd.to_datetime(values, errors="coerce", format="ISO8601")
+    # Extracts are ISO dates; parse whatever else there is value by value
+    retry = converted.isna() & values.notna()
+    if retry.any():
+        converted[retry] = pd.to_datetime(values[retry], errors="coerce", format="mixed")
+    return converted
+
+
+def clean_frame(df):
+    """
+    Convert a CSV frame column by column into transactions columns.
+
+    Dates and TOTALSALE are coerced; a row whose non-empty value cannot be
+    converted is dropped and reported as {"index", "error"}, the index being
+    the row's index in df. Returns (frame, skipped_rows).
+    """
+    df = df.reindex(columns=list(CSV_COLUMNS))
+    invalid = pd.Series(False, index=df.index)
+    errors = pd.Series("", index=df.index)
+    for header in DATE_COLUMNS + NUMERIC_COLUMNS:
+        raw = df[header]
+        converted = _to_datetime(raw) if header in DATE_COLUMNS else pd.to_numeric(raw, errors="coerce")
+        bad = converted.isna() & raw.notna()
+        if bad.any():
+            invalid |= bad
+            errors[bad] = errors[bad] + f"{header}: cannot convert " + raw[bad].map(repr) + "; "
+        df[header] = converted
+
+    skipped_rows = [
+        {"index": int(index), "error": error.rstrip("; ")}
+        for index, error in errors[invalid].items()
+    ]
+    return df[~invalid].rename(columns=CSV_COLUMNS), skipped_rows
+
+
+def clean_transaction_data(df):
+    """Row dicts ready for insert() and the report of rows that were skipped"""
+    validate_header(df.columns)
+    frame, skipped_rows = clean_frame(df)
+    return frame_records(frame), skipped_rows
+
+
+def frame_records(frame):
+    """Row dicts for insert(), with NaN/NaT as None"""
+    # Built from per-column lists: DataFrame.to_dict("records") boxes every cell and is several times slower
+    names = list(frame.columns)
+    columns = [frame[name].astype(object).where(frame[name].notna(), None).tolist() for name in names]
+    return [dict(zip(names, values)) for values in zip(*columns)]
+
+
+def _copy_frame(frame, table):
+    """COPY the frame into table through the session's psycopg2 connection"""
+    buffer = io.StringIO()
+    # Missing values are written as empty unquoted fields, which COPY's csv format reads as NULL
+    frame.to_csv(buffer, index=False, header=False, date_format="%Y-%m-%d %H:%M:%S.%f")
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def _stage(frame, records):
+    """Replace the staging table's contents with the chunk"""
+    db.session.execute(CreateTable(STAGING_TABLE, if_not_exists=True))
+    db.session.execute(delete(STAGING_TABLE))
+    if db.session.get_bind().dialect.name == "postgresql":
+        _copy_frame(frame, STAGING_TABLE)
+    else:
+        db.session.execute(insert(STAGING_TABLE), records)
+
+
+class ChunkResult:
+    """What merging one chunk did: the inserted rows (as dicts) and how many rows updated or duplicated existing ones"""
+
+    def __init__(self, inserted, updated=0, duplicates=0, senders=()):
+        self.inserted = inserted
+        self.updated = updated
+        self.duplicates = duplicates
+        self.senders = set(senders)  # Senders whose history changed
+
+
+def _update_existing(staged_mtns, columns):
+    """
+    Overwrite the given columns of the transactions whose MTN is staged with
+    the staged values. The rows' old and new contributions are swapped in the
+    rollups, the derived per-sender state is dropped and the senders'
+    revisions are bumped so every worker drops theirs too; returns (rows
+    updated, senders touched).
+    """
+    T, S = Transaction, STAGING_TABLE
+    matched = T.mtn.in_(staged_mtns)
+    senders = select(T.sender_id).where(matched).distinct()
+    # In-place updates move neither a sender's max id nor their count, so stored features would look current
+    drop_features = delete(SenderFeatures).where(SenderFeatures.sender_id.in_(senders))
+
+    affected = set(db.session.execute(senders).scalars())
+    db.session.execute(drop_features)
+    adjust_rollups("transactions", matched, -1)
+    updated = db.session.execute(
+        update(T).where(T.mtn == S.c.mtn).values({name: S.c[name] for name in columns if name != "mtn"})
+    ).rowcount
+    adjust_rollups("transactions", matched, 1)
+    affected |= set(db.session.execute(senders).scalars())
+    db.session.execute(drop_features)
+    bump_sender_revisions(affected)
+
+    mark_dashboard_stats_stale(T)
+    return updated, affected
+
+
+def load_frame(frame, on_duplicate="skip", columns=None):
+    """
+    Merge a cleaned chunk into transactions in the current transaction.
+
+    MTN is the transactions' unique key. The chunk is loaded into a staging
+    table and merged with set-based statements: an INSERT ... SELECT of the
+    staged rows whose MTN is not loaded yet (with ON CONFLICT (mtn) DO NOTHING
+    on PostgreSQL and SQLite, so an MTN a concurrent job loads first counts as
+    a duplicate), and with on_duplicate="update" one UPDATE ... FROM the
+    staging table for those that are. Rows without an
+    MTN are always inserted; repeats of an MTN within the chunk keep the first
+    row (skip) or the last (update). An update only overwrites columns (the
+    transactions columns the file has; default all).
+    """
+    if on_duplicate not in ON_DUPLICATE:
+        raise IngestError(f"on_duplicate must be one of {', '.join(ON_DUPLICATE)}")
+    repeated = frame["mtn"].notna() & frame.duplicated("mtn", keep="first" if on_duplicate == "skip" else "last")
+    frame = frame[~repeated]
+    records = frame_records(frame)
+    if not records:
+        return ChunkResult([], duplicates=int(repeated.sum()))
+
+    T, S = Transaction, STAGING_TABLE
+    _stage(frame, records)
+    staged_mtns = select(S.c.mtn).where(S.c.mtn.isnot(None))
+    existing = set(db.session.execute(select(T.mtn).where(T.mtn.in_(staged_mtns))).scalars())
+
+    result = ChunkResult([], duplicates=int(repeated.sum()))
+    # Update first, so the UPDATE ... FROM only matches rows that were already loaded
+    if existing and on_duplicate == "update":
+        result.updated, result.senders = _update_existing(staged_mtns, columns or list(CSV_COLUMNS.values()))
+    else:
+        result.duplicates += len(existing)
+
+    names = list(CSV_COLUMNS.values())
+    new_rows = select(*[S.c[name] for name in names]).where(~exists().where(T.mtn == S.c.mtn))
+    conflict_insert = dialect_insert(db.session.get_bind().dialect.name)
+    if conflict_insert is None:
+        db.session.execute(insert(T).from_select(names, new_rows))
+        result.inserted = [row for row in records if row["mtn"] is None or row["mtn"] not in existing]
+    else:
+        # Another job loading the same MTNs may commit between the check above and this insert:
+        # its rows are skipped by ON CONFLICT and counted as duplicates instead of failing the chunk
+        inserted_mtns = set(db.session.execute(
+            conflict_insert(T).from_select(names, new_rows)
+            .on_conflict_do_nothing(index_elements=[T.mtn])
+            .returning(T.mtn)
+        ).scalars())
+        result.inserted = [row for row in records if row["mtn"] is None or row["mtn"] in inserted_mtns]
+        result.duplicates += sum(
+            1 for row in records
+            if row["mtn"] is not None and row["mtn"] not in existing and row["mtn"] not in inserted_mtns
+        )
+    result.senders |= {row["sender_id"] for row in result.inserted}
+    return result
+
+
+def read_chunks(source, fmt="csv", chunk_size=INGEST_CHUNK_SIZE, offset=0):
+    """
+    DataFrame chunks of a transactions file with CSV headers, starting after
+    its first offset data rows; each chunk's index is the rows' position in
+    the file. CSV is parsed as text with fixed dtypes; Parquet and Arrow
+    files are read column batch by column batch and keep their types.
+    """
+    if fmt != "csv":
+        string_headers = {header for header, column in CSV_COLUMNS.items()
+                          if header not in DATE_COLUMNS + NUMERIC_COLUMNS}
+        yield from read_frames(source, fmt, _columnar_headers(), string_headers, chunk_size, offset)
+        return
+
+    try:
+        reader = pd.read_csv(
+            source,
+            dtype=CSV_DTYPES,
+            usecols=lambda header: header in CSV_COLUMNS,
+            # Row 0 is the header; skip the data rows a previous run committed
+            skiprows=(lambda row: 0 < row <= offset) if offset else None,
+            chunksize=chunk_size,
+        )
+    except pd.errors.EmptyDataError:
+        raise IngestError("The file is empty")
+    with reader:
+        for chunk in reader:
+            chunk.index += offset
+            yield chunk
+
+
+def ingest_file(source, fmt="csv", chunk_size=INGEST_CHUNK_SIZE, on_chunk=None, progress=None, on_duplicate="skip"):
+    """
+    Stream a transactions file (CSV path or file object, Parquet or Arrow
+    path) into the database.
+
+    The file is read chunk_size rows at a time (read_chunks); each chunk is
+    cleaned column-wise (clean_frame), staged with COPY on PostgreSQL or one
+    executemany INSERT elsewhere, merged on MTN (load_frame) and committed
+    before the next one is read, so memory stays bounded by the chunk size
+    whatever the file size. A failure keeps the chunks already committed.
+    Rows whose dates or amount cannot be converted are skipped and listed in
+    progress.skipped_rows.
+
+    on_chunk(progress) is called before each commit, so whatever it writes
+    commits atomically with the chunk. Passing the progress saved with the
+    last commit resumes after the rows it has already read.
+    """
+    progress = progress or IngestProgress()
+    chunks = read_chunks(source, fmt, chunk_size or INGEST_CHUNK_SIZE, offset=progress.rows_read)
+    for number, chunk in enumerate(chunks):
+        if number == 0:
+            validate_header(chunk.columns)
+        frame, skipped_rows = clean_frame(chunk)
+        progress.skipped_rows.extend(skipped_rows)
+        result = load_frame(frame, on_duplicate, columns=[CSV_COLUMNS[header] for header in chunk.columns])
+        record_insert_rows(Transaction, result.inserted)
+
+        progress.add_chunk(len(chunk), result)
+        if on_chunk:
+            on_chunk(progress)
+        db.session.commit()
+        feature_cache.invalidate_many(result.senders)
+        for sender_id in result.senders:
+            feature_engine.invalidate(sender_id)
+        logger.info(f"Ingested chunk {progress.chunks}: {progress.rows_inserted} rows inserted, "
+                    f"{progress.rows_updated} updated, {progress.rows_duplicate} duplicates "
+                    f"in {progress.elapsed:.1f}s ({progress.rows_per_second:.0f} rows/s)")
+    return progress
+
+
+def ingest_csv(source, **options):
+    """ingest_file() for a CSV path or file object"""
+    return ingest_file(source, "csv", **options)
+
+
+def duplicate_mtns():
+    """(mtn, copies) for every MTN loaded more than once, most copies first"""
+    copies = func.count(Transaction.id)
+    return db.session.execute(
+        select(Transaction.mtn, copies)
+        .where(Transaction.mtn.isnot(None))
+        .group_by(Transaction.mtn)
+        .having(copies > 1)
+        .order_by(copies.desc(), Transaction.mtn)
+    ).all()
+
+
+def dedupe_transactions(keep="first"):
+    """
+    Delete all but one copy of every MTN loaded more than once, keeping the
+    lowest id (keep="first") or the highest ("last"), so the unique MTN
+    index can be built. One ROW_NUMBER() pass over transactions lists the
+    extra copies in a temporary table; notifications about them are pointed
+    at the kept copy and their rollup contributions are subtracted before
+    they are deleted. Commits; returns how many rows were deleted.
+    """
+    if keep not in DEDUPE_KEEP:
+        raise IngestError(f"keep must be one of {', '.join(DEDUPE_KEEP)}")
+    T, D = Transaction, DUPLICATES_TABLE
+    order = T.id.asc() if keep == "first" else T.id.desc()
+    ranked = select(
+        T.id,
+        func.first_value(T.id).over(partition_by=T.mtn, order_by=order).label("keep_id"),
+        func.row_number().over(partition_by=T.mtn, order_by=order).label("copy"),
+    ).where(T.mtn.isnot(None)).subquery()
+
+    db.session.execute(CreateTable(D, if_not_exists=True))
+    db.session.execute(delete(D))
+    db.session.execute(insert(D).from_select(
+        ["id", "keep_id"], select(ranked.c.id, ranked.c.keep_id).where(ranked.c.copy > 1)
+    ))
+    duplicates = select(D.c.id)
+    senders = set(db.session.execute(select(T.sender_id).where(T.id.in_(duplicates)).distinct()).scalars())
+    removed = db.session.execute(select(func.count()).select_from(D)).scalar()
+    if removed:
+        db.session.execute(
+            update(Notification)
+            .where(Notification.transaction_id.in_(duplicates))
+            .values(transaction_id=select(D.c.keep_id).where(D.c.id == Notification.transaction_id).scalar_subquery())
+        )
+        adjust_rollups("transactions", T.id.in_(duplicates), -1)
+        db.session.execute(delete(T).where(T.id.in_(duplicates)))
+        mark_dashboard_stats_stale(T)
+    db.session.execute(delete(D))
+    db.session.commit()
+    # Deletes lower the senders' counts, so stored features and engine state are already stale
+    feature_cache.invalidate_many(senders)
+    return removed
+
+
+def init_ingest(app):
+    """Register the dedupe CLI command"""
+
+    @app.cli.command("dedupe-transactions")
+    @click.option("--keep", type=click.Choice(DEDUPE_KEEP), default="first", show_default=True,
+                  help="Which copy of a repeated MTN to keep: the lowest id or the highest.")
+    @click.option("--dry-run", is_flag=True, help="Only list the repeated MTNs.")
+    def dedupe_command(keep, dry_run):
+        """Delete repeated MTNs from transactions, so the unique MTN index can be created."""
+        duplicated = duplicate_mtns()
+        for mtn, copies in duplicated[:20]:
+            print(f"{mtn}: {copies} copies")
+        if len(duplicated) > 20:
+            print(f"... and {len(duplicated) - 20} more")
+        if dry_run or not duplicated:
+            print(f"MTNs loaded more than once: {len(duplicated)}")
+            return
+        print(f"Transactions deleted: {dedupe_transactions(keep)} (kept the {keep} copy of {len(duplicated)} MTNs)")
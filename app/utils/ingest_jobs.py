@@ -0,0 +1,224 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, or_, update
+
+from ..database import db
+from ..models import IngestJob
+from .ingest import IngestProgress, file_format, ingest_file
+from .scheduler import schedule_app_job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPOOL_DIR = os.path.join(tempfile.gettempdir(), "fraud-detection-ingest")
+
+
+class IngestJobRunner:
+    """
+    Runs CSV ingestion jobs (IngestJob rows) on a local thread pool, so the
+    upload request only spools the file and returns the job id.
+
+    A worker claims a job with a compare-and-set UPDATE on its status and
+    heartbeat, so one job never runs twice at once, even across processes.
+    ingest_csv saves the job's counters in the same transaction as each
+    chunk; a job whose worker died (failed, or no heartbeat for
+    INGEST_JOB_STALE_AFTER seconds) can be claimed again and carries on
+    after the last committed chunk.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions["ingest_jobs"] = self
+
+        @app.cli.command("resume-ingest-jobs")
+        def resume_command():
+            """Run failed and stalled upload jobs to completion in this process."""
+            for job in self.resumable_jobs():
+                job = self.run(job.id)
+                print(f"Ingest job {job.id}: {job.status}, {job.rows_inserted} rows inserted")
+
+        interval = app.config.get("INGEST_RESUME_INTERVAL", 0)
+        if interval:
+            schedule_app_job(app, self.resume_stale, interval, 'ingest_job_resume', 'Ingest job resume')
+
+    # ---------------- Enqueueing ----------------
+
+    def spool_upload(self, file):
+        """Save an uploaded file where the workers can read it; returns its path"""
+        spool_dir = current_app.config.get("INGEST_SPOOL_DIR") or DEFAULT_SPOOL_DIR
+        os.makedirs(spool_dir, exist_ok=True)
+        # Keep the extension: it tells the job the file's format
+        path = os.path.join(spool_dir, uuid.uuid4().hex + os.path.splitext(file.filename)[1].lower())
+        file.save(path)
+        return path
+
+    def enqueue(self, source_path, filename=None, delete_source=False, on_duplicate="skip"):
+        """Record a queued job for the file and hand it to the pool"""
+        job = IngestJob(
+            filename=filename or os.path.basename(source_path),
+            source_path=source_path,
+            delete_source=delete_source,
+            on_duplicate=on_duplicate,
+            status="queued",
+            heartbeat_at=datetime.utcnow(),
+        )
+        db.session.add(job)
+        db.session.commit()
+        self.submit(job.id)
+        return job
+
+    def submit(self, job_id, app=None):
+        app = app or current_app._get_current_object()
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=app.config.get("INGEST_WORKERS", 2), thread_name_prefix="ingest"
+                )
+            future = self._executor.submit(self._run_in_app, app, job_id)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda _: self._futures.pop(job_id, None))
+        return future
+
+    def wait(self, job_id, timeout=None):
+        """Block until a job submitted by this process has finished"""
+        future = self._futures.get(job_id)
+        if future is not None:
+            future.result(timeout)
+
+    # ---------------- Running ----------------
+
+    def _run_in_app(self, app, job_id):
+        with app.app_context():
+            try:
+                self.run(job_id)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Ingest job {job_id} crashed: {e}")
+
+    def _claim(self, job):
+        """Mark the job running if nobody changed it since it was read"""
+        now = datetime.utcnow()
+        heartbeat = (IngestJob.heartbeat_at == job.heartbeat_at if job.heartbeat_at is not None
+                     else IngestJob.heartbeat_at.is_(None))
+        claimed = db.session.execute(
+            update(IngestJob)
+            .where(IngestJob.id == job.id, IngestJob.status == job.status, heartbeat)
+            .values(
+                status="running",
+                attempts=IngestJob.attempts + 1,
+                started_at=func.coalesce(IngestJob.started_at, now),
+                heartbeat_at=now,
+                error=None,
+            )
+        ).rowcount
+        db.session.commit()
+        return bool(claimed)
+
+    def _finish(self, job_id, status, error=None):
+        db.session.execute(
+            update(IngestJob).where(IngestJob.id == job_id)
+            .values(status=status, error=error, finished_at=datetime.utcnow(), heartbeat_at=datetime.utcnow())
+        )
+        db.session.commit()
+
+    def run(self, job_id):
+        """Claim the job and ingest its file from where it stopped; returns the job"""
+        job = db.session.get(IngestJob, job_id)
+        if job is None or job.status == "completed":
+            return job
+        if not self._claim(job):
+            logger.info(f"Ingest job {job_id} was claimed by another worker")
+            return job
+        db.session.refresh(job)
+
+        def save_progress(progress):
+            # Runs inside the chunk's transaction: the counters commit with the rows
+            db.session.execute(
+                update(IngestJob).where(IngestJob.id == job_id).values(
+                    rows_read=progress.rows_read,
+                    rows_inserted=progress.rows_inserted,
+                    rows_updated=progress.rows_updated,
+                    rows_duplicate=progress.rows_duplicate,
+                    skipped_rows=json.dumps(progress.skipped_rows),
+                    chunks=progress.chunks,
+                    elapsed_seconds=progress.elapsed,
+                    heartbeat_at=datetime.utcnow(),
+                )
+            )
+
+        progress = IngestProgress(
+            rows_read=job.rows_read,
+            rows_inserted=job.rows_inserted,
+            rows_updated=job.rows_updated,
+            rows_duplicate=job.rows_duplicate,
+            skipped_rows=json.loads(job.skipped_rows) if job.skipped_rows else [],
+            chunks=job.chunks,
+            elapsed=job.elapsed_seconds or 0,
+        )
+        if progress.rows_read:
+            logger.info(f"Resuming ingest job {job_id} after row {progress.rows_read}")
+        try:
+            ingest_file(
+                job.source_path,
+                file_format(job.source_path),
+                chunk_size=current_app.config.get("INGEST_CHUNK_SIZE"),
+                on_chunk=save_progress,
+                progress=progress,
+                on_duplicate=job.on_duplicate,
+            )
+        except Exception as e:
+            # Chunks committed so far stay, and so do their counters: a resume continues from there
+            db.session.rollback()
+            logger.error(f"Ingest job {job_id} failed after {job.rows_read} rows: {e}")
+            self._finish(job_id, "failed", error=str(e))
+        else:
+            self._finish(job_id, "completed")
+            if job.delete_source:
+                try:
+                    os.remove(job.source_path)
+                except OSError:
+                    pass
+        db.session.refresh(job)
+        return job
+
+    # ---------------- Resuming ----------------
+
+    def is_resumable(self, job):
+        if job.status == "failed":
+            return True
+        if job.status in ("queued", "running"):
+            stale_after = current_app.config.get("INGEST_JOB_STALE_AFTER", 300)
+            return job.heartbeat_at is None or job.heartbeat_at < datetime.utcnow() - timedelta(seconds=stale_after)
+        return False
+
+    def resumable_jobs(self):
+        stale_after = current_app.config.get("INGEST_JOB_STALE_AFTER", 300)
+        cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+        return IngestJob.query.filter(
+            or_(
+                IngestJob.status == "failed",
+                IngestJob.status.in_(("queued", "running")) & or_(
+                    IngestJob.heartbeat_at.is_(None), IngestJob.heartbeat_at < cutoff
+                ),
+            )
+        ).order_by(IngestJob.id).all()
+
+    def resume_stale(self):
+        """Hand stalled jobs (worker gone) back to the pool; failed ones wait for an explicit resume"""
+        for job in self.resumable_jobs():
+            if job.status != "failed":
+                self.submit(job.id)
+
+
+ingest_jobs = IngestJobRunner()
@@ -0,0 +1,523 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import resource
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import joblib
+
+from .compiled_forest import ARRAY_NAMES, CompiledForest
+from .inference import InferenceModel
+
+logger = logging.getLogger(__name__)
+
+# Default location of the trained ML model
+MODEL_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../random_forest_model.pkl'))
+
+# Default name of the file, next to MODEL_FILE, where the active version is published to every worker
+POINTER_FILE_NAME = "active_model.json"
+
+
+def process_rss_bytes():
+    """Resident set size of this process (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return {"source_size": stat.st_size, "source_mtime": stat.st_mtime}
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """First 12 hex digits of the SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+class ModelVersion:
+    """One loaded model plus the bookkeeping needed to drain it"""
+
+    def __init__(self, version, path, signature, inference, source, load_seconds, rss_before_load, rss_after_load):
+        self.version = version
+        self.path = path
+        self.signature = signature
+        self.digest = None  # Content hash, for versions loaded by the file watcher
+        self.inference = inference
+        self.source = source
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.activated_at = None
+        self.rss_before_load = rss_before_load
+        self.rss_after_load = rss_after_load
+        self.in_flight = 0
+        self.retired = False
+
+    def to_dict(self):
+        compiled_bytes = None
+        if self.inference is not None and self.inference.compiled is not None:
+            compiled_bytes = sum(getattr(self.inference.compiled, name).nbytes for name in ARRAY_NAMES)
+        return {
+            "version": self.version,
+            "path": self.path,
+            "engine": self.inference.engine if self.inference is not None else None,
+            "source": self.source,
+            "load_seconds": self.load_seconds,
+            "loaded_at": self.loaded_at,
+            "activated_at": self.activated_at,
+            "in_flight": self.in_flight,
+            "retired": self.retired,
+            "compiled_array_bytes": compiled_bytes,
+            "rss_before_load_bytes": self.rss_before_load,
+            "rss_after_load_bytes": self.rss_after_load,
+        }
+
+
+class ModelRegistry:
+    """
+    Holds the loaded model versions and which one is active.
+
+    The default model (MODEL_FILE, recorded as MODEL_VERSION) is loaded on
+    first use instead of at import time. More versions can be loaded next to
+    it and activated with an atomic pointer swap: requests score inside
+    acquire(), which pins the version that was active when they started, so
+    a swap never interrupts in-flight scoring. A retired version is released
+    once its last in-flight request finishes. An optional watcher thread
+    reloads MODEL_FILE when it changes on disk.
+
+    Every gunicorn worker has its own registry. Versions loaded and activated
+    through /model/versions are published in a pointer file (MODEL_POINTER_FILE)
+    that each worker's watcher polls, so all of them load and switch to the
+    published version within MODEL_SYNC_INTERVAL seconds. The watcher starts
+    with a process's first request, so CLI commands run without it.
+
+    scikit-learn copies tree arrays into private buffers when unpickling, so
+    with MODEL_MMAP_MODE set and the compiled engine selected the registry
+    exports each forest once to .npy files next to the model (see
+    CompiledForest.save) and every worker memory-maps those instead of
+    unpickling, sharing the pages between forked workers.
+    """
+
+    def __init__(self, model_file=MODEL_FILE):
+        self.model_file = model_file
+        self.default_version = "v1.0"
+        self.engine = "sklearn"
+        self.mmap_mode = None
+        self.cache_dir = None
+        self.watch_interval = 0
+        self.pointer_file = None
+        self.sync_interval = 0
+        self._pointer_mtime = None
+        self._versions = {}
+        self._active = None
+        self._default_attempted = False
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self._load_lock = threading.Lock()
+        self._watcher = None
+        self._watcher_pid = None
+
+    def init_app(self, app):
+        self.model_file = app.config.get("MODEL_FILE") or self.model_file
+        self.default_version = app.config.get("MODEL_VERSION") or self.default_version
+        self.engine = app.config.get("INFERENCE_ENGINE", self.engine)
+        self.mmap_mode = app.config.get("MODEL_MMAP_MODE") or None
+        self.cache_dir = app.config.get("MODEL_CACHE_DIR")
+        self.watch_interval = app.config.get("MODEL_WATCH_INTERVAL", 0)
+        self.pointer_file = app.config.get("MODEL_POINTER_FILE") or None
+        self.sync_interval = app.config.get("MODEL_SYNC_INTERVAL", 0)
+        if app.config.get("MODEL_PRELOAD"):
+            # Load before gunicorn forks so workers share the pages copy-on-write
+            self.get()
+        if self.sync_interval or self.watch_interval:
+            @app.before_request
+            def start_model_watcher():
+                # Only a process serving requests follows the model files: CLI commands
+                # (flask db upgrade, ...) never start the thread
+                if self._watcher_pid != os.getpid():
+                    self.start_watcher()
+
+    # ---------------- Loading ----------------
+
+    @property
+    def loaded(self):
+        return self._active is not None
+
+    def _ensure_default(self):
+        if self._watcher_pid not in (None, os.getpid()):
+            # Forked after the watcher started (gunicorn --preload): threads do not survive a fork
+            self.start_watcher()
+        if self._active is not None or self._default_attempted:
+            return
+        with self._load_lock:
+            if self._active is None and not self._default_attempted:
+                self._default_attempted = True
+                # A worker starting after a version was published begins on it
+                if self.sync_interval and self.sync_active_version() is not None:
+                    return
+                if not os.path.exists(self.model_file):
+                    logger.error(f"❌ ERROR: Model file not found: {self.model_file}")
+                    return
+                self.load_version(self.default_version, self.model_file, activate=True)
+
+    def _compiled_export_dir(self, path):
+        if self.cache_dir and os.path.abspath(path) == os.path.abspath(self.model_file):
+            return self.cache_dir
+        return f"{path}.compiled"
+
+    def _load_compiled_export(self, path, export_dir):
+        metadata = CompiledForest.read_metadata(export_dir)
+        if not metadata or any(metadata.get(k) != v for k, v in file_signature(path).items()):
+            return None
+        try:
+            compiled = CompiledForest.load(export_dir, mmap_mode=self.mmap_mode)
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable compiled model export {export_dir}: {e}")
+            return None
+        return InferenceModel(compiled, engine="compiled")
+
+    def _write_compiled_export(self, compiled, path, export_dir):
+        if os.path.isdir(export_dir):
+            logger.info(f"Replacing stale compiled model export {export_dir}")
+            stale_dir = f"{export_dir}.{os.getpid()}.stale"
+            try:
+                os.rename(export_dir, stale_dir)
+                shutil.rmtree(stale_dir, ignore_errors=True)
+            except OSError:
+                pass
+        try:
+            compiled.save(export_dir, metadata=file_signature(path))
+        except OSError as e:
+            logger.warning(f"Could not write compiled model export to {export_dir}: {e}")
+
+    def load_version(self, version, path, activate=False):
+        """
+        Load a model file as `version`. The expensive part runs without
+        holding the registry lock, so scoring continues on the active version.
+        """
+        path = os.path.abspath(path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model file not found: {path}")
+        with self._lock:
+            if version in self._versions:
+                raise ValueError(f"Model version {version} is already loaded")
+
+        signature = file_signature(path)
+        rss_before_load = process_rss_bytes()
+        started = time.perf_counter()
+
+        inference, source = None, "pickle"
+        use_export = self.engine == "compiled" and self.mmap_mode
+        export_dir = self._compiled_export_dir(path)
+        if use_export:
+            inference = self._load_compiled_export(path, export_dir)
+            source = "mmap" if inference is not None else source
+        if inference is None:
+            model = joblib.load(path, mmap_mode=self.mmap_mode)
+            inference = InferenceModel(model, engine=self.engine)
+            if use_export:
+                self._write_compiled_export(inference.compiled, path, export_dir)
+
+        entry = ModelVersion(
+            version, path, signature, inference, source,
+            load_seconds=time.perf_counter() - started,
+            rss_before_load=rss_before_load,
+            rss_after_load=process_rss_bytes(),
+        )
+        logger.info(f"✅ Model {version} loaded successfully from {source} in {entry.load_seconds:.3f}s")
+
+        with self._lock:
+            if version in self._versions:
+                raise ValueError(f"Model version {version} is already loaded")
+            self._versions[version] = entry
+        if activate:
+            self.activate(version)
+        return entry
+
+    # ---------------- Switching versions ----------------
+
+    def activate(self, version, retire_previous=False):
+        """Atomically make `version` the one new requests are scored with"""
+        with self._lock:
+            entry = self._versions.get(version)
+            if entry is None:
+                raise KeyError(f"Model version {version} is not loaded")
+            previous = self._active
+            entry.activated_at = time.time()
+            self._active = entry
+            if retire_previous and previous is not None and previous is not entry:
+                self._retire(previous)
+        logger.info(f"Active model version is now {version}")
+        return entry
+
+    def _retire(self, entry):
+        # Caller holds self._lock
+        entry.retired = True
+        self._versions.pop(entry.version, None)
+        if entry.in_flight == 0:
+            entry.inference = None
+
+    def unload(self, version, timeout=30):
+        """Remove an inactive version, waiting up to `timeout` seconds for its requests to drain"""
+        with self._lock:
+            entry = self._versions.get(version)
+            if entry is None:
+                raise KeyError(f"Model version {version} is not loaded")
+            if entry is self._active:
+                raise ValueError("Cannot unload the active model version")
+            self._retire(entry)
+            drained = self._drained.wait_for(lambda: entry.in_flight == 0, timeout=timeout)
+        return drained
+
+    @contextmanager
+    def acquire(self):
+        """
+        Pin the active version for the duration of a request.
+        Yields the ModelVersion, or None if no model could be loaded.
+        """
+        self._ensure_default()
+        with self._lock:
+            entry = self._active
+            if entry is not None:
+                entry.in_flight += 1
+        try:
+            yield entry
+        finally:
+            if entry is not None:
+                with self._lock:
+                    entry.in_flight -= 1
+                    if entry.in_flight == 0:
+                        if entry.retired:
+                            entry.inference = None
+                        self._drained.notify_all()
+
+    def get(self):
+        """Return the active InferenceModel, loading the default on first use; None if unavailable"""
+        self._ensure_default()
+        entry = self._active
+        return entry.inference if entry is not None else None
+
+    @property
+    def active_version(self):
+        entry = self._active
+        return entry.version if entry is not None else None
+
+    # ---------------- Sharing the active version between workers ----------------
+
+    @property
+    def pointer_path(self):
+        return self.pointer_file or os.path.join(os.path.dirname(os.path.abspath(self.model_file)), POINTER_FILE_NAME)
+
+    def read_pointer(self):
+        """
+        The published state: {"active": {"version", "path", "retire_previous",
+        "activated_at"} or None, "versions": {version: path}}
+        """
+        try:
+            with open(self.pointer_path) as f:
+                pointer = json.load(f)
+        except FileNotFoundError:
+            pointer = {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable model pointer {self.pointer_path}: {e}")
+            pointer = {}
+        return {"active": pointer.get("active"), "versions": pointer.get("versions") or {}}
+
+    @contextmanager
+    def _edit_pointer(self):
+        """Read, modify and atomically replace the pointer file, serialized across workers by a lock file"""
+        path = self.pointer_path
+        with open(f"{path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            pointer = self.read_pointer()
+            yield pointer
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(pointer, f, indent=2)
+            os.replace(temp_path, path)
+
+    def publish(self, entry, activate=False, retire_previous=False):
+        """Record a loaded version in the pointer file and, with activate, make it every worker's active version"""
+        with self._edit_pointer() as pointer:
+            pointer["versions"][entry.version] = entry.path
+            if activate:
+                pointer["active"] = {
+                    "version": entry.version,
+                    "path": entry.path,
+                    "retire_previous": retire_previous,
+                    "activated_at": time.time(),
+                }
+
+    def unpublish(self, version):
+        """Forget an unloaded version, so no worker loads it from the pointer file again"""
+        with self._edit_pointer() as pointer:
+            pointer["versions"].pop(version, None)
+
+    def switch_to(self, version, retire_previous=False):
+        """
+        Activate `version` in this worker and publish it to the others. A
+        version another worker loaded is first loaded here from its
+        published path; KeyError if no worker loaded it.
+        """
+        with self._lock:
+            loaded = version in self._versions
+        if not loaded:
+            path = self.read_pointer()["versions"].get(version)
+            if path is None:
+                raise KeyError(f"Model version {version} is not loaded")
+            try:
+                self.load_version(version, path)
+            except ValueError:
+                pass  # Loaded by a concurrent request in the meantime
+        entry = self.activate(version, retire_previous=retire_previous)
+        self.publish(entry, activate=True, retire_previous=retire_previous)
+        return entry
+
+    def sync_active_version(self):
+        """
+        Switch to the version published in the pointer file if this worker
+        is on another one, loading it first when needed. Returns the newly
+        activated ModelVersion, or None when there was nothing to do.
+        """
+        try:
+            mtime = os.stat(self.pointer_path).st_mtime_ns
+        except OSError:
+            return None
+        if mtime == self._pointer_mtime:
+            return None
+        self._pointer_mtime = mtime
+
+        published = self.read_pointer()["active"]
+        current = self._active
+        if not published or (current is not None and current.version == published["version"]):
+            return None
+        if current is not None and current.path == published["path"] == os.path.abspath(self.model_file):
+            # Both are MODEL_FILE: replacing it is followed by check_for_update, under a content-hash name
+            return None
+
+        version = published["version"]
+        with self._lock:
+            loaded = version in self._versions
+        if not loaded:
+            try:
+                self.load_version(version, published["path"])
+            except ValueError:
+                pass  # Loaded by a concurrent request in the meantime
+            except Exception as e:
+                logger.warning(f"Could not load published model version {version} from {published['path']}: {e}")
+                self._pointer_mtime = None  # Try again next tick
+                return None
+        logger.info(f"Following published model version {version}")
+        return self.activate(version, retire_previous=published.get("retire_previous", False))
+
+    # ---------------- Watching the model file ----------------
+
+    def check_for_update(self):
+        """
+        Reload MODEL_FILE as a new version if it changed since the active
+        version was loaded. The version is named after the file's content
+        hash, so every worker names the same file the same way, and a file
+        rewritten with the same contents (or touched) is not reloaded.
+        """
+        active = self._active
+        if active is None or active.path != os.path.abspath(self.model_file):
+            return None
+        try:
+            signature = file_signature(self.model_file)
+            if signature == active.signature:
+                return None
+            digest = file_digest(self.model_file)
+        except OSError:
+            return None
+        if digest == active.digest:
+            logger.info(f"Model file {self.model_file} was rewritten with the same contents; keeping {active.version}")
+            active.signature = signature
+            return None
+
+        version = f"{self.default_version}+{digest}"
+        with self._lock:
+            entry = self._versions.get(version)
+        if entry is None:
+            try:
+                entry = self.load_version(version, self.model_file)
+            except ValueError as e:
+                logger.warning(f"Skipping reload of {self.model_file}: {e}")
+                return None
+            except Exception as e:
+                # Most likely the file is still being written; try again next tick
+                logger.warning(f"Could not reload model file {self.model_file}: {e}")
+                return None
+        entry.digest = digest
+        entry.signature = signature
+        self.activate(version, retire_previous=True)
+        return entry
+
+    def start_watcher(self):
+        """
+        Start the daemon thread following the pointer file (every
+        sync_interval seconds) and MODEL_FILE (every watch_interval seconds)
+        """
+        intervals = [interval for interval in (self.sync_interval, self.watch_interval) if interval]
+        if not intervals:
+            return
+        with self._lock:
+            if self._watcher is not None and self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+
+        def watch():
+            next_sync = next_check = 0.0
+            while True:
+                time.sleep(min(intervals))
+                now = time.monotonic()
+                try:
+                    if self.sync_interval and now >= next_sync:
+                        next_sync = now + self.sync_interval
+                        self.sync_active_version()
+                    if self.watch_interval and now >= next_check:
+                        next_check = now + self.watch_interval
+                        self.check_for_update()
+                except Exception as e:
+                    logger.error(f"Model watcher error: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+        if self.watch_interval:
+            logger.info(f"Watching {self.model_file} for changes every {self.watch_interval}s")
+        if self.sync_interval:
+            logger.info(f"Following published model versions in {self.pointer_path} every {self.sync_interval}s")
+
+    # ---------------- Reporting ----------------
+
+    def info(self):
+        with self._lock:
+            versions = [entry.to_dict() for entry in self._versions.values()]
+            active = self._active
+        return {
+            "model_file": self.model_file,
+            "pointer_file": self.pointer_path,
+            "loaded": active is not None,
+            "active_version": active.version if active is not None else None,
+            "engine": self.engine,
+            "mmap_mode": self.mmap_mode,
+            "versions": versions,
+            "rss_bytes": process_rss_bytes(),
+            "pid": os.getpid(),
+        }
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,167 @@
+import base64
+import json
+import math
+from datetime import date, datetime
+
+from flask import request
+from sqlalchemy import and_, func, or_, select, text, tuple_
+
+from ..database import db
+
+# Rows counted at most when an estimated count is requested and the database has no planner estimate
+ESTIMATE_COUNT_CAP = 10000
+
+
+class PaginationError(ValueError):
+    """Bad cursor or pagination arguments (the routes turn it into a 400)"""
+
+
+class Page:
+    """One page of a listing plus the metadata the routes return"""
+
+    def __init__(self, items, per_page, page=None, total=None, total_is_estimate=False, next_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.page = page
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def pages(self):
+        if self.total is None:
+            return None
+        return math.ceil(self.total / self.per_page) if self.per_page else 0
+
+    def metadata(self):
+        """Cursor fields added to every paginated response"""
+        return {
+            "next_cursor": self.next_cursor,
+            "has_next": self.has_next,
+            "total_is_estimate": self.total_is_estimate,
+        }
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+    return value
+
+
+def encode_cursor(values):
+    payload = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = [_decode_value(v) for v in json.loads(base64.urlsafe_b64decode(padded))]
+    except (ValueError, TypeError):
+        raise PaginationError("Invalid cursor")
+    if len(values) != size:
+        raise PaginationError("Invalid cursor")
+    return values
+
+
+def _nulls_first(descending):
+    # Postgres sorts NULLs as the largest values, SQLite and MySQL as the smallest
+    nulls_largest = db.session.get_bind().dialect.name == "postgresql"
+    return nulls_largest == descending
+
+
+def _after(sort_column, id_column, descending, sort_value, last_id):
+    """WHERE clause selecting the rows that come after (sort_value, last_id) in the listing order"""
+    past_id = id_column < last_id if descending else id_column > last_id
+    if sort_column is None:
+        return past_id
+
+    nulls_first = _nulls_first(descending)
+    if sort_value is None:
+        # Inside the block of rows with no sort value
+        in_null_block = and_(sort_column.is_(None), past_id)
+        return or_(in_null_block, sort_column.isnot(None)) if nulls_first else in_null_block
+
+    # Row-value comparison, which both Postgres and SQLite resolve with the composite index
+    key, cursor_key = tuple_(sort_column, id_column), tuple_(sort_value, last_id)
+    condition = key < cursor_key if descending else key > cursor_key
+    return condition if nulls_first else or_(condition, sort_column.is_(None))
+
+
+def estimate_count(query):
+    """Planner row estimate on Postgres, otherwise a count capped at ESTIMATE_COUNT_CAP rows"""
+    statement = query.order_by(None).statement
+    if db.session.get_bind().dialect.name == "postgresql":
+        compiled = statement.compile(dialect=db.session.get_bind().dialect, compile_kwargs={"literal_binds": True})
+        plan = db.session.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    capped = statement.limit(ESTIMATE_COUNT_CAP).subquery()
+    return db.session.execute(select(func.count()).select_from(capped)).scalar()
+
+
+def paginate(query, id_column, sort_column=None, descending=True, default_per_page=50):
+    """
+    Paginate an ORM query ordered by (sort_column, id_column).
+
+    Request arguments:
+      cursor    opaque next_cursor from a previous page; selects the rows
+                after it with a keyset condition on (sort_column, id) that
+                the composite indexes serve directly, so deep pages cost the
+                same as the first one
+      page      1-based page number, the old OFFSET behaviour (used when no
+                cursor is given; responses still carry next_cursor so clients
+                can switch)
+      per_page  rows per page
+      count     "exact" (a COUNT(*); the default with page), "estimate" or
+                "none" (the default with cursor)
+    """
+    per_page = request.args.get("per_page", default=default_per_page, type=int)
+    if per_page is None or per_page < 1:
+        raise PaginationError("per_page must be a positive integer")
+    cursor = request.args.get("cursor")
+    page = None if cursor else max(request.args.get("page", default=1, type=int) or 1, 1)
+    count_mode = request.args.get("count", "none" if cursor else "exact")
+    if count_mode not in ("exact", "estimate", "none"):
+        raise PaginationError("count must be one of exact, estimate, none")
+
+    total = None
+    if count_mode == "exact":
+        total = query.order_by(None).count()
+    elif count_mode == "estimate":
+        total = estimate_count(query)
+
+    sort_columns = ([sort_column] if sort_column is not None else []) + [id_column]
+    ordered = query.order_by(*[c.desc() if descending else c.asc() for c in sort_columns])
+    if cursor:
+        values = decode_cursor(cursor, len(sort_columns))
+        sort_value, last_id = (values[0], values[1]) if sort_column is not None else (None, values[0])
+        ordered = ordered.filter(_after(sort_column, id_column, descending, sort_value, last_id))
+    else:
+        ordered = ordered.offset((page - 1) * per_page)
+
+    rows = ordered.limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in sort_columns])
+
+    return Page(items, per_page, page=page, total=total,
+                total_is_estimate=count_mode == "estimate", next_cursor=next_cursor)
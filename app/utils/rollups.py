@@ -0,0 +1,300 @@
+import logging
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import case, delete, func, select, update
+
+from ..database import db
+from ..models import RollupWatermark, TransactionRollup
+from .dashboard_stats import SCOPES
+from .feature_store import dialect_insert
+from .scheduler import schedule_app_job
+from .stats import SUSPICIOUS
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ("sending_country", "payout_country", "channel", "payment_method")
+GRANULARITIES = ("hour", "day")
+MEASURES = ("transaction_count", "total_volume", "suspicious_count")
+
+ROLLUP_CHUNK_SIZE = 50000  # Transactions folded in per commit
+UPSERT_CHUNK_SIZE = 500  # Rollup rows per INSERT ... ON CONFLICT statement
+
+
+def hour_bucket(column, dialect_name):
+    """SQL expression truncating a timestamp to the start of its hour"""
+    if dialect_name == "postgresql":
+        return func.date_trunc("hour", column)
+    if dialect_name == "sqlite":
+        return func.strftime("%Y-%m-%d %H:00:00", column)
+    if dialect_name in ("mysql", "mariadb"):
+        return func.date_format(column, "%Y-%m-%d %H:00:00")
+    raise ValueError(f"Rollups are not supported on {dialect_name}")
+
+
+def _as_datetime(value):
+    # SQLite and MySQL return the formatted bucket as a string
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def truncate(value, granularity):
+    value = value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if granularity == "day" else value
+
+
+def _watermark(scope):
+    watermark = RollupWatermark.query.filter_by(scope=scope).one_or_none()
+    if watermark is None:
+        watermark = RollupWatermark(scope=scope, last_transaction_id=0, transaction_count=0)
+        db.session.add(watermark)
+        db.session.commit()
+    return watermark.last_transaction_id
+
+
+def _aggregate_range(model, low, high):
+    """Hourly and daily rollup rows for transactions low < id <= high, keyed by (granularity, bucket, *dimensions)"""
+    return _aggregate(model, model.id > low, model.id <= high)
+
+
+def _aggregate(model, *conditions):
+    """Hourly and daily rollup rows for the transactions matching conditions"""
+    bucket = hour_bucket(model.sending_date, db.session.get_bind().dialect.name).label("bucket")
+    dimensions = [func.coalesce(getattr(model, name), "").label(name) for name in DIMENSIONS]
+    query = select(
+        bucket,
+        *dimensions,
+        func.count(),
+        func.coalesce(func.sum(model.total_sale), 0),
+        func.sum(case((model.sender_status_detail == SUSPICIOUS, 1), else_=0)),
+    ).where(
+        *conditions,
+        # Undated transactions cannot be placed in a bucket
+        model.sending_date.isnot(None),
+    ).group_by(bucket, *dimensions)
+
+    rows = {}
+    for hour, *values in db.session.execute(query):
+        dims, measures = tuple(values[:len(DIMENSIONS)]), values[len(DIMENSIONS):]
+        hour = _as_datetime(hour)
+        # Daily rows are summed from the hourly ones, so the table is scanned once
+        for granularity in GRANULARITIES:
+            key = (granularity, truncate(hour, granularity)) + dims
+            totals = rows.setdefault(key, [0, 0.0, 0])
+            for i, value in enumerate(measures):
+                totals[i] += value or 0
+    return rows
+
+
+def _upsert_rollups(scope, rows):
+    """Add the aggregated measures to existing buckets, creating missing ones"""
+    table = TransactionRollup.__table__
+    values = [
+        dict(scope=scope, granularity=key[0], bucket_start=key[1], **dict(zip(DIMENSIONS, key[2:])),
+             **dict(zip(MEASURES, measures)))
+        for key, measures in rows.items()
+    ]
+    insert = dialect_insert(db.session.get_bind().dialect.name)
+    if insert is None:
+        for row in values:
+            key = {name: row[name] for name in ("scope", "granularity", "bucket_start") + DIMENSIONS}
+            existing = TransactionRollup.query.filter_by(**key).first()
+            if existing is None:
+                db.session.add(TransactionRollup(**row))
+            else:
+                for measure in MEASURES:
+                    setattr(existing, measure, getattr(existing, measure) + row[measure])
+        db.session.flush()
+        return
+
+    key_columns = [table.c[name] for name in ("scope", "granularity", "bucket_start") + DIMENSIONS]
+    for start in range(0, len(values), UPSERT_CHUNK_SIZE):
+        stmt = insert(table).values(values[start:start + UPSERT_CHUNK_SIZE])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={measure: table.c[measure] + stmt.excluded[measure] for measure in MEASURES},
+        ))
+
+
+def _hourly_counts(scope, model, up_to_id):
+    """{hour: (transactions, rolled-up count)} for the dated transactions with id <= up_to_id"""
+    bucket = hour_bucket(model.sending_date, db.session.get_bind().dialect.name).label("bucket")
+    counts = {
+        _as_datetime(hour): count
+        for hour, count in db.session.execute(
+            select(bucket, func.count())
+            .where(model.id <= up_to_id, model.sending_date.isnot(None))
+            .group_by(bucket)
+        )
+    }
+    rolled = dict(db.session.execute(
+        select(TransactionRollup.bucket_start, func.sum(TransactionRollup.transaction_count))
+        .where(TransactionRollup.scope == scope, TransactionRollup.granularity == "hour")
+        .group_by(TransactionRollup.bucket_start)
+    ).all())
+    return {hour: (counts.get(hour, 0), rolled.get(hour) or 0) for hour in counts.keys() | rolled.keys()}
+
+
+def _rebuild_days(scope, model, days, up_to_id):
+    """Recompute the hourly and daily rollups of the given days from the transactions with id <= up_to_id"""
+    for day in days:
+        in_day = (model.sending_date >= day, model.sending_date < day + timedelta(days=1))
+        db.session.execute(delete(TransactionRollup).where(
+            TransactionRollup.scope == scope,
+            TransactionRollup.bucket_start >= day,
+            TransactionRollup.bucket_start < day + timedelta(days=1),
+        ))
+        rows = _aggregate(model, model.id <= up_to_id, *in_day)
+        if rows:
+            _upsert_rollups(scope, rows)
+
+
+def reconcile_rollups(scope):
+    """
+    Fold in transactions that committed below the scope's watermark after it
+    had moved past their ids (a long ingest chunk finishing after a later
+    /transactions/create), and drop ones deleted without adjust_rollups().
+
+    The number of transactions up to the watermark is compared with the
+    count recorded as they were folded in; only when they differ are the
+    hourly counts compared with the transactions, and the days that disagree
+    are recomputed. The recorded count is set with a compare-and-set UPDATE,
+    so a concurrent roll_up() makes this run stop and leaves the check to
+    the next one. Returns how many days were recomputed.
+    """
+    model = SCOPES[scope][0]
+    watermark = RollupWatermark.query.filter_by(scope=scope).one_or_none()
+    if watermark is None or not watermark.last_transaction_id:
+        return 0
+    up_to_id, counted = watermark.last_transaction_id, watermark.transaction_count
+    actual = db.session.query(func.count(model.id)).filter(model.id <= up_to_id).scalar()
+    if actual == counted:
+        return 0
+
+    days = sorted({
+        truncate(hour, "day")
+        for hour, (count, rolled) in _hourly_counts(scope, model, up_to_id).items() if count != rolled
+    })
+    claimed = db.session.execute(
+        update(RollupWatermark)
+        .where(
+            RollupWatermark.scope == scope,
+            RollupWatermark.last_transaction_id == up_to_id,
+            RollupWatermark.transaction_count.is_not_distinct_from(counted),
+        )
+        .values(transaction_count=actual, updated_at=func.now())
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        logger.info(f"Rollup of {scope} is running elsewhere; not reconciling")
+        return 0
+
+    _rebuild_days(scope, model, days, up_to_id)
+    db.session.commit()
+    if days:
+        logger.warning(
+            f"Rollups of {scope} missed transactions committed out of id order or deleted; "
+            f"recomputed {len(days)} days from {days[0].date()} to {days[-1].date()}"
+        )
+    return len(days)
+
+
+def roll_up(scope, chunk_size=ROLLUP_CHUNK_SIZE):
+    """
+    Fold the scope's transactions above its watermark into transaction_rollups.
+
+    Works through them in id order, chunk_size at a time, one transaction per
+    chunk: the watermark is advanced with a compare-and-set UPDATE before the
+    buckets are touched, so two job runners never fold the same range twice
+    (the loser's update matches no row and it stops). Rows that arrive with an
+    old sending_date still land in their own bucket, and rows committed after
+    a higher id was already folded in are picked up by reconcile_rollups(),
+    which runs first. Returns how many transactions were folded in.
+    """
+    model = SCOPES[scope][0]
+    _watermark(scope)
+    reconcile_rollups(scope)
+    folded = 0
+    while True:
+        low = _watermark(scope)
+        next_ids = select(model.id).where(model.id > low).order_by(model.id).limit(chunk_size).subquery()
+        high, count = db.session.execute(select(func.max(next_ids.c.id), func.count(next_ids.c.id))).one()
+        if high is None:
+            break
+
+        claimed = db.session.execute(
+            update(RollupWatermark)
+            .where(RollupWatermark.scope == scope, RollupWatermark.last_transaction_id == low)
+            .values(
+                last_transaction_id=high,
+                transaction_count=RollupWatermark.transaction_count + count,
+                updated_at=func.now(),
+            )
+        ).rowcount
+        if not claimed:
+            db.session.rollback()
+            logger.info(f"Rollup of {scope} is running elsewhere; stopping")
+            break
+
+        rows = _aggregate_range(model, low, high)
+        _upsert_rollups(scope, rows)
+        db.session.commit()
+        folded += sum(measures[0] for key, measures in rows.items() if key[0] == "hour")
+    return folded
+
+
+def adjust_rollups(scope, condition, sign):
+    """
+    Remove (sign=-1) or add back (sign=1) the contribution of already rolled-up
+    transactions matching condition, in the caller's transaction: a bulk update
+    subtracts the rows before changing them and adds them back afterwards.
+    Rows above the watermark are left to roll_up().
+    """
+    model = SCOPES[scope][0]
+    watermark = RollupWatermark.query.filter_by(scope=scope).one_or_none()
+    if watermark is None or not watermark.last_transaction_id:
+        return
+    rows = _aggregate(model, condition, model.id <= watermark.last_transaction_id)
+    if rows:
+        _upsert_rollups(scope, {key: [sign * value for value in measures] for key, measures in rows.items()})
+
+
+def rebuild_rollups(scope):
+    """Drop the scope's rollups and fold every transaction in again"""
+    db.session.execute(delete(TransactionRollup).where(TransactionRollup.scope == scope))
+    db.session.execute(delete(RollupWatermark).where(RollupWatermark.scope == scope))
+    db.session.commit()
+    return roll_up(scope)
+
+
+def roll_up_all():
+    return {scope: roll_up(scope) for scope in SCOPES}
+
+
+def rollup_status(scopes=None):
+    """Watermark and backlog (transactions not yet folded in) per scope, for the given scopes or all of them"""
+    status = {}
+    for scope in scopes or SCOPES:
+        model = SCOPES[scope][0]
+        watermark = RollupWatermark.query.filter_by(scope=scope).one_or_none()
+        last_id = watermark.last_transaction_id if watermark else 0
+        status[scope] = {
+            "last_transaction_id": last_id,
+            "pending_transactions": db.session.query(func.count(model.id)).filter(model.id > last_id).scalar(),
+            "updated_at": watermark.updated_at.isoformat() if watermark and watermark.updated_at else None,
+        }
+    return status
+
+
+def init_rollups(app):
+    """Register the rollup CLI command and, if configured, the periodic rollup job"""
+
+    @app.cli.command("rollup-transactions")
+    @click.option("--rebuild", is_flag=True, help="Drop the rollups and recompute them from every transaction.")
+    def rollup_command(rebuild):
+        """Fold new transactions into the hourly/daily analytics rollups."""
+        counts = {scope: rebuild_rollups(scope) for scope in SCOPES} if rebuild else roll_up_all()
+        print(f"Transactions rolled up: {counts}")
+
+    interval = app.config.get("ROLLUP_INTERVAL", 0)
+    if interval:
+        schedule_app_job(app, roll_up_all, interval, 'transaction_rollups', 'Transaction rollup')
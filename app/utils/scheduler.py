@@ -125,4 +125,27 @@ def init_scheduler(app):
             except SchedulerNotRunningError:
                 logger.info("Scheduler was already shut down")
             except Exception as e:
-                logger.error(f"Error shutting down scheduler: {str(e)}")
\ No newline at end of file
+                logger.error(f"Error shutting down scheduler: {str(e)}")
+
+def schedule_app_job(app, job, seconds, job_id, name):
+    """
+    Run job() every `seconds` inside an app context, on a background scheduler
+    shared by the app's maintenance jobs (rolled back and logged on failure)
+    """
+    from ..database import db
+
+    def run():
+        with app.app_context():
+            try:
+                job()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"{name} failed: {str(e)}")
+
+    scheduler = app.extensions.get('maintenance_scheduler')
+    if scheduler is None:
+        scheduler = BackgroundScheduler(daemon=True)
+        scheduler.start()
+        app.extensions['maintenance_scheduler'] = scheduler
+    scheduler.add_job(run, IntervalTrigger(seconds=seconds), id=job_id, name=name, replace_existing=True)
+    logger.info(f"Scheduled '{name}' every {seconds}s")
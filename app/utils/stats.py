@@ -0,0 +1,57 @@
+from sqlalchemy import case, func, select
+
+from ..database import db
+
+GENUINE = "Genuine"
+SUSPICIOUS = "Suspicious"
+
+
+def status_summary_query(model, customer_column):
+    """
+    One statement computing the /stats figures for a transactions table.
+
+    The inner query groups by customer in a single scan, counting and
+    summing each customer's genuine and suspicious transactions with
+    conditional aggregation; the outer query adds the groups up and
+    classifies customers as genuine-only, suspicious-only or mixed from
+    the per-customer counts (the same sets the old EXCEPT queries built).
+    """
+    status = model.sender_status_detail
+    is_genuine = status == GENUINE
+    is_suspicious = status == SUSPICIOUS
+
+    per_customer = select(
+        customer_column.label("customer"),
+        func.count().label("transactions"),
+        func.sum(case((is_genuine, 1), else_=0)).label("genuine"),
+        func.sum(case((is_suspicious, 1), else_=0)).label("suspicious"),
+        func.sum(model.total_sale).label("volume"),
+        func.sum(case((is_genuine, model.total_sale))).label("genuine_volume"),
+        func.sum(case((is_suspicious, model.total_sale))).label("suspicious_volume"),
+    ).group_by(customer_column).subquery()
+
+    c = per_customer.c
+    return select(
+        func.sum(c.transactions).label("total_transactions"),
+        func.count().label("total_customers"),
+        func.sum(c.genuine).label("genuine_transactions"),
+        func.sum(c.suspicious).label("suspicious_transactions"),
+        func.sum(case(((c.genuine > 0) & (c.suspicious == 0), 1), else_=0)).label("genuine_customers"),
+        func.sum(case(((c.suspicious > 0) & (c.genuine == 0), 1), else_=0)).label("suspicious_customers"),
+        func.sum(c.volume).label("total_volume"),
+        func.sum(c.genuine_volume).label("genuine_volume"),
+        func.sum(c.suspicious_volume).label("suspicious_volume"),
+    )
+
+
+def status_summary(model, customer_column, connection=None):
+    """Transaction, customer and volume totals by sender status, in the /stats response shape"""
+    row = (connection or db.session).execute(status_summary_query(model, customer_column)).mappings().one()
+    counts = ["total_transactions", "total_customers", "genuine_transactions", "suspicious_transactions",
+              "genuine_customers", "suspicious_customers"]
+    # SUM over no rows is NULL, and Postgres returns integer sums as Decimal
+    stats = {name: int(row[name] or 0) for name in counts}
+    stats.update({name: row[name] or 0 for name in ["total_volume", "genuine_volume", "suspicious_volume"]})
+    # Customers with both statuses, or with neither
+    stats["mixed_customers"] = stats["total_customers"] - stats["genuine_customers"] - stats["suspicious_customers"]
+    return stats
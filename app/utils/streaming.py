@@ -0,0 +1,114 @@
+import logging
+import zlib
+from datetime import date, datetime, time, timedelta
+
+from flask import Response, current_app, request, stream_with_context
+from sqlalchemy import select
+
+from ..database import db
+from .serializers import dumps_iso, requested_fields, tuple_serializer
+
+logger = logging.getLogger(__name__)
+
+# Query parameters filtering on a column by equality, when the table has it
+EQUALITY_FILTERS = ("sender_id", "status", "customer_id")
+
+
+def parse_iso_bound(value):
+    """
+    (datetime, whole_day) for an ISO date or datetime string; whole_day is
+    True for a bare date, which stands for midnight
+    """
+    try:
+        return datetime.combine(date.fromisoformat(value), time.min), True
+    except ValueError:
+        return datetime.fromisoformat(value), False
+
+
+def row_filters(table):
+    """
+    WHERE conditions from the request: start/end (ISO dates, inclusive, on
+    sending_date; a bare end date includes that whole day) and
+    sender_id/status/customer_id. Raises ValueError for a bad date or a
+    filter the table has no column for.
+    """
+    try:
+        start = request.args.get("start")
+        end = request.args.get("end")
+        start = parse_iso_bound(start)[0] if start else None
+        end, end_whole_day = parse_iso_bound(end) if end else (None, False)
+    except ValueError:
+        raise ValueError("start and end must be ISO dates, e.g. 2024-01-31 or 2024-01-31T12:00")
+
+    conditions = []
+    if start:
+        conditions.append(table.c.sending_date >= start)
+    if end_whole_day:
+        conditions.append(table.c.sending_date < end + timedelta(days=1))
+    elif end:
+        conditions.append(table.c.sending_date <= end)
+    for name in EQUALITY_FILTERS:
+        value = request.args.get(name)
+        if value is None:
+            continue
+        if name not in table.c:
+            raise ValueError(f"{table.name} cannot be filtered by {name}")
+        conditions.append(table.c[name] == value)
+    return conditions
+
+
+def ndjson_lines(connection, statement, names, batch_size, compressor=None):
+    """
+    Stream the rows of statement as newline-delimited JSON: a server-side
+    cursor hands over batch_size row tuples at a time, which are encoded
+    and joined into one chunk (gzip-compressed when a compressor is given),
+    so no ORM object is built and there is one write per batch
+    """
+    to_dict = tuple_serializer(names)
+    result = connection.execution_options(stream_results=True, max_row_buffer=batch_size).execute(statement)
+    try:
+        for rows in result.partitions(batch_size):
+            chunk = b"".join([dumps_iso(to_dict(row)) + b"\n" for row in rows])
+            if compressor is None:
+                yield chunk
+            else:
+                chunk = compressor.compress(chunk)
+                if chunk:
+                    yield chunk
+    finally:
+        result.close()
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def stream_response(model):
+    """
+    Streaming NDJSON download of a transactions table, one object per row
+    with ISO dates, in id order. Query parameters: fields, start/end,
+    sender_id, status, customer_id (see row_filters) and batch_size. The
+    body is gzip-encoded when the client accepts it. Raises ValueError for
+    bad parameters, before anything is streamed.
+    """
+    table = model.__table__
+    names = requested_fields(table) or table.columns.keys()
+    conditions = row_filters(table)
+    batch_size = request.args.get("batch_size", default=current_app.config.get("STREAM_BATCH_SIZE", 5000), type=int)
+    if not batch_size or batch_size < 1:
+        raise ValueError("batch_size must be a positive integer")
+
+    statement = select(*[table.c[name] for name in names]).where(*conditions).order_by(table.c.id)
+
+    headers = {}
+    compressor = None
+    if request.accept_encodings["gzip"]:
+        # wbits 31: a gzip container around the deflate stream
+        compressor = zlib.compressobj(current_app.config.get("STREAM_GZIP_LEVEL", 6), zlib.DEFLATED, 31)
+        headers["Content-Encoding"] = "gzip"
+    headers["Vary"] = "Accept-Encoding"
+
+    logger.info(f"Streaming {table.name} as NDJSON in batches of {batch_size}{' (gzip)' if compressor else ''}")
+    return Response(
+        stream_with_context(ndjson_lines(db.session.connection(), statement, names, batch_size, compressor)),
+        mimetype="application/x-ndjson",
+        headers=headers,
+    )
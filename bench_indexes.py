@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark showing the query plans of the listing, stats and feature queries
+switch from full table scans to index searches once the composite indexes
+from app/models.py are in place (SQLite EXPLAIN QUERY PLAN; on Postgres run
+EXPLAIN on the same statements)
+"""
+import sys
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import create_engine, func, insert, select, text
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import db
+from app.models import CustomerTransaction, Notification, Transaction
+
+ROWS = 200000
+SENDERS = 5000
+ITERATIONS = 20
+
+T, C, N = Transaction, CustomerTransaction, Notification
+
+# One statement per route, with the filter and ORDER BY it actually uses
+QUERIES = {
+    "/transactions/by-sender": select(T).where(T.sender_id == "S42").order_by(T.sending_date.desc(), T.id.desc()).limit(50),
+    "/transactions/by-beneficiary": select(T).where(T.beneficiary_client_id == "B42").order_by(T.sending_date.desc(), T.id.desc()).limit(50),
+    "/transactions/by-status": select(T).where(T.status == "Pending").order_by(T.sending_date.desc(), T.id.desc()).limit(50),
+    "/transactions/by-date": select(T).where(T.sending_date.between(datetime(2024, 3, 1), datetime(2024, 3, 2))).order_by(T.sending_date.desc(), T.id.desc()).limit(50),
+    "/transactions/stats (senders)": select(func.count(T.sender_id.distinct())).where(T.sender_status_detail == "Suspicious"),
+    "feature watermark": select(T.sender_id, func.max(T.id), func.count(T.id)).where(T.sender_id.in_(["S1", "S2", "S3"])).group_by(T.sender_id),
+    "feature catch-up": select(T.id, T.sending_date, T.total_sale).where(T.sender_id == "S42", T.id > ROWS // 2).order_by(T.id),
+    "/customer-transactions/all": select(C).order_by(C.created_at.desc(), C.id.desc()).limit(50),
+    "/customer-transactions/flagged": select(C).where(C.is_flagged == True).order_by(C.created_at.desc(), C.id.desc()).limit(50),  # noqa: E712
+    "/customer-transactions/by-customer": select(C).where(C.customer_id == "S42").order_by(C.sending_date.desc(), C.id.desc()).limit(50),
+    "/transactions/notifications": select(N).where(N.user_id == "7").order_by(N.created_at.desc(), N.id.desc()).limit(20),
+}
+
+
+def seed(engine, rng):
+    start = datetime(2024, 1, 1)
+    dates = [start + timedelta(minutes=int(m)) for m in rng.integers(0, 60 * 24 * 180, ROWS)]
+    senders = rng.integers(0, SENDERS, ROWS)
+    with engine.begin() as conn:
+        conn.execute(insert(T), [
+            {
+                "sender_id": f"S{senders[i]}",
+                "beneficiary_client_id": f"B{rng.integers(0, SENDERS)}",
+                "sending_date": dates[i],
+                "status": "Paid" if i % 3 else "Pending",
+                "total_sale": float(i % 9000),
+                "sender_status_detail": "Suspicious" if senders[i] % 10 == 0 else "Genuine",
+            }
+            for i in range(ROWS)
+        ])
+        conn.execute(insert(C), [
+            {
+                "customer_id": f"S{senders[i]}",
+                "sending_date": dates[i],
+                "created_at": dates[i],
+                "is_flagged": i % 50 == 0,
+                "sender_status_detail": "Genuine",
+            }
+            for i in range(ROWS // 4)
+        ])
+        conn.execute(insert(N), [
+            {"user_id": str(i % 100), "message": "m", "status": "Suspicious", "created_at": dates[i]}
+            for i in range(ROWS // 4)
+        ])
+
+
+def plan_and_time(conn, statement):
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    plan = "; ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+    timings = []
+    for _ in range(ITERATIONS):
+        started = time.perf_counter()
+        conn.execute(text(sql)).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return plan, np.percentile(timings, 50)
+
+
+def run(engine):
+    with engine.connect() as conn:
+        return {name: plan_and_time(conn, statement) for name, statement in QUERIES.items()}
+
+
+if __name__ == "__main__":
+    tables = [T.__table__, C.__table__, N.__table__]
+    # The composite indexes added for these routes (single-column ones predate them)
+    indexes = [index for table in tables for index in table.indexes if len(index.expressions) > 1]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        db.metadata.create_all(engine, tables=tables)
+        for index in indexes:
+            index.drop(engine)
+
+        print(f"🔍 Seeding {ROWS} transactions...")
+        seed(engine, np.random.default_rng(0))
+        before = run(engine)
+
+        for index in indexes:
+            index.create(engine)
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        after = run(engine)
+
+    print("=" * 100)
+    for name in QUERIES:
+        (plan_before, ms_before), (plan_after, ms_after) = before[name], after[name]
+        print(f"{name}")
+        print(f"  before {ms_before:>9.3f} ms  {plan_before}")
+        print(f"  after  {ms_after:>9.3f} ms  {plan_after}")
+    print("=" * 100)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark comparing the sklearn and compiled inference engines
+on single rows and small batches (p50/p99 latency per predict_proba call)
+"""
+import sys
+import os
+import time
+
+import joblib
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils.model_registry import MODEL_FILE
+
+model = joblib.load(MODEL_FILE) if os.path.exists(MODEL_FILE) else None
+from app.utils.compiled_forest import CompiledForest
+
+BATCH_SIZES = [1, 8, 64, 512]
+ITERATIONS = 300
+
+
+def measure(predict_proba, X, iterations=ITERATIONS):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        predict_proba(X)
+        timings.append((time.perf_counter() - started) * 1000)
+    return np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+if __name__ == "__main__":
+    if model is None:
+        sys.exit("❌ Model file not found")
+
+    rng = np.random.default_rng(0)
+    engines = {"sklearn": model, "compiled": CompiledForest.from_estimator(model)}
+
+    print("🔍 Benchmarking inference engines...")
+    print("=" * 60)
+    print(f"{'batch':>6} {'engine':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for batch_size in BATCH_SIZES:
+        X = rng.lognormal(mean=3, sigma=2, size=(batch_size, model.n_features_in_))
+        expected = model.predict_proba(X)
+        for name, estimator in engines.items():
+            assert np.array_equal(estimator.predict_proba(X), expected)
+            p50, p99 = measure(estimator.predict_proba, X, max(20, ITERATIONS // batch_size))
+            print(f"{batch_size:>6} {name:>10} {p50:>10.3f} {p99:>10.3f}")
+    print("=" * 60)
+    print("✅ Both engines returned identical probabilities")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark comparing the old reflective Transaction.to_dict (getattr per
+column) and Flask's stdlib jsonify encoder with the precompiled serializers
+and orjson provider in app/utils/serializers.py, plus the /all_stream line
+encoding, over 100k rows
+"""
+import sys
+import os
+import json
+import time
+from datetime import date, datetime, timedelta
+
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from app.models import Transaction
+from app.utils import serializers
+from app.utils.serializers import FastJSONProvider, dumps_iso, tuple_serializer
+
+ROWS = 100000
+ITERATIONS = 3
+
+
+def legacy_to_dict(obj):
+    return {c.name: getattr(obj, c.name) for c in obj.__table__.columns}
+
+
+def legacy_serial(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+def rows():
+    table = Transaction.__table__
+    values = []
+    for i in range(ROWS):
+        row = {column.name: f"{column.name}-{i}" for column in table.columns}
+        row.update(id=i, total_sale=i / 100, sending_date=datetime(2024, 1, 1) + timedelta(seconds=i),
+                   sender_date_of_birth=datetime(1980, 1, 1), compliance_release_date=None)
+        values.append(row)
+    return values
+
+
+def measure(implementation):
+    timings = []
+    for _ in range(ITERATIONS):
+        started = time.perf_counter()
+        implementation()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    print(f"🔍 Serializing {ROWS} transactions...")
+    app = create_app('testing')
+    data = rows()
+    objects = [Transaction(**row) for row in data]
+    names = Transaction.__table__.columns.keys()
+    tuples = [tuple(row[name] for name in names) for row in data]
+    to_dict = tuple_serializer(names)
+
+    stdlib = DefaultJSONProvider(app)
+    app.config["JSON_ENCODER"] = "orjson"
+    fast = FastJSONProvider(app)
+    dicts = [obj.to_dict() for obj in objects]
+    assert dicts == [legacy_to_dict(obj) for obj in objects]
+    assert json.loads(fast.dumps(dicts)) == json.loads(stdlib.dumps(dicts))
+
+    results = [
+        ("to_dict: getattr per column", measure(lambda: [legacy_to_dict(obj) for obj in objects])),
+        ("to_dict: attrgetter", measure(lambda: [obj.to_dict() for obj in objects])),
+        ("jsonify: stdlib", measure(lambda: stdlib.dumps(dicts, separators=(",", ":")))),
+        (f"jsonify: {'orjson' if fast.use_orjson else 'stdlib (no orjson)'}",
+         measure(lambda: fast.dumps(dicts, separators=(",", ":")))),
+        ("all_stream: ORM + json.dumps",
+         measure(lambda: [json.dumps(legacy_to_dict(obj), default=legacy_serial) + "\n" for obj in objects])),
+        ("all_stream: tuples + dumps_iso", measure(lambda: [dumps_iso(to_dict(row)) + b"\n" for row in tuples])),
+    ]
+
+    print("=" * 60)
+    print(f"{'':<36}{'seconds':>10}{'rows/s':>14}")
+    for label, seconds in results:
+        print(f"{label:<36}{seconds:>10.3f}{ROWS / seconds:>14.0f}")
+    print(f"orjson installed: {serializers.orjson is not None}")
+    print("=" * 60)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark comparing the old /transactions/stats implementation (nine
+queries, each scanning transactions) with the single grouped query from
+app/utils/stats.py: statements issued, table scans in their SQLite query
+plans, and p50 latency
+"""
+import sys
+import os
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, event, func, insert, select, text
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import db
+from app.models import Transaction as T
+from app.utils.stats import status_summary
+
+ROWS = 300000
+SENDERS = 20000
+ITERATIONS = 10
+
+
+def legacy_stats(conn):
+    """The per-metric queries get_transaction_stats used to issue"""
+    genuine, suspicious = T.sender_status_detail == "Genuine", T.sender_status_detail == "Suspicious"
+    scalar = lambda statement: conn.execute(statement).scalar()  # noqa: E731
+    count_of = lambda statement: scalar(select(func.count()).select_from(statement.subquery()))  # noqa: E731
+
+    stats = {
+        "total_transactions": scalar(select(func.count()).select_from(T)),
+        "genuine_transactions": scalar(select(func.count()).where(genuine)),
+        "suspicious_transactions": scalar(select(func.count()).where(suspicious)),
+        "total_customers": count_of(select(T.sender_id).distinct()),
+        "genuine_customers": count_of(
+            select(T.sender_id).where(genuine).distinct().except_(select(T.sender_id).where(suspicious).distinct())),
+        "suspicious_customers": count_of(
+            select(T.sender_id).where(suspicious).distinct().except_(select(T.sender_id).where(genuine).distinct())),
+        "total_volume": scalar(select(func.sum(T.total_sale))) or 0,
+        "genuine_volume": scalar(select(func.sum(T.total_sale)).where(genuine)) or 0,
+        "suspicious_volume": scalar(select(func.sum(T.total_sale)).where(suspicious)) or 0,
+    }
+    stats["mixed_customers"] = stats["total_customers"] - stats["genuine_customers"] - stats["suspicious_customers"]
+    return stats
+
+
+def seed(engine, rng):
+    senders = rng.integers(0, SENDERS, ROWS)
+    statuses = rng.choice(["Genuine", "Suspicious", "Genuine", "Genuine"], ROWS)
+    with engine.begin() as conn:
+        conn.execute(insert(T), [
+            {"sender_id": f"S{senders[i]}", "sender_status_detail": statuses[i], "total_sale": float(i % 9000)}
+            for i in range(ROWS)
+        ])
+        conn.execute(text("ANALYZE"))
+
+
+def measure(engine, implementation):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    with engine.connect() as conn:
+        event.listen(engine, "before_cursor_execute", record)
+        result = implementation(conn)
+        event.remove(engine, "before_cursor_execute", record)
+
+        # Each "SCAN" line in a plan is a pass over a table (SEARCH lines are index lookups)
+        scans = sum(
+            row[-1].startswith("SCAN")
+            for statement, parameters in statements
+            for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        )
+
+        timings = []
+        for _ in range(ITERATIONS):
+            started = time.perf_counter()
+            implementation(conn)
+            timings.append((time.perf_counter() - started) * 1000)
+    return result, len(statements), scans, np.percentile(timings, 50)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        db.metadata.create_all(engine, tables=[T.__table__])
+
+        print(f"🔍 Seeding {ROWS} transactions from {SENDERS} senders...")
+        seed(engine, np.random.default_rng(0))
+
+        legacy = measure(engine, legacy_stats)
+        single = measure(engine, lambda conn: status_summary(T, T.sender_id, connection=conn))
+
+    for name, value in legacy[0].items():
+        assert abs(single[0][name] - value) < 1e-6, f"{name}: {single[0][name]} != {value}"
+
+    print("=" * 70)
+    print(f"{'':<24}{'statements':>12}{'table scans':>14}{'p50 ms':>12}")
+    for label, (_, statements, scans, p50) in [("nine queries", legacy), ("single grouped query", single)]:
+        print(f"{label:<24}{statements:>12}{scans:>14}{p50:>12.1f}")
+    print(f"Speedup: {legacy[3] / single[3]:.1f}x (results identical)")
+    print("=" * 70)
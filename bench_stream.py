@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark comparing the old /all_stream generator (ORM yield_per, one
+json.dumps and one write per row) with the Core cursor and batched NDJSON
+encoding in app/utils/streaming.py, plain and gzip-encoded, on a SQLite file
+"""
+import sys
+import os
+import json
+import tempfile
+import time
+import zlib
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import db
+from app.models import Transaction
+from app.utils.streaming import ndjson_lines
+
+ROWS = 200000
+BATCH_SIZE = 5000
+
+
+def seed(engine):
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Transaction), [
+            {
+                "mtn": f"M{i}",
+                "sender_id": f"S{i % 5000}",
+                "sender_legal_name": f"Sender {i % 5000}",
+                "sender_email": f"s{i % 5000}@example.com",
+                "beneficiary_client_id": f"B{i % 7000}",
+                "sending_date": start + timedelta(minutes=i),
+                "status": "Paid" if i % 3 else "Pending",
+                "total_sale": float(i % 9000),
+                "sender_status_detail": "Genuine",
+            }
+            for i in range(ROWS)
+        ])
+
+
+def legacy_serial(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+def legacy_stream(engine):
+    with Session(engine) as session:
+        for transaction in session.query(Transaction).yield_per(500):
+            row = {c.name: getattr(transaction, c.name) for c in transaction.__table__.columns}
+            yield (json.dumps(row, default=legacy_serial) + "\n").encode()
+
+
+def core_stream(engine, compressor=None):
+    table = Transaction.__table__
+    statement = select(*table.columns).order_by(table.c.id)
+    with engine.connect() as conn:
+        yield from ndjson_lines(conn, statement, table.columns.keys(), BATCH_SIZE, compressor)
+
+
+def measure(stream):
+    started = time.perf_counter()
+    writes = size = 0
+    for chunk in stream:
+        writes += 1
+        size += len(chunk)
+    return time.perf_counter() - started, writes, size
+
+
+if __name__ == "__main__":
+    print(f"🔍 Streaming {ROWS} transactions as NDJSON...")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        db.metadata.create_all(engine, tables=[Transaction.__table__])
+        seed(engine)
+
+        results = [
+            ("ORM yield_per + json.dumps", measure(legacy_stream(engine))),
+            ("Core cursor, batched", measure(core_stream(engine))),
+            ("Core cursor, batched, gzip 1", measure(core_stream(engine, zlib.compressobj(1, zlib.DEFLATED, 31)))),
+            ("Core cursor, batched, gzip 6", measure(core_stream(engine, zlib.compressobj(6, zlib.DEFLATED, 31)))),
+        ]
+        engine.dispose()
+
+    print("=" * 78)
+    print(f"{'':<32}{'seconds':>10}{'rows/s':>12}{'writes':>10}{'MB':>10}")
+    for label, (seconds, writes, size) in results:
+        print(f"{label:<32}{seconds:>10.2f}{ROWS / seconds:>12.0f}{writes:>10}{size / 1e6:>10.1f}")
+    print(f"Speedup: {results[0][1][0] / results[1][1][0]:.1f}x")
+    print("=" * 78)
@@ -0,0 +1,31 @@
+"""Add a transaction watermark to sender_features
+
+Revision ID: 422b1811e03f
+Revises: af9f2636d4a5
+Create Date: 2026-10-16 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '422b1811e03f'
+down_revision = 'af9f2636d4a5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app() runs db.create_all(), so the column may already exist when this runs
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('sender_features')}
+    if 'last_transaction_id' in columns:
+        return
+    # Existing rows keep NULL and are treated as stale until they are recomputed
+    with op.batch_alter_table('sender_features') as batch_op:
+        batch_op.add_column(sa.Column('last_transaction_id', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('sender_features') as batch_op:
+        batch_op.drop_column('last_transaction_id')
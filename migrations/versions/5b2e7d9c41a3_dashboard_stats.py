@@ -0,0 +1,57 @@
+"""Add the dashboard_stats summary and per-customer label tables
+
+Revision ID: 5b2e7d9c41a3
+Revises: 9368f4899218
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2e7d9c41a3'
+down_revision = '9368f4899218'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Both start empty; the first /stats read (or `flask reconcile-dashboard-stats`) builds them.
+    # create_app() runs db.create_all(), so the tables may already exist when this runs
+    existing = sa.inspect(op.get_bind()).get_table_names()
+    if 'dashboard_stats' not in existing:
+        op.create_table(
+            'dashboard_stats',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('scope', sa.String(length=50), nullable=False),
+            sa.Column('total_transactions', sa.Integer(), nullable=False),
+            sa.Column('genuine_transactions', sa.Integer(), nullable=False),
+            sa.Column('suspicious_transactions', sa.Integer(), nullable=False),
+            sa.Column('total_customers', sa.Integer(), nullable=False),
+            sa.Column('genuine_customers', sa.Integer(), nullable=False),
+            sa.Column('suspicious_customers', sa.Integer(), nullable=False),
+            sa.Column('total_volume', sa.Float(), nullable=False),
+            sa.Column('genuine_volume', sa.Float(), nullable=False),
+            sa.Column('suspicious_volume', sa.Float(), nullable=False),
+            sa.Column('is_stale', sa.Boolean(), nullable=False),
+            sa.Column('reconciled_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('scope'),
+        )
+    if 'dashboard_sender_labels' not in existing:
+        op.create_table(
+            'dashboard_sender_labels',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('scope', sa.String(length=50), nullable=False),
+            sa.Column('customer_id', sa.String(length=50), nullable=False),
+            sa.Column('labels', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('scope', 'customer_id', name='uq_dashboard_sender_labels_scope_customer'),
+        )
+
+
+def downgrade():
+    op.drop_table('dashboard_sender_labels')
+    op.drop_table('dashboard_stats')
@@ -0,0 +1,51 @@
+"""Add composite indexes for the listing, stats and feature queries
+
+Revision ID: 9368f4899218
+Revises: 422b1811e03f
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9368f4899218'
+down_revision = '422b1811e03f'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns) - kept in sync with __table_args__ in app/models.py
+INDEXES = [
+    ('ix_transactions_sender_date', 'transactions', ['sender_id', 'sending_date DESC', 'id DESC']),
+    ('ix_transactions_beneficiary_date', 'transactions', ['beneficiary_client_id', 'sending_date DESC', 'id DESC']),
+    ('ix_transactions_status_date', 'transactions', ['status', 'sending_date DESC', 'id DESC']),
+    ('ix_transactions_sending_date', 'transactions', ['sending_date DESC', 'id DESC']),
+    ('ix_transactions_sender_id_id', 'transactions', ['sender_id', 'id']),
+    ('ix_transactions_status_detail_sender', 'transactions', ['sender_status_detail', 'sender_id']),
+    ('ix_notifications_user_created', 'notifications', ['user_id', 'created_at DESC', 'id DESC']),
+    ('ix_notifications_status_created', 'notifications', ['status', 'created_at DESC', 'id DESC']),
+    ('ix_notifications_created', 'notifications', ['created_at DESC', 'id DESC']),
+    ('ix_customer_transactions_created', 'customer_transactions', ['created_at DESC', 'id DESC']),
+    ('ix_customer_transactions_flagged_created', 'customer_transactions', ['is_flagged', 'created_at DESC', 'id DESC']),
+    ('ix_customer_transactions_sending_date', 'customer_transactions', ['sending_date DESC', 'id DESC']),
+    ('ix_customer_transactions_customer_date', 'customer_transactions', ['customer_id', 'sending_date DESC', 'id DESC']),
+    ('ix_customer_transactions_status_detail_customer', 'customer_transactions', ['sender_status_detail', 'customer_id']),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY on Postgres so writes to the big tables are not blocked;
+    # it cannot run inside a transaction, hence the autocommit block
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, [sa.text(column) for column in columns],
+                if_not_exists=True, postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,32 @@
+"""Make sender_features.sender_id unique
+
+Revision ID: af9f2636d4a5
+Revises:
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'af9f2636d4a5'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Concurrent query-then-insert writes could leave several rows per sender;
+    # keep the newest one before adding the constraint
+    op.execute(
+        "DELETE FROM sender_features WHERE id NOT IN "
+        "(SELECT max_id FROM (SELECT MAX(id) AS max_id FROM sender_features GROUP BY sender_id) AS newest)"
+    )
+    op.drop_index('ix_sender_features_sender_id', table_name='sender_features', if_exists=True)
+    op.create_index('ix_sender_features_sender_id', 'sender_features', ['sender_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_sender_features_sender_id', table_name='sender_features')
+    op.create_index('ix_sender_features_sender_id', 'sender_features', ['sender_id'], unique=False)
@@ -0,0 +1,30 @@
+"""Count the transactions covered by each rollup watermark
+
+Revision ID: b8d2f4a6c1e3
+Revises: f1a6d8c3e4b7
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d2f4a6c1e3'
+down_revision = 'f1a6d8c3e4b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app() runs db.create_all(), so the column may already exist when this runs
+    if 'transaction_count' in {column['name'] for column in sa.inspect(op.get_bind()).get_columns('rollup_watermarks')}:
+        return
+    # Existing watermarks keep NULL, so the next roll_up() checks every hourly bucket once
+    with op.batch_alter_table('rollup_watermarks') as batch_op:
+        batch_op.add_column(sa.Column('transaction_count', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('rollup_watermarks') as batch_op:
+        batch_op.drop_column('transaction_count')
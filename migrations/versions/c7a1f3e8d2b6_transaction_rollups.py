@@ -0,0 +1,57 @@
+"""Add the hourly/daily transaction rollups and their watermarks
+
+Revision ID: c7a1f3e8d2b6
+Revises: 5b2e7d9c41a3
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a1f3e8d2b6'
+down_revision = '5b2e7d9c41a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Both start empty; `flask rollup-transactions` (or the ROLLUP_INTERVAL job) fills them.
+    # create_app() runs db.create_all(), so the tables may already exist when this runs
+    existing = sa.inspect(op.get_bind()).get_table_names()
+    if 'transaction_rollups' not in existing:
+        op.create_table(
+            'transaction_rollups',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('scope', sa.String(length=50), nullable=False),
+            sa.Column('granularity', sa.String(length=10), nullable=False),
+            sa.Column('bucket_start', sa.DateTime(), nullable=False),
+            sa.Column('sending_country', sa.String(length=100), nullable=False),
+            sa.Column('payout_country', sa.String(length=100), nullable=False),
+            sa.Column('channel', sa.String(length=100), nullable=False),
+            sa.Column('payment_method', sa.String(length=50), nullable=False),
+            sa.Column('transaction_count', sa.Integer(), nullable=False),
+            sa.Column('total_volume', sa.Float(), nullable=False),
+            sa.Column('suspicious_count', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint(
+                'scope', 'granularity', 'bucket_start', 'sending_country', 'payout_country', 'channel',
+                'payment_method', name='uq_transaction_rollups_bucket',
+            ),
+        )
+    if 'rollup_watermarks' not in existing:
+        op.create_table(
+            'rollup_watermarks',
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('scope', sa.String(length=50), nullable=False),
+            sa.Column('last_transaction_id', sa.Integer(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('scope'),
+        )
+
+
+def downgrade():
+    op.drop_table('rollup_watermarks')
+    op.drop_table('transaction_rollups')
@@ -0,0 +1,48 @@
+"""Add ingest_jobs for background CSV uploads
+
+Revision ID: d4e8b2a6f1c9
+Revises: c7a1f3e8d2b6
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e8b2a6f1c9'
+down_revision = 'c7a1f3e8d2b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app() runs db.create_all(), so the table may already exist when this runs
+    if 'ingest_jobs' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'ingest_jobs',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=True),
+        sa.Column('source_path', sa.String(length=1024), nullable=False),
+        sa.Column('delete_source', sa.Boolean(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('rows_read', sa.Integer(), nullable=False),
+        sa.Column('rows_inserted', sa.Integer(), nullable=False),
+        sa.Column('skipped_rows', sa.Text(), nullable=True),
+        sa.Column('chunks', sa.Integer(), nullable=False),
+        sa.Column('elapsed_seconds', sa.Float(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_ingest_jobs_status', 'ingest_jobs', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ingest_jobs_status', table_name='ingest_jobs')
+    op.drop_table('ingest_jobs')
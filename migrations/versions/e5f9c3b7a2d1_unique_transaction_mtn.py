@@ -0,0 +1,54 @@
+"""Make transactions.mtn unique and count updated/duplicate rows on ingest jobs
+
+Revision ID: e5f9c3b7a2d1
+Revises: d4e8b2a6f1c9
+Create Date: 2026-10-16 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5f9c3b7a2d1'
+down_revision = 'd4e8b2a6f1c9'
+branch_labels = None
+depends_on = None
+
+# Each MTN loaded more than once by earlier re-uploads, in one GROUP BY pass
+DUPLICATED_MTNS = (
+    "SELECT mtn, COUNT(*) FROM transactions WHERE mtn IS NOT NULL "
+    "GROUP BY mtn HAVING COUNT(*) > 1 ORDER BY COUNT(*) DESC, mtn"
+)
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    # The unique index cannot be built over repeated MTNs, and which copy to keep is the operator's call
+    duplicated = bind.execute(sa.text(DUPLICATED_MTNS)).all()
+    if duplicated:
+        sample = ", ".join(f"{mtn} ({copies} copies)" for mtn, copies in duplicated[:10])
+        raise RuntimeError(
+            f"{len(duplicated)} MTNs are loaded more than once: {sample}{', ...' if len(duplicated) > 10 else ''}. "
+            "Remove the extra copies with `flask dedupe-transactions` (see --dry-run and --keep), then upgrade again."
+        )
+
+    op.create_index('uq_transactions_mtn', 'transactions', ['mtn'], unique=True, if_not_exists=True)
+
+    # create_app() runs db.create_all(), which may have created ingest_jobs with these columns already
+    existing = {column['name'] for column in sa.inspect(bind).get_columns('ingest_jobs')}
+    if 'on_duplicate' not in existing:
+        op.add_column('ingest_jobs', sa.Column('on_duplicate', sa.String(length=10), nullable=False, server_default='skip'))
+    if 'rows_updated' not in existing:
+        op.add_column('ingest_jobs', sa.Column('rows_updated', sa.Integer(), nullable=False, server_default='0'))
+    if 'rows_duplicate' not in existing:
+        op.add_column('ingest_jobs', sa.Column('rows_duplicate', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('ingest_jobs') as batch_op:
+        batch_op.drop_column('rows_duplicate')
+        batch_op.drop_column('rows_updated')
+        batch_op.drop_column('on_duplicate')
+    op.drop_index('uq_transactions_mtn', table_name='transactions')
@@ -0,0 +1,39 @@
+"""Add sender_revisions and a revision column to sender_features
+
+Revision ID: f1a6d8c3e4b7
+Revises: e5f9c3b7a2d1
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a6d8c3e4b7'
+down_revision = 'e5f9c3b7a2d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_app() runs db.create_all(), so the table may already exist when this runs
+    inspector = sa.inspect(op.get_bind())
+    if 'sender_revisions' not in inspector.get_table_names():
+        op.create_table(
+            'sender_revisions',
+            sa.Column('sender_id', sa.String(length=50), nullable=False),
+            sa.Column('revision', sa.Integer(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('sender_id')
+        )
+    # Existing feature rows are at revision 0, like every sender without a sender_revisions row
+    if 'revision' not in {column['name'] for column in inspector.get_columns('sender_features')}:
+        with op.batch_alter_table('sender_features') as batch_op:
+            batch_op.add_column(sa.Column('revision', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('sender_features') as batch_op:
+        batch_op.drop_column('revision')
+    op.drop_table('sender_revisions')
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the hourly/daily rollups and /analytics/timeseries
+match aggregating the transactions directly, including incremental runs
+"""
+import sys
+import os
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import TransactionRollup, Transaction
+from app.utils.rollups import rebuild_rollups, roll_up
+
+app = create_app('testing')
+
+COUNTRIES = ["US", "UK", None]
+CHANNELS = ["APP", "WEB"]
+
+
+def random_transactions(rng, count, start=datetime(2024, 1, 1)):
+    return [
+        Transaction(
+            sender_id=f"S{rng.randint(0, 20)}",
+            # Some undated rows, which no bucket can hold
+            sending_date=None if rng.random() < 0.05 else start + timedelta(minutes=rng.randint(0, 60 * 24 * 10)),
+            sending_country=rng.choice(COUNTRIES),
+            payout_country=rng.choice(COUNTRIES),
+            channel=rng.choice(CHANNELS),
+            payment_method="Cash",
+            total_sale=float(rng.randint(1, 1000)),
+            sender_status_detail=rng.choice(["Genuine", "Suspicious"]),
+        )
+        for _ in range(count)
+    ]
+
+
+def reference_series(granularity, group_by=None, **filters):
+    """{(bucket, group): [count, volume, suspicious]} straight from the transactions table"""
+    series = defaultdict(lambda: [0, 0.0, 0])
+    for t in Transaction.query.filter(Transaction.sending_date.isnot(None)).all():
+        if any((getattr(t, name) or "") != value for name, value in filters.items()):
+            continue
+        bucket = t.sending_date.replace(minute=0, second=0, microsecond=0)
+        if granularity == "day":
+            bucket = bucket.replace(hour=0)
+        group = (getattr(t, group_by) or "") if group_by else None
+        totals = series[(bucket.isoformat(), group)]
+        totals[0] += 1
+        totals[1] += t.total_sale
+        totals[2] += t.sender_status_detail == "Suspicious"
+    return dict(series)
+
+
+def fetch_series(client, granularity, group_by=None, **filters):
+    params = {"granularity": granularity, "start": "2023-12-31", "end": "2024-02-01", **filters}
+    if group_by:
+        params["group_by"] = group_by
+    response = client.get("/analytics/timeseries", query_string=params)
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    return {
+        (point["bucket"], point.get(group_by) if group_by else None):
+            [point["transaction_count"], point["total_volume"], point["suspicious_count"]]
+        for point in body["series"]
+    }, body
+
+
+def assert_series_match(client):
+    for granularity, group_by, filters in [
+        ("day", None, {}),
+        ("hour", None, {}),
+        ("day", "sending_country", {}),
+        ("day", "channel", {"sending_country": "US"}),
+    ]:
+        actual, _ = fetch_series(client, granularity, group_by, **filters)
+        expected = reference_series(granularity, group_by, **filters)
+        assert actual.keys() == expected.keys(), (granularity, group_by)
+        for key, (count, volume, suspicious) in expected.items():
+            assert actual[key][0] == count and actual[key][2] == suspicious, key
+            assert abs(actual[key][1] - volume) < 1e-6, key
+
+
+def test_rollups_match_transactions():
+    """Incremental rollups in small chunks agree with aggregating the raw rows"""
+    rng = random.Random(17)
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+
+        db.session.add_all(random_transactions(rng, 300))
+        db.session.commit()
+        assert roll_up("transactions", chunk_size=70) == Transaction.query.filter(
+            Transaction.sending_date.isnot(None)).count()
+        assert_series_match(client)
+
+        # New rows, including backdated ones, are folded into the existing buckets
+        db.session.add_all(random_transactions(rng, 120))
+        db.session.commit()
+        roll_up("transactions", chunk_size=70)
+        assert_series_match(client)
+
+        # Nothing new: a second run folds nothing in and changes nothing
+        before = TransactionRollup.query.count()
+        assert roll_up("transactions") == 0
+        assert TransactionRollup.query.count() == before
+        _, body = fetch_series(client, "day")
+        assert body["rollup"]["pending_transactions"] == 0
+
+        rebuild_rollups("transactions")
+        assert_series_match(client)
+
+        assert client.get("/analytics/timeseries?granularity=week").status_code == 400
+        assert client.get("/analytics/timeseries?group_by=sender_id").status_code == 400
+        db.drop_all()
+
+
+def test_rows_committed_below_the_watermark():
+    """A row committing after a higher id was rolled up, or deleted behind its back, is reconciled on the next run"""
+    rng = random.Random(71)
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+
+        # Id 40 is taken by a transaction that has not committed yet when the rollup runs
+        late = random_transactions(rng, 80)
+        for i, transaction in enumerate(late, start=1):
+            transaction.id = i
+            transaction.sending_date = transaction.sending_date or datetime(2024, 1, 5)
+        db.session.add_all(late[:39] + late[40:])
+        db.session.commit()
+        assert roll_up("transactions") == 79
+
+        db.session.add(late[39])
+        db.session.commit()
+        assert roll_up("transactions") == 0
+        assert_series_match(client)
+
+        db.session.execute(Transaction.__table__.delete().where(Transaction.id.in_([3, 60])))
+        db.session.commit()
+        roll_up("transactions")
+        assert_series_match(client)
+
+        # Once the counts agree nothing is recomputed
+        before = [(r.bucket_start, r.transaction_count) for r in TransactionRollup.query.order_by(TransactionRollup.id)]
+        roll_up("transactions")
+        assert [(r.bucket_start, r.transaction_count)
+                for r in TransactionRollup.query.order_by(TransactionRollup.id)] == before
+        db.drop_all()
+
+
+def test_timeseries_end_date_includes_the_whole_day():
+    """A bare end date covers that day's buckets, a time stops at it; only the requested scope's backlog is counted"""
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        db.session.add_all([
+            Transaction(sending_date=datetime(2024, 1, 30, 10), total_sale=1.0, sender_status_detail="Genuine"),
+            Transaction(sending_date=datetime(2024, 1, 31, 15, 30), total_sale=2.0, sender_status_detail="Genuine"),
+        ])
+        db.session.commit()
+        roll_up("transactions")
+
+        def buckets(**params):
+            response = client.get("/analytics/timeseries", query_string={"granularity": "hour", **params})
+            assert response.status_code == 200, response.get_json()
+            return [point["bucket"] for point in response.get_json()["series"]]
+
+        assert buckets(start="2024-01-30", end="2024-01-31") == ["2024-01-30T10:00:00", "2024-01-31T15:00:00"]
+        assert buckets(start="2024-01-30", end="2024-01-31T00:00") == ["2024-01-30T10:00:00"]
+        assert buckets(start="2024-01-31", end="2024-01-31T15:00") == ["2024-01-31T15:00:00"]
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            buckets(start="2024-01-30", end="2024-01-31")
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+        assert not any("customer_transactions" in statement for statement in statements)
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    print("🔍 Testing analytics rollups...")
+    print("=" * 50)
+
+    test_rollups_match_transactions()
+    test_rows_committed_below_the_watermark()
+    test_timeseries_end_date_includes_the_whole_day()
+
+    print("=" * 50)
+    print("✅ Analytics rollups test completed!")
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Test script to verify Parquet/Arrow uploads and the /export downloads of
+transactions and customer transactions
+"""
+import sys
+import os
+import io
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import CustomerTransaction, Transaction
+from app.utils.ingest import CSV_COLUMNS, read_chunks
+from app.utils.ingest_jobs import ingest_jobs
+
+app = create_app('testing')
+
+
+def typed_frame(rng, count, start=datetime(2024, 1, 1)):
+    """What a warehouse extract looks like: real dates and amounts, and an MTN typed as a number"""
+    frame = pd.DataFrame({header: [f"{header.lower()}-{i}" for i in range(count)] for header in CSV_COLUMNS})
+    frame["SENDINGDATE"] = [start + timedelta(minutes=rng.randint(0, 10000)) for _ in range(count)]
+    frame["SENDER_DATEOFBIRTH"] = datetime(1980, 1, 1)
+    frame["COMPLIANCERELEASEDATE"] = [None if i % 3 else datetime(2024, 2, 1) for i in range(count)]
+    frame["MTN"] = range(1000, 1000 + count)
+    frame["SENDER_ID"] = [f"S{rng.randint(0, 30)}" for _ in range(count)]
+    frame["SENDER_MOBILE"] = "0712345678"
+    frame["TOTALSALE"] = [rng.randint(1, 100000) / 100 for _ in range(count)]
+    frame["Sender_Status"] = [rng.choice(["Genuine", "Suspicious"]) for _ in range(count)]
+    return frame
+
+
+def write_arrow(frame, path, stream=False):
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    with pa.OSFile(path, "wb") as sink:
+        writer = pa.ipc.new_stream(sink, table.schema) if stream else pa.ipc.new_file(sink, table.schema)
+        with writer:
+            for batch in table.to_batches(max_chunksize=70):
+                writer.write_batch(batch)
+
+
+def finish_job(client, response):
+    body = response.get_json()
+    assert response.status_code == 202, body
+    ingest_jobs.wait(body["job_id"], timeout=60)
+    db.session.expire_all()
+    return client.get(body["status_url"]).get_json()
+
+
+def test_upload_parquet_and_arrow():
+    """Columnar files load with their types, in chunks, and resume mid-file"""
+    rng = random.Random(22)
+    frame = typed_frame(rng, 400)
+    with app.app_context():
+        db.create_all()
+        app.config["INGEST_CHUNK_SIZE"] = 90
+        client = app.test_client()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "extract.parquet")
+            frame.iloc[:250].to_parquet(path, row_group_size=100, index=False)
+            body = finish_job(client, client.post("/transactions/upload-local", json={"file_path": path}))
+            assert body["status"] == "completed", body
+            assert body["rows_inserted"] == 250 and body["chunks"] == 3
+
+            # A resumed read starts mid row group and keeps file positions as the index
+            chunks = list(read_chunks(path, "parquet", chunk_size=90, offset=130))
+            assert chunks[0].index[0] == 130 and sum(len(chunk) for chunk in chunks) == 120
+
+            # Arrow IPC, file and stream flavours, and columns named like the table
+            arrow_path = os.path.join(tmp, "extract.arrow")
+            write_arrow(frame.iloc[250:320], arrow_path)
+            body = finish_job(client, client.post("/transactions/upload-local", json={"file_path": arrow_path}))
+            assert body["rows_inserted"] == 70, body
+
+            renamed = frame.iloc[320:].rename(columns=CSV_COLUMNS)
+            write_arrow(renamed, arrow_path, stream=True)
+            with open(arrow_path, "rb") as f:
+                response = client.post("/transactions/upload", content_type="multipart/form-data",
+                                       data={"file": (io.BytesIO(f.read()), "extract.arrows")})
+            body = finish_job(client, response)
+            assert body["rows_inserted"] == 80, body
+
+        assert Transaction.query.count() == 400
+        first = Transaction.query.filter_by(mtn="1000").one()
+        assert first.sending_date == frame["SENDINGDATE"][0].to_pydatetime()
+        assert first.sender_mobile == "0712345678"
+        assert first.total_sale == frame["TOTALSALE"][0]
+        assert first.compliance_release_date == datetime(2024, 2, 1)
+        assert Transaction.query.filter_by(mtn="1001").one().compliance_release_date is None
+
+        missing = frame.drop(columns=["TOTALSALE"])
+        response = client.post("/transactions/upload", content_type="multipart/form-data",
+                               data={"file": (io.BytesIO(missing.to_parquet(index=False)), "bad.parquet")})
+        assert response.status_code == 400 and "TOTALSALE" in response.get_json()["error"]
+        response = client.post("/transactions/upload", content_type="multipart/form-data",
+                               data={"file": (io.BytesIO(b"not parquet"), "bad.parquet")})
+        assert response.status_code == 400
+        db.drop_all()
+
+
+def test_export_round_trip():
+    """Exports stream every row with typed columns, in batches, and load back in"""
+    rng = random.Random(23)
+    frame = typed_frame(rng, 230)
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "extract.parquet")
+            frame.to_parquet(path, index=False)
+            finish_job(client, client.post("/transactions/upload-local", json={"file_path": path}))
+
+        response = client.get("/transactions/export?format=parquet&batch_size=100")
+        assert response.status_code == 200
+        assert response.headers["Content-Disposition"] == "attachment; filename=transactions.parquet"
+        parquet_file = pq.ParquetFile(io.BytesIO(response.data))
+        assert parquet_file.metadata.num_row_groups == 3
+        exported = parquet_file.read()
+        assert exported.num_rows == 230
+        assert exported.schema.field("sending_date").type == pa.timestamp("us")
+        assert exported.schema.field("total_sale").type == pa.float64()
+        assert exported.column("mtn").to_pylist()[:2] == ["1000", "1001"]
+
+        response = client.get("/transactions/export?format=arrow&start=2024-01-03&batch_size=50")
+        assert response.status_code == 200, response.data
+        exported = pa.ipc.open_stream(io.BytesIO(response.data)).read_all()
+        expected = Transaction.query.filter(Transaction.sending_date >= datetime(2024, 1, 3)).count()
+        assert 0 < exported.num_rows == expected < 230
+
+        # An export uploads again as is: every MTN is already there
+        response = client.post("/transactions/upload", content_type="multipart/form-data",
+                               data={"file": (io.BytesIO(client.get("/transactions/export").data), "t.parquet")})
+        body = finish_job(client, response)
+        assert body["rows_duplicate"] == 230 and body["rows_inserted"] == 0
+
+        db.session.add_all([
+            CustomerTransaction(customer_id=f"C{i}", total_sale=float(i), is_flagged=i % 2 == 0)
+            for i in range(12)
+        ])
+        db.session.commit()
+        response = client.get("/customer-transactions/export?format=arrow&batch_size=5")
+        assert response.status_code == 200
+        exported = pa.ipc.open_stream(io.BytesIO(response.data)).read_all()
+        assert exported.num_rows == 12
+        assert exported.column("is_flagged").to_pylist()[:3] == [True, False, True]
+
+        assert client.get("/transactions/export?format=xlsx").status_code == 400
+        assert client.get("/transactions/export?start=yesterday").status_code == 400
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    print("🔍 Testing Parquet/Arrow ingest and export...")
+    print("=" * 50)
+
+    test_upload_parquet_and_arrow()
+    test_export_round_trip()
+
+    print("=" * 50)
+    print("✅ Parquet/Arrow test completed!")
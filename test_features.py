@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the incremental feature engine and the NumPy feature
+kernel match the original pandas feature engineering on randomized sender
+histories
+"""
+import sys
+import os
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import SenderFeatures, Transaction
+from app.utils.feature_engine import FEATURE_NAMES, feature_engine
+from app.utils.feature_kernel import compute_features, columns_from_rows, features_for_senders
+from app.utils.feature_store import bump_sender_revisions, sender_feature_row, upsert_sender_features
+
+app = create_app('testing')
+
+
+def reference_features(transactions):
+    """The original DataFrame-based implementation of extract_features_for_sender"""
+    df = pd.DataFrame([t.to_dict() for t in transactions])
+    df['sending_date'] = pd.to_datetime(df['sending_date'])
+    # A float column even when every amount is missing, which pandas would otherwise leave as object
+    df['total_sale'] = df['total_sale'].astype(float)
+    df = df.sort_values('sending_date')
+
+    features = {}
+    features["Total Trx"] = len(df)
+    features["Total Beneficiaries"] = df['beneficiary_client_id'].nunique()
+    features["Total Paid out Trx"] = len(df[df['status'] == 'Paid'])
+
+    if len(df) >= 5:
+        df['date'] = df['sending_date'].dt.date
+        daily_counts = df.groupby('date').size()
+        top_5_daily = daily_counts.nlargest(5)
+        features["Avg Top 05 Daily Trx"] = top_5_daily.mean()
+        features["SD of Top 5 Trx_M"] = top_5_daily.std() if len(top_5_daily) > 1 else 0
+        features["SD of Top 5 Trx_N"] = np.std(top_5_daily) if len(top_5_daily) > 1 else 0
+    else:
+        features["Avg Top 05 Daily Trx"] = 1
+        features["SD of Top 5 Trx_M"] = 0
+        features["SD of Top 5 Trx_N"] = 0
+
+    volumes = df['total_sale']
+    # Missing amounts only pad nlargest/nsmallest, so a sender with none at all gets the empty-case 0
+    top_volumes = volumes.dropna().nlargest(5)
+    features["Avg top Volumes"] = top_volumes.mean() if not top_volumes.empty else 0
+    features["Std Dev Vol_M"] = volumes.std() if len(volumes) > 1 else 0
+    features["Std Dev Vol_N"] = np.std(volumes) if len(volumes) > 1 else 0
+
+    if len(df) > 1:
+        sorted_dates = sorted(df['sending_date'])
+        date_diffs = [(sorted_dates[i] - sorted_dates[i-1]).days for i in range(1, len(sorted_dates))]
+        features["Date Differences Max"] = max(date_diffs) if date_diffs else 0
+        features["Date Differences Avg"] = sum(date_diffs) / len(date_diffs) if date_diffs else 0
+    else:
+        features["Date Differences Max"] = 0
+        features["Date Differences Avg"] = 0
+
+    features["Length of Seq"] = len(df)
+
+    if len(df) >= 5:
+        atv = df['total_sale']
+        top_atv = atv.dropna().nlargest(5)
+        bottom_atv = atv.dropna().nsmallest(5)
+        features["Avg Top 05 ATV"] = top_atv.mean() if not top_atv.empty else 0
+        features["Avg Bottom ATV"] = bottom_atv.mean() if not bottom_atv.empty else 0
+        features["Std Dev ATV"] = atv.std() if len(atv) > 1 else 0
+    else:
+        features["Avg Top 05 ATV"] = 0
+        features["Avg Bottom ATV"] = 0
+        features["Std Dev ATV"] = 0
+
+    paid_count = len(df[df['status'] == 'Paid'])
+    features["Paid %"] = (paid_count / len(df)) * 100 if len(df) > 0 else 0
+
+    if len(df) > 2:
+        trx_diffs = [abs(df.iloc[i]['total_sale'] - df.iloc[i-1]['total_sale']) for i in range(1, len(df))]
+        features["SD Trx Diff"] = np.std(trx_diffs) if len(trx_diffs) > 1 else 0
+    else:
+        features["SD Trx Diff"] = 0
+
+    features["SD Trx Vol"] = df['total_sale'].std() if len(df) > 1 else 0
+    return features
+
+
+def random_history(rng, sender_id, size, start=datetime(2024, 1, 1)):
+    """Random transactions with distinct timestamps and a few busy days"""
+    seconds = rng.sample(range(0, 90 * 24 * 3600), size)
+    beneficiaries = [f"BEN{i}" for i in range(rng.randint(1, 6))] + [None]
+    return [
+        Transaction(
+            sender_id=sender_id,
+            sending_date=start + timedelta(seconds=offset),
+            total_sale=round(rng.uniform(1, 5000), 2) if rng.random() > 0.05 else None,
+            status=rng.choice(["Paid", "Paid", "Pending", "Cancelled"]),
+            beneficiary_client_id=rng.choice(beneficiaries),
+        )
+        for offset in seconds
+    ]
+
+
+def assert_close(actual, expected, label):
+    assert list(actual) == FEATURE_NAMES
+    for name in FEATURE_NAMES:
+        assert np.isclose(actual[name], expected[name], rtol=1e-9, atol=1e-9, equal_nan=True), \
+            f"{label} {name}: {actual[name]} != {expected[name]}"
+
+
+def assert_features_match(sender_id):
+    expected = reference_features(Transaction.query.filter_by(sender_id=sender_id).all())
+    assert_close(feature_engine.features_for(sender_id), expected, sender_id)
+
+
+def test_incremental_features_match_reference():
+    """Feature state built up in several catch-up steps matches a full recompute"""
+    rng = random.Random(42)
+    with app.app_context():
+        db.create_all()
+        feature_engine.invalidate()
+        for n in range(1, 40):
+            sender_id = f"S{n}"
+            history = random_history(rng, sender_id, rng.randint(1, 120))
+            history.sort(key=lambda t: t.sending_date)
+            # Insert chronologically in a few batches, checking after each one
+            step = max(1, len(history) // 3)
+            for i in range(0, len(history), step):
+                db.session.add_all(history[i:i + step])
+                db.session.commit()
+                assert_features_match(sender_id)
+        db.drop_all()
+
+
+def test_sender_without_amounts_matches_reference():
+    """A sender whose every total_sale is null gets 0 for the top/bottom means, not NaN"""
+    rng = random.Random(5)
+    with app.app_context():
+        db.create_all()
+        feature_engine.invalidate()
+        for size in (1, 3, 8):
+            sender_id = f"NULLS{size}"
+            history = random_history(rng, sender_id, size)
+            for transaction in history:
+                transaction.total_sale = None
+            db.session.add_all(history)
+            db.session.commit()
+            assert_features_match(sender_id)
+            features = feature_engine.features_for(sender_id)
+            assert features["Avg top Volumes"] == 0
+            if size >= 5:
+                assert features["Avg Top 05 ATV"] == 0 and features["Avg Bottom ATV"] == 0
+        db.drop_all()
+
+
+def test_backdated_transaction_triggers_rebuild():
+    """A transaction older than the sender's latest one is still accounted for"""
+    rng = random.Random(7)
+    with app.app_context():
+        db.create_all()
+        feature_engine.invalidate()
+        db.session.add_all(random_history(rng, "LATE", 30, start=datetime(2024, 6, 1)))
+        db.session.commit()
+        assert_features_match("LATE")
+
+        db.session.add_all(random_history(rng, "LATE", 5, start=datetime(2024, 1, 1)))
+        db.session.commit()
+        assert_features_match("LATE")
+        db.drop_all()
+
+
+def test_out_of_order_commit_and_delete_trigger_rebuild():
+    """Rows that become visible below last_id, deleted and updated rows are caught by the watermark check"""
+    rng = random.Random(11)
+    with app.app_context():
+        db.create_all()
+        feature_engine.invalidate()
+        history = sorted(random_history(rng, "ORD", 12), key=lambda t: t.sending_date)
+        for i, transaction in enumerate(history[:10]):
+            transaction.id = i + 1
+        db.session.add_all(history[:10])
+        db.session.commit()
+        assert_features_match("ORD")
+
+        # A later insert moves last_id past 15 before a long ingest chunk commits id 15
+        history[11].id = 20
+        db.session.add(history[11])
+        db.session.commit()
+        assert_features_match("ORD")
+        history[10].id = 15
+        history[10].sending_date = history[11].sending_date + timedelta(seconds=1)
+        db.session.add(history[10])
+        db.session.commit()
+        assert_features_match("ORD")
+
+        db.session.delete(history[3])
+        db.session.commit()
+        assert_features_match("ORD")
+
+        # Updated in place by another worker: neither max id nor count moves, the revision does
+        history[5].total_sale = history[5].total_sale + 5000
+        bump_sender_revisions(["ORD"])
+        db.session.commit()
+        assert_features_match("ORD")
+        db.drop_all()
+
+
+def test_kernel_matches_reference():
+    """The NumPy kernel reproduces the DataFrame implementation on random histories"""
+    rng = random.Random(1234)
+    for n in range(206):
+        history = random_history(rng, "K", rng.randint(1, 200) if n < 200 else n - 199)
+        rng.shuffle(history)
+        if n >= 200:
+            # Senders whose every amount is missing
+            for transaction in history:
+                transaction.total_sale = None
+        columns = columns_from_rows([
+            (t.sending_date, t.total_sale, t.status, t.beneficiary_client_id) for t in history
+        ])
+        assert_close(compute_features(columns), reference_features(history), f"history {n}")
+
+
+def test_features_for_senders_single_query():
+    """Batch loading groups rows per sender and leaves unknown senders, and a None sender_id, as None"""
+    rng = random.Random(99)
+    with app.app_context():
+        db.create_all()
+        histories = {f"B{n}": random_history(rng, f"B{n}", rng.randint(1, 50)) for n in range(10)}
+        for history in histories.values():
+            db.session.add_all(history)
+        db.session.commit()
+
+        db.session.add_all(random_history(rng, None, 10))
+        db.session.commit()
+
+        results = features_for_senders(list(histories) + ["missing", None])
+        assert results["missing"] is None and results[None] is None
+        for sender_id, history in histories.items():
+            assert_close(results[sender_id], reference_features(history), sender_id)
+        db.drop_all()
+
+
+def test_unknown_sender_has_no_features():
+    with app.app_context():
+        db.create_all()
+        feature_engine.invalidate()
+        assert feature_engine.features_for("nobody") is None
+        db.drop_all()
+
+
+def test_upsert_sender_features_keeps_one_row_per_sender():
+    """Repeated and bulk upserts update in place instead of adding rows"""
+    rng = random.Random(9)
+    with app.app_context():
+        db.create_all()
+        rows = [
+            sender_feature_row(f"S{i}", {name: np.float64(rng.uniform(0, 100)) for name in FEATURE_NAMES})
+            for i in range(1200)
+        ]
+        assert upsert_sender_features(rows[:10]) == 10
+        for row in rows:
+            row["total_trx"] = 7
+        # Duplicate senders in one call keep the last row
+        assert upsert_sender_features(rows + [dict(rows[0], total_trx=8)]) == len(rows)
+        db.session.commit()
+
+        assert SenderFeatures.query.count() == len(rows)
+        assert SenderFeatures.query.filter_by(sender_id="S0").one().total_trx == 8
+        assert SenderFeatures.query.filter_by(sender_id="S5").one().total_trx == 7
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    print("🔍 Testing feature engineering...")
+    print("=" * 50)
+
+    test_incremental_features_match_reference()
+    test_sender_without_amounts_matches_reference()
+    test_backdated_transaction_triggers_rebuild()
+    test_out_of_order_commit_and_delete_trigger_rebuild()
+    test_kernel_matches_reference()
+    test_features_for_senders_single_query()
+    test_unknown_sender_has_no_features()
+    test_upsert_sender_features_keeps_one_row_per_sender()
+
+    print("=" * 50)
+    print("✅ Feature engineering test completed!")
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Test script to verify chunked CSV ingestion through /transactions/upload and
+/transactions/upload-local
+"""
+import sys
+import os
+import io
+import csv
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import IngestJob, Notification, SenderFeatures, Transaction
+from app.utils.rollups import roll_up
+import pandas as pd
+from sqlalchemy import event, text
+
+from app.utils.ingest import CSV_COLUMNS, clean_transaction_data, dedupe_transactions, duplicate_mtns
+from app.utils.ingest_jobs import ingest_jobs
+
+app = create_app('testing')
+
+
+def csv_rows(rng, count, start=datetime(2024, 1, 1)):
+    rows = []
+    for i in range(count):
+        row = {header: f"{header.lower()}-{i}" for header in CSV_COLUMNS}
+        row.update({
+            "SENDINGDATE": (start + timedelta(minutes=rng.randint(0, 10000))).strftime("%Y-%m-%d %H:%M:%S"),
+            "SENDER_DATEOFBIRTH": "1980-01-01",
+            "COMPLIANCERELEASEDATE": "" if i % 3 else "2024-02-01 10:00:00",
+            "MTN": f"{i:010d}",
+            "SENDER_ID": f"S{rng.randint(0, 40)}",
+            "SENDER_MOBILE": "0712345678",
+            "TOTALSALE": f"{rng.randint(1, 100000) / 100:.2f}",
+            "Sender_Status": rng.choice(["Genuine", "Suspicious"]),
+            "SENDER_EMAIL": "",
+        })
+        rows.append(row)
+    return rows
+
+
+def write_csv(rows, headers=None):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=headers or list(CSV_COLUMNS), extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def finish_job(client, response):
+    """Wait for the job an upload queued and return its final status"""
+    body = response.get_json()
+    assert response.status_code == 202, body
+    ingest_jobs.wait(body["job_id"], timeout=60)
+    # The test's app context outlives the requests; don't read the job from its session's identity map
+    db.session.expire_all()
+    response = client.get(body["status_url"])
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_upload_local_in_chunks():
+    """Every row lands once, typed, across several committed chunks"""
+    rng = random.Random(21)
+    rows = csv_rows(rng, 1050)
+    with app.app_context():
+        db.create_all()
+        app.config["INGEST_CHUNK_SIZE"] = 200
+        client = app.test_client()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "extract.csv")
+            with open(path, "w") as f:
+                f.write(write_csv(rows))
+            response = client.post("/transactions/upload-local", json={"file_path": path})
+            body = finish_job(client, response)
+
+        assert body["status"] == "completed" and body["attempts"] == 1
+        assert body["rows_inserted"] == body["rows_read"] == len(rows)
+        assert body["chunks"] == 6 and body["skipped_rows"] == []
+
+        assert Transaction.query.count() == len(rows)
+        first = Transaction.query.filter_by(mtn="0000000000").one()
+        assert first.sending_date == datetime.strptime(rows[0]["SENDINGDATE"], "%Y-%m-%d %H:%M:%S")
+        assert first.compliance_release_date == datetime(2024, 2, 1, 10)
+        assert first.sender_mobile == "0712345678"  # Leading zero kept
+        assert first.sender_email is None
+        assert first.total_sale == float(rows[0]["TOTALSALE"])
+        assert first.sender_status_detail == rows[0]["Sender_Status"]
+        assert Transaction.query.filter_by(mtn="0000000001").one().compliance_release_date is None
+        db.drop_all()
+
+
+def test_upload_file_and_bad_header():
+    """Multipart uploads stream too; a file missing required columns is rejected up front"""
+    rng = random.Random(22)
+    with app.app_context():
+        db.create_all()
+        app.config["INGEST_CHUNK_SIZE"] = 100
+        client = app.test_client()
+
+        # No Sender_Status column: it is optional
+        headers = [h for h in CSV_COLUMNS if h != "Sender_Status"]
+        data = write_csv(csv_rows(rng, 250), headers)
+        response = client.post("/transactions/upload", data={"file": (io.BytesIO(data.encode()), "t.csv")},
+                               content_type="multipart/form-data")
+        body = finish_job(client, response)
+        assert body["status"] == "completed" and body["rows_inserted"] == 250
+        assert not os.path.exists(db.session.get(IngestJob, body["id"]).source_path)  # Spooled copy removed
+        assert Transaction.query.filter(Transaction.sender_status_detail.isnot(None)).count() == 0
+
+        data = write_csv(csv_rows(rng, 5), [h for h in headers if h != "TOTALSALE"])
+        response = client.post("/transactions/upload", data={"file": (io.BytesIO(data.encode()), "t.csv")},
+                               content_type="multipart/form-data")
+        assert response.status_code == 400
+        assert "TOTALSALE" in response.get_json()["error"]
+        assert Transaction.query.count() == 250
+        db.drop_all()
+
+
+def test_clean_transaction_data_reports_bad_rows():
+    """Unconvertible dates and amounts skip just their rows, with the same report shape as before"""
+    rows = csv_rows(random.Random(23), 6)
+    rows[1]["SENDINGDATE"] = "not a date"
+    rows[3]["TOTALSALE"] = "12,00"
+    rows[3]["COMPLIANCERELEASEDATE"] = "2024-13-45"
+    rows[4]["SENDER_DATEOFBIRTH"] = "01/02/1980"  # Not ISO: still parsed
+    rows[5]["TOTALSALE"] = ""  # Empty is NULL, not an error
+    df = pd.DataFrame(rows, dtype=str).replace("", None)
+
+    cleaned, skipped = clean_transaction_data(df)
+    assert [row["mtn"] for row in cleaned] == ["0000000000", "0000000002", "0000000004", "0000000005"]
+    assert [row["index"] for row in skipped] == [1, 3]
+    assert "SENDINGDATE" in skipped[0]["error"] and "'not a date'" in skipped[0]["error"]
+    assert "TOTALSALE" in skipped[1]["error"] and "COMPLIANCERELEASEDATE" in skipped[1]["error"]
+    assert cleaned[2]["sender_date_of_birth"] == datetime(1980, 1, 2)
+    assert cleaned[3]["total_sale"] is None
+    assert isinstance(cleaned[0]["total_sale"], float)
+
+    try:
+        clean_transaction_data(df.drop(columns=["MTN"]))
+        assert False, "A missing column must fail once, not row by row"
+    except ValueError as e:
+        assert "MTN" in str(e)
+
+
+def test_upload_skips_bad_rows():
+    """Bad rows are reported by their row in the file, across chunks, and the rest is inserted"""
+    rows = csv_rows(random.Random(24), 30)
+    rows[4]["SENDINGDATE"] = "yesterday"
+    rows[25]["TOTALSALE"] = "1.2.3"
+    with app.app_context():
+        db.create_all()
+        app.config["INGEST_CHUNK_SIZE"] = 10
+        client = app.test_client()
+        data = write_csv(rows)
+        response = client.post("/transactions/upload", data={"file": (io.BytesIO(data.encode()), "t.csv")},
+                               content_type="multipart/form-data")
+        body = finish_job(client, response)
+        assert [row["index"] for row in body["skipped_rows"]] == [4, 25]
+        assert body["rows_read"] == 30 and body["rows_inserted"] == 28 and body["rows_skipped"] == 2
+        assert Transaction.query.count() == 28
+        db.drop_all()
+
+
+def test_job_resumes_after_last_committed_chunk():
+    """A crashed or failed job carries on after the rows it committed, never inserting them twice"""
+    rng = random.Random(25)
+    rows = csv_rows(rng, 350)
+    with app.app_context():
+        db.create_all()
+        app.config["INGEST_CHUNK_SIZE"] = 100
+        client = app.test_client()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "extract.csv")
+
+            # A worker died after committing two chunks: the counters match the committed rows
+            with open(path, "w") as f:
+                f.write(write_csv(rows[:200]))
+            job = IngestJob(source_path=path, status="queued", heartbeat_at=datetime.utcnow())
+            db.session.add(job)
+            db.session.commit()
+            ingest_jobs.run(job.id)
+            job.status, job.heartbeat_at = "running", datetime.utcnow() - timedelta(hours=1)
+            db.session.commit()
+            with open(path, "w") as f:
+                f.write(write_csv(rows[:220] + [dict(rows[220], SENDINGDATE="never")] + rows[221:]))
+
+            # Not stale yet: a live job cannot be taken over
+            job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+            assert client.post(f"/transactions/upload/jobs/{job.id}/resume").status_code == 409
+            job.heartbeat_at = datetime.utcnow() - timedelta(hours=1)
+            db.session.commit()
+
+            assert client.get(f"/transactions/upload/jobs/{job.id}").get_json()["resumable"]
+            body = finish_job(client, client.post(f"/transactions/upload/jobs/{job.id}/resume"))
+            assert body["status"] == "completed" and body["attempts"] == 2
+            assert body["rows_read"] == 350 and body["rows_inserted"] == 349 and body["chunks"] == 4
+            assert [row["index"] for row in body["skipped_rows"]] == [220]
+            assert Transaction.query.count() == 349
+            assert Transaction.query.filter_by(mtn="0000000000").count() == 1
+
+            # A job whose file vanished fails and keeps its counters; it resumes once the file is back
+            os.rename(path, path + ".bak")
+            job = IngestJob(source_path=path, status="queued", heartbeat_at=datetime.utcnow())
+            db.session.add(job)
+            db.session.commit()
+            assert ingest_jobs.run(job.id).status == "failed"
+            body = client.get(f"/transactions/upload/jobs/{job.id}").get_json()
+            assert body["error"] and body["resumable"] and body["rows_read"] == 0
+            os.rename(path + ".bak", path)
+            job = ingest_jobs.run(job.id)
+            assert job.status == "completed"
+            # Same file again: every MTN is already loaded
+            assert job.rows_inserted == 0 and job.rows_duplicate == 349
+            assert Transaction.query.count() == 349
+
+        assert client.get("/transactions/upload/jobs/999").status_code == 404
+        db.drop_all()
+
+
+def test_reupload_skips_or_updates_by_mtn():
+    """Overlapping uploads never duplicate an MTN; update mode rewrites the loaded rows and what is derived from them"""
+    rng = random.Random(26)
+    rows = csv_rows(rng, 300)
+    for row in rows:
+        row["Sender_Status"] = "Genuine"
+    with app.app_context():
+        db.create_all()
+        app.config["INGEST_CHUNK_SIZE"] = 64
+        client = app.test_client()
+
+        def upload(rows, **form):
+            data = write_csv(rows)
+            return finish_job(client, client.post(
+                "/transactions/upload", content_type="multipart/form-data",
+                data={"file": (io.BytesIO(data.encode()), "t.csv"), **form},
+            ))
+
+        body = upload(rows[:200] + [rows[10]])  # An MTN repeated within the file
+        assert (body["rows_inserted"], body["rows_duplicate"], body["rows_updated"]) == (200, 1, 0)
+        assert client.get("/transactions/stats").get_json()["suspicious_transactions"] == 0
+        roll_up("transactions")
+        db.session.add(SenderFeatures(sender_id=rows[0]["SENDER_ID"], **{
+            column.name: 0 for column in SenderFeatures.__table__.columns
+            if not column.nullable and column.name not in ("id", "sender_id")
+        }))
+        db.session.commit()
+
+        # Overlapping re-upload, skipping: only the new rows land
+        body = upload(rows[100:300])
+        assert (body["rows_inserted"], body["rows_duplicate"], body["rows_updated"]) == (100, 100, 0)
+        assert Transaction.query.count() == 300
+
+        # Overlapping re-upload, updating: relabelled and repriced rows replace the loaded ones
+        changed = [dict(row, Sender_Status="Suspicious", TOTALSALE="1.00") for row in rows[:150]]
+        body = upload(changed + [dict(rows[0], MTN="NEW-1")], on_duplicate="update")
+        assert (body["rows_inserted"], body["rows_duplicate"], body["rows_updated"]) == (1, 0, 150)
+        db.session.expire_all()
+        assert Transaction.query.count() == 301
+        assert Transaction.query.filter_by(sender_status_detail="Suspicious").count() == 150
+        assert Transaction.query.filter_by(mtn=rows[0]["MTN"]).one().total_sale == 1.0
+
+        # Derived state follows: the dashboard is rebuilt, rollups swap old for new, stored features are dropped
+        stats = client.get("/transactions/stats").get_json()
+        assert stats["suspicious_transactions"] == 150 and stats["total_transactions"] == 301
+        roll_up("transactions")
+        series = client.get("/analytics/timeseries?granularity=day&start=2023-12-01&end=2024-03-01").get_json()
+        assert sum(point["transaction_count"] for point in series["series"]) == 301
+        assert sum(point["suspicious_count"] for point in series["series"]) == 150
+        expected_volume = sum(t.total_sale for t in Transaction.query.all())
+        assert abs(sum(point["total_volume"] for point in series["series"]) - expected_volume) < 1e-6
+        assert SenderFeatures.query.filter_by(sender_id=rows[0]["SENDER_ID"]).count() == 0
+
+        # Single creates are checked against the same key
+        response = client.post("/transactions/create", json={"mtn": rows[0]["MTN"], "sender_id": "S1"})
+        assert response.status_code == 409
+        assert client.post("/transactions/upload?on_duplicate=merge").status_code == 400
+        db.drop_all()
+
+
+def test_concurrent_job_loading_the_same_mtns():
+    """An MTN another job commits between the duplicate check and the insert counts as a duplicate"""
+    rng = random.Random(27)
+    rows = csv_rows(rng, 20)
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+
+        def other_job_commits_first(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("INSERT INTO transactions") and "SELECT" in statement and not raced:
+                raced.append(True)
+                cursor.execute("INSERT INTO transactions (mtn, sender_id) VALUES (?, 'OTHER')", (rows[5]["MTN"],))
+
+        raced = []
+        event.listen(db.engine, "before_cursor_execute", other_job_commits_first)
+        try:
+            body = finish_job(client, client.post(
+                "/transactions/upload", content_type="multipart/form-data",
+                data={"file": (io.BytesIO(write_csv(rows).encode()), "t.csv")},
+            ))
+        finally:
+            event.remove(db.engine, "before_cursor_execute", other_job_commits_first)
+        assert raced and body["status"] == "completed", body
+        assert (body["rows_inserted"], body["rows_duplicate"]) == (19, 1)
+        assert Transaction.query.count() == 20
+        assert Transaction.query.filter_by(mtn=rows[5]["MTN"]).one().sender_id == "OTHER"
+        db.drop_all()
+
+
+def test_dedupe_transactions():
+    """Repeated MTNs from before the unique index are folded into one copy, first or last"""
+    with app.app_context():
+        db.create_all()
+        db.session.execute(text("DROP INDEX uq_transactions_mtn"))
+        db.session.add_all([
+            Transaction(id=i + 1, mtn=mtn, sender_id="S1", total_sale=float(i + 1),
+                        sending_date=datetime(2024, 1, 1) + timedelta(hours=i))
+            for i, mtn in enumerate(["A", "B", "A", "C", "A", "B", None, None])
+        ])
+        db.session.add(Notification(user_id="1", message="m", transaction_id=5))
+        db.session.commit()
+        roll_up("transactions")
+        client = app.test_client()
+
+        assert duplicate_mtns() == [("A", 3), ("B", 2)]
+        assert dedupe_transactions("last") == 3
+        assert sorted((t.id, t.mtn) for t in Transaction.query) == [
+            (4, "C"), (5, "A"), (6, "B"), (7, None), (8, None)]
+        assert Notification.query.one().transaction_id == 5
+        assert duplicate_mtns() == [] and dedupe_transactions() == 0
+
+        db.session.add_all([Transaction(id=9, mtn="C", sender_id="S1"), Transaction(id=10, mtn="C", sender_id="S1")])
+        db.session.add(Notification(user_id="1", message="m", transaction_id=10))
+        db.session.commit()
+        assert dedupe_transactions("first") == 2
+        assert Transaction.query.filter_by(mtn="C").one().id == 4
+        assert sorted(n.transaction_id for n in Notification.query) == [4, 5]
+
+        # Derived totals no longer count the deleted copies
+        roll_up("transactions")
+        series = client.get("/analytics/timeseries?granularity=day&start=2023-12-01&end=2024-03-01").get_json()
+        assert sum(point["transaction_count"] for point in series["series"]) == 5
+        assert client.get("/transactions/stats").get_json()["total_transactions"] == 5
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    print("🔍 Testing CSV ingestion...")
+    print("=" * 50)
+
+    test_upload_local_in_chunks()
+    test_upload_file_and_bad_header()
+    test_clean_transaction_data_reports_bad_rows()
+    test_upload_skips_bad_rows()
+    test_job_resumes_after_last_committed_chunk()
+    test_reupload_skips_or_updates_by_mtn()
+    test_concurrent_job_loading_the_same_mtns()
+    test_dedupe_transactions()
+
+    print("=" * 50)
+    print("✅ CSV ingestion test completed!")
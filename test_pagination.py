@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script to verify cursor (keyset) pagination returns the same rows as
+page/per_page pagination, in the same order, including rows with no date
+"""
+import sys
+import os
+import random
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import Notification, Transaction
+
+app = create_app('testing')
+
+
+def seed(rng):
+    start = datetime(2024, 1, 1)
+    transactions = []
+    for i in range(137):
+        # Repeated dates and missing dates exercise the id tie-breaker and the NULL block
+        sending_date = None if i % 11 == 0 else start + timedelta(hours=rng.randint(0, 40))
+        transactions.append(Transaction(
+            sender_id="S1" if i % 2 else "S2",
+            beneficiary_client_id=f"B{i % 5}",
+            sending_date=sending_date,
+            status="Paid",
+            total_sale=float(i),
+        ))
+    db.session.add_all(transactions)
+    db.session.add_all([
+        Notification(user_id="7", message="m", status="Suspicious", created_at=start + timedelta(minutes=i % 7))
+        for i in range(45)
+    ])
+    db.session.commit()
+
+
+def walk_cursor(client, url, key):
+    ids, cursor = [], None
+    while True:
+        response = client.get(url + (f"&cursor={cursor}" if cursor else ""))
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        ids.extend(row["id"] for row in body[key])
+        cursor = body["next_cursor"]
+        assert body["has_next"] == (cursor is not None)
+        if cursor is None:
+            return ids
+
+
+def walk_pages(client, url, key):
+    ids, page = [], 1
+    while True:
+        body = client.get(f"{url}&page={page}").get_json()
+        if not body[key]:
+            return ids, body["total"]
+        ids.extend(row["id"] for row in body[key])
+        page += 1
+
+
+def test_cursor_pages_match_offset_pages():
+    """Walking next_cursor visits every row once, in the page/per_page order"""
+    with app.app_context():
+        db.create_all()
+        seed(random.Random(3))
+        client = app.test_client()
+
+        for url, key in [
+            ("/transactions/all_page?per_page=10", "transactions"),
+            ("/transactions/by-sender?sender_id=S1&per_page=7", "transactions"),
+            ("/transactions/by-status?status=Paid&per_page=9", "transactions"),
+            ("/transactions/notifications?user_id=7&per_page=4", "notifications"),
+        ]:
+            expected, total = walk_pages(client, url, key)
+            assert len(set(expected)) == len(expected) == total, url
+            assert walk_cursor(client, url, key) == expected, url
+        db.drop_all()
+
+
+def test_cursor_skips_count_unless_asked():
+    """Cursor requests skip COUNT(*) unless count=exact/estimate is asked for"""
+    with app.app_context():
+        db.create_all()
+        seed(random.Random(5))
+        client = app.test_client()
+
+        first = client.get("/transactions/by-sender?sender_id=S2&per_page=5").get_json()
+        assert first["total"] == 69 and first["total_is_estimate"] is False
+        cursor = first["next_cursor"]
+
+        body = client.get(f"/transactions/by-sender?sender_id=S2&per_page=5&cursor={cursor}").get_json()
+        assert body["total"] is None and body["page"] is None and len(body["transactions"]) == 5
+
+        body = client.get(f"/transactions/by-sender?sender_id=S2&per_page=5&cursor={cursor}&count=estimate").get_json()
+        assert body["total"] == 69 and body["total_is_estimate"] is True
+
+        assert client.get("/transactions/by-sender?sender_id=S2&cursor=not-a-cursor").status_code == 400
+        assert client.get("/transactions/by-sender?sender_id=S2&per_page=0").status_code == 400
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    print("🔍 Testing cursor pagination...")
+    print("=" * 50)
+
+    test_cursor_pages_match_offset_pages()
+    test_cursor_skips_count_unless_asked()
+
+    print("=" * 50)
+    print("✅ Cursor pagination test completed!")
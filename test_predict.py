@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the prediction endpoints against an in-memory database
+"""
+import sys
+import os
+import copy
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from unittest.mock import patch
+
+import joblib
+import jwt
+import numpy as np
+import sklearn
+from flask import Flask
+from sqlalchemy import event, func
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import CustomerTransaction, Notification, SenderFeatures, Transaction, User
+from app.utils.cache import Cache, MemoryBackend, SQLiteBackend, feature_cache
+from app.utils.compiled_forest import CompiledForest
+from app.utils.feature_engine import FEATURE_NAMES, feature_engine
+from app.utils.feature_store import bump_sender_revisions, feature_store_stats
+from app.utils.inference import FEATURES, InferenceModel
+from app.utils.model_registry import MODEL_FILE, ModelRegistry
+
+model = joblib.load(MODEL_FILE)
+
+app = create_app('testing')
+
+
+def seed_history(rng, sender_ids, size=20):
+    for sender_id in sender_ids:
+        for i in range(size):
+            db.session.add(Transaction(
+                sender_id=sender_id,
+                sending_date=datetime(2024, 1, 1) + timedelta(hours=rng.randint(0, 2000)),
+                total_sale=round(rng.uniform(10, 9000), 2),
+                status=rng.choice(["Paid", "Pending"]),
+                beneficiary_client_id=f"BEN{rng.randint(1, 4)}",
+            ))
+    db.session.commit()
+
+
+def payload(sender_id, amount, user_id="1"):
+    return {
+        "user_id": user_id,
+        "customer_id": f"cust-{sender_id}",
+        "sender_id": sender_id,
+        "total_sale": amount,
+        "sender_legal_name": f"Sender {sender_id}",
+    }
+
+
+def test_batch_predict_matches_single_predict():
+    """Batch scoring returns results in input order with the same labels as /predict"""
+    rng = random.Random(3)
+    with app.app_context():
+        db.create_all()
+        feature_engine.invalidate()
+        feature_cache.clear()
+        seed_history(rng, ["A", "B", "C"])
+        client = app.test_client()
+
+        items = [payload(sender_id, rng.uniform(10, 9000)) for sender_id in ["B", "A", "NEW", "B", "C"]]
+        items[2]["user_id"] = None
+
+        response = client.post("/model/predict/batch", json=items)
+        assert response.status_code == 201, response.get_json()
+        body = response.get_json()
+        assert body["count"] == len(items)
+        assert [r["index"] for r in body["results"]] == list(range(len(items)))
+        assert [r["sender_id"] for r in body["results"]] == [item["sender_id"] for item in items]
+
+        for item, result in zip(items, body["results"]):
+            single = client.post("/model/predict", json=item).get_json()
+            assert single["predicted_label"] == result["predicted_label"]
+            assert single["confidence"] == result["confidence"]
+
+        batch_ids = [r["transaction_id"] for r in body["results"]]
+        stored = CustomerTransaction.query.filter(CustomerTransaction.id.in_(batch_ids)).all()
+        assert len(stored) == len(items)
+        assert all(t.sender_status_detail in ("Genuine", "Suspicious") for t in stored)
+        # One notification per item that carried a user_id
+        assert Notification.query.filter(Notification.transaction_id.in_(batch_ids)).count() == len(items) - 1
+        db.drop_all()
+
+
+def random_feature_dicts(rng, count):
+    return [{name: rng.uniform(0, 5000) for name in FEATURE_NAMES} for _ in range(count)]
+
+
+def test_inference_model_matches_estimator():
+    """One predict_proba call gives the same labels and confidences as predict + predict_proba"""
+    rng = random.Random(11)
+    inference = InferenceModel(model)
+    features_dicts = random_feature_dicts(rng, 200)
+
+    matrix = inference.vectorize(features_dicts)
+    expected_matrix = np.array([[f.get(name, 0) for name in FEATURES] for f in features_dicts])
+    assert np.array_equal(matrix, expected_matrix)
+
+    predictions = inference.predict(features_dicts)
+    expected_labels = model.predict(expected_matrix)
+    expected_proba = model.predict_proba(expected_matrix)
+    label_map = {0: "Genuine", 1: "Suspicious"}
+    for prediction, label, proba in zip(predictions, expected_labels, expected_proba):
+        assert prediction.label == label_map[int(label)]
+        assert prediction.confidence == max(proba) * 100
+
+    stats = inference.stats.to_dict()
+    assert stats["calls"] == 1
+    assert stats["tree_traversals"] == 200 * len(model.estimators_)
+
+
+def test_compiled_forest_matches_sklearn():
+    """The flat-array evaluator returns exactly the estimator's probabilities, NaNs included"""
+    rng = np.random.default_rng(5)
+    inference = InferenceModel(model, engine="compiled")
+    for scale in (1, 100, 1e5):
+        X = rng.normal(size=(inference.compiled_max_rows, len(FEATURES))) * scale
+        X[rng.random(X.shape) < 0.05] = np.nan
+        assert np.array_equal(inference.compiled.predict_proba(X), model.predict_proba(X))
+        assert np.array_equal(inference.predict_proba(X), model.predict_proba(X))
+
+
+def test_compiled_forest_normalizes_leaf_counts():
+    """A forest from scikit-learn < 1.4, whose leaves hold weighted class counts, still gives probabilities"""
+    counts_model = copy.deepcopy(model)
+    for estimator in counts_model.estimators_:
+        tree = estimator.tree_
+        tree.value[:] = tree.value * tree.weighted_n_node_samples[:, None, None]
+    with patch.object(sklearn, "__version__", "1.3.2"):
+        compiled = CompiledForest.from_estimator(counts_model)
+    X = np.random.default_rng(6).normal(size=(64, len(FEATURES))) * 1000
+    assert np.allclose(compiled.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+
+
+def test_registry_loads_lazily_and_memory_maps_compiled_export():
+    """The first worker writes the compiled export; later ones memory-map it"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "model.compiled")
+        registries = []
+        for _ in range(2):
+            registry = ModelRegistry()
+            registry.engine = "compiled"
+            registry.mmap_mode = "r"
+            registry.cache_dir = cache_dir
+            assert not registry.loaded
+            registries.append((registry, registry.get()))
+
+        (first, first_model), (second, second_model) = registries
+        assert first.info()["versions"][0]["source"] == "pickle"
+        assert second.info()["versions"][0]["source"] == "mmap"
+        assert isinstance(second_model.compiled.value, np.memmap)
+
+        X = np.random.default_rng(2).normal(size=(300, len(FEATURES))) * 100
+        assert np.array_equal(second_model.predict_proba(X), model.predict_proba(X))
+
+
+def test_registry_hot_swap_drains_in_flight_requests():
+    """Swapping versions keeps pinned requests on the old model until they finish"""
+    with tempfile.TemporaryDirectory() as tmp:
+        model_file = os.path.join(tmp, "model.pkl")
+        shutil.copy(MODEL_FILE, model_file)
+        registry = ModelRegistry(model_file)
+        X = np.random.default_rng(4).normal(size=(10, len(FEATURES))) * 100
+
+        with registry.acquire() as old:
+            assert old.version == "v1.0" and old.in_flight == 1
+            # Replace the file on disk; the watcher check loads and activates it
+            os.utime(model_file, (old.signature["source_mtime"] + 5,) * 2)
+            new = registry.check_for_update()
+            assert registry.active_version == new.version != old.version
+            assert old.retired and old.inference is not None
+            assert np.array_equal(old.inference.predict_proba(X), model.predict_proba(X))
+        assert old.inference is None
+        assert [v["version"] for v in registry.info()["versions"]] == [new.version]
+        assert registry.check_for_update() is None
+
+        with app.app_context():
+            db.create_all()
+            with patch("app.routes.predict.model_registry", registry):
+                body = app.test_client().post("/model/predict", json=payload("A", 100)).get_json()
+            assert body["model_version"] == new.version
+            assert db.session.get(CustomerTransaction, body["transaction_id"]).model_version == new.version
+            db.drop_all()
+
+
+def test_registry_names_reloads_by_content():
+    """Rewrites within the same second get distinct versions; unchanged contents are not reloaded"""
+    with tempfile.TemporaryDirectory() as tmp:
+        model_file = os.path.join(tmp, "model.pkl")
+        shutil.copy(MODEL_FILE, model_file)
+        registry = ModelRegistry(model_file)
+        original = registry.get() and registry.active_version
+        mtime = int(os.stat(model_file).st_mtime) + 10
+
+        versions = []
+        for compress in (1, 3):
+            joblib.dump(model, model_file, compress=compress)
+            os.utime(model_file, (mtime + compress / 10,) * 2)
+            versions.append(registry.check_for_update().version)
+        assert len(set(versions)) == 2 and original not in versions
+        assert registry.active_version == versions[1]
+
+        os.utime(model_file, (mtime + 1,) * 2)  # Touched only
+        assert registry.check_for_update() is None and registry.active_version == versions[1]
+
+
+def admin_headers():
+    admin = User(email="admin@example.com", password="x", role="admin", is_approved=True)
+    db.session.add(admin)
+    db.session.commit()
+    token = jwt.encode({"user_id": admin.id}, app.config["JWT_SECRET_KEY"], algorithm="HS256")
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_model_version_routes_reach_every_worker():
+    """/model/versions loads, activates and unloads versions; the pointer file carries them to the other workers"""
+    with tempfile.TemporaryDirectory() as tmp:
+        model_file = os.path.join(tmp, "model.pkl")
+        for name in ("model.pkl", "model_v1.1.pkl", "model_v1.2.pkl"):
+            shutil.copy(MODEL_FILE, os.path.join(tmp, name))
+        first, second = ModelRegistry(model_file), ModelRegistry(model_file)
+        for registry in (first, second):
+            registry.sync_interval = 1
+            assert registry.get() is not None and registry.active_version == "v1.0"
+
+        with app.app_context():
+            db.create_all()
+            client = app.test_client()
+            headers = admin_headers()
+
+            def call(registry, method, url, **body):
+                with patch("app.routes.predict.model_registry", registry):
+                    return client.open(url, method=method, headers=headers, json=body)
+
+            assert call(first, "POST", "/model/versions", version="x", path="../model.pkl").status_code == 400
+            assert call(first, "POST", "/model/versions", version="x", path=os.path.join(tmp, "..", "m.pkl")).status_code == 400
+            assert call(first, "POST", "/model/versions", version="x", path="missing.pkl").status_code == 404
+            response = call(first, "POST", "/model/versions", version="v1.1", path="model_v1.1.pkl")
+            assert response.status_code == 201 and response.get_json()["active_version"] == "v1.0"
+            assert call(first, "POST", "/model/versions", version="v1.1", path="model_v1.1.pkl").status_code == 409
+            assert first.read_pointer() == {"active": None, "versions": {"v1.1": os.path.join(tmp, "model_v1.1.pkl")}}
+
+            # Activated through the worker that never loaded it: loaded from the published path
+            assert call(second, "POST", "/model/versions/v9/activate").status_code == 404
+            assert call(second, "POST", "/model/versions/v1.1/activate").status_code == 200
+            assert second.active_version == "v1.1"
+            assert first.sync_active_version().version == "v1.1" and first.sync_active_version() is None
+            assert call(first, "DELETE", "/model/versions/v1.1").status_code == 409  # Active
+
+            assert call(first, "POST", "/model/versions/v1.0/activate", retire_previous=True).status_code == 200
+            assert second.sync_active_version().version == "v1.0"
+            assert [v["version"] for v in second.info()["versions"]] == ["v1.0"]
+
+            # A worker starting now begins on the published version
+            call(first, "POST", "/model/versions", version="v1.2", path="model_v1.2.pkl", activate=True)
+            late = ModelRegistry(model_file)
+            late.sync_interval = 1
+            assert late.get() is not None and late.active_version == "v1.2"
+
+            assert call(first, "POST", "/model/versions/v1.0/activate").status_code == 200
+            assert call(first, "DELETE", "/model/versions/v1.2").status_code == 200
+            assert "v1.2" not in first.read_pointer()["versions"]
+            assert call(first, "DELETE", "/model/versions/v1.2").status_code == 404
+            db.drop_all()
+
+
+def test_model_watcher_starts_with_the_first_request():
+    """init_app() alone (CLI commands, migrations) starts no thread; serving a request does"""
+    with tempfile.TemporaryDirectory() as tmp:
+        watched = Flask(__name__)
+        watched.config.update(MODEL_SYNC_INTERVAL=3600, MODEL_POINTER_FILE=os.path.join(tmp, "active_model.json"))
+        registry = ModelRegistry(MODEL_FILE)
+        registry.init_app(watched)
+        assert registry._watcher is None
+        watched.test_client().get("/")
+        assert registry._watcher.is_alive() and registry._watcher_pid == os.getpid()
+
+
+def test_predict_commits_once():
+    """The scored transaction, sender features and notification share one commit"""
+    rng = random.Random(8)
+    with app.app_context():
+        db.create_all()
+        feature_engine.invalidate()
+        feature_cache.clear()
+        seed_history(rng, ["A"])
+        client = app.test_client()
+
+        commits = []
+
+        def count_commit(connection):
+            commits.append(connection)
+
+        event.listen(db.engine, "commit", count_commit)
+        try:
+            body = client.post("/model/predict", json=payload("A", 250)).get_json()
+            assert len(commits) == 1
+            transaction = db.session.get(CustomerTransaction, body["transaction_id"])
+            assert transaction.sender_status_detail == body["predicted_label"]
+            assert SenderFeatures.query.filter_by(sender_id="A").count() == 1
+            assert Notification.query.filter_by(transaction_id=transaction.id).count() == 1
+
+            # A failure storing features is confined to its savepoint
+            with patch("app.routes.predict.upsert_sender_features", side_effect=RuntimeError("boom")):
+                response = client.post("/model/predict", json=payload("A", 300, user_id=None))
+            assert response.status_code == 201
+            assert len(commits) == 2
+
+            # A failure before the commit leaves nothing behind
+            count = CustomerTransaction.query.count()
+            with patch("app.routes.predict.Notification", side_effect=RuntimeError("boom")):
+                response = client.post("/model/predict", json=payload("B", 300))
+            assert response.status_code == 500
+            assert CustomerTransaction.query.count() == count
+            assert len(commits) == 2
+        finally:
+            event.remove(db.engine, "commit", count_commit)
+        db.drop_all()
+
+
+def test_predict_serves_fresh_stored_features():
+    """Stored features are reused until the sender's history changes"""
+    rng = random.Random(12)
+    with app.app_context():
+        db.create_all()
+        feature_engine.invalidate()
+        feature_cache.clear()
+        feature_store_stats.reset()
+        feature_cache.enabled = False
+        seed_history(rng, ["A", "B"])
+        client = app.test_client()
+
+        first = client.post("/model/predict", json=payload("A", 500)).get_json()
+        assert feature_store_stats.to_dict()["missing"] == 1
+        second = client.post("/model/predict", json=payload("A", 500)).get_json()
+        assert feature_store_stats.to_dict()["hits"] == 1
+        assert second["features_used"] == first["features_used"]
+        assert second["confidence"] == first["confidence"]
+
+        db.session.add(Transaction(sender_id="A", sending_date=datetime(2024, 6, 1), total_sale=50.0,
+                                   status="Paid", beneficiary_client_id="BEN9"))
+        db.session.commit()
+        third = client.post("/model/predict", json=payload("A", 500)).get_json()
+        assert third["features_used"]["Total Trx"] == first["features_used"]["Total Trx"] + 1
+        stats = client.get("/model/feature-store/stats").get_json()["feature_store"]
+        assert (stats["hits"], stats["stale"], stats["missing"]) == (1, 1, 1)
+        assert stats["max_stale_transactions"] == 1
+
+        # Batch scoring reads the same rows: A is current again, B has none yet
+        client.post("/model/predict/batch", json=[payload("A", 10), payload("B", 10)])
+        stats = feature_store_stats.to_dict()
+        assert (stats["hits"], stats["missing"]) == (2, 2)
+        stored = SenderFeatures.query.filter_by(sender_id="B").one()
+        assert stored.last_transaction_id == db.session.query(func.max(Transaction.id)).filter_by(sender_id="B").scalar()
+        feature_cache.enabled = True
+        db.drop_all()
+
+
+def test_feature_cache_serves_hot_senders_until_invalidated():
+    """Repeat predictions skip the database; /transactions/create drops the sender's entry"""
+    rng = random.Random(13)
+    with app.app_context():
+        db.create_all()
+        feature_engine.invalidate()
+        feature_cache.clear()
+        feature_cache.stats.reset()
+        feature_store_stats.reset()
+        seed_history(rng, ["A"])
+        client = app.test_client()
+
+        first = client.post("/model/predict", json=payload("A", 500)).get_json()
+        second = client.post("/model/predict", json=payload("A", 500)).get_json()
+        assert second["features_used"] == first["features_used"]
+        assert feature_store_stats.to_dict()["reads"] == 1
+
+        response = client.post("/transactions/create", json={"sender_id": "A", "total_sale": 50.0, "status": "Paid"})
+        assert response.status_code == 201
+        third = client.post("/model/predict", json=payload("A", 500)).get_json()
+        assert third["features_used"]["Total Trx"] == first["features_used"]["Total Trx"] + 1
+
+        stats = client.get("/model/feature-store/stats").get_json()["cache"]
+        assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 2, 1)
+        db.drop_all()
+
+
+def test_update_by_another_worker_is_not_served_stale():
+    """An in-place update made elsewhere bumps the sender's revision: cache, engine state and store recompute"""
+    rng = random.Random(17)
+    with app.app_context():
+        db.create_all()
+        feature_engine.invalidate()
+        feature_cache.clear()
+        feature_cache.stats.reset()
+        seed_history(rng, ["A"])
+        client = app.test_client()
+
+        first = client.post("/model/predict", json=payload("A", 500)).get_json()["features_used"]
+        assert SenderFeatures.query.filter_by(sender_id="A").one().revision == 0
+
+        # What another worker's on_duplicate=update ingest leaves behind: this
+        # process's cache and engine state are untouched, its feature row too
+        Transaction.query.filter_by(sender_id="A").update({"total_sale": 1.0})
+        bump_sender_revisions(["A"])
+        db.session.commit()
+
+        second = client.post("/model/predict", json=payload("A", 500)).get_json()["features_used"]
+        assert second["Total Trx"] == first["Total Trx"]
+        assert second["Avg top Volumes"] == 1.0 and first["Avg top Volumes"] > 1.0
+        assert feature_cache.stats.to_dict()["stale"] == 1
+        assert SenderFeatures.query.filter_by(sender_id="A").one().revision == 1
+
+        # The batch path checks cached entries the same way
+        Transaction.query.filter_by(sender_id="A").update({"total_sale": 2.0})
+        bump_sender_revisions(["A"])
+        db.session.commit()
+        assert client.post("/model/predict/batch", json=[payload("A", 500)]).status_code == 201
+        row = SenderFeatures.query.filter_by(sender_id="A").one()
+        assert (row.avg_top_volumes, row.revision) == (2.0, 2)
+        assert feature_cache.stats.to_dict()["stale"] == 2
+        db.drop_all()
+
+
+def test_memory_cache_evicts_and_expires():
+    now = [0.0]
+    cache = Cache(MemoryBackend(max_size=2, ttl=10, clock=lambda: now[0]))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts b, the least recently used
+    assert cache.get("b") is None and cache.get("c") == 3
+    now[0] = 11
+    assert cache.get("a") is None
+    stats = cache.stats.to_dict()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["expirations"]) == (2, 2, 1, 1)
+
+
+def test_shared_cache_is_visible_across_workers_and_computes_once():
+    """Two caches on one SQLite file behave like two workers sharing the backend"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.sqlite3")
+        workers = [Cache(SQLiteBackend(path, namespace="sender_features")) for _ in range(2)]
+        workers[0].set("A", {"Total Trx": np.int64(3), "Paid %": float("nan")})
+        shared = workers[1].get("A")
+        assert shared["Total Trx"] == 3 and np.isnan(shared["Paid %"])
+        workers[1].invalidate("A")
+        assert workers[0].get("A") is None
+
+        calls = []
+        started = threading.Barrier(8)
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"value": 42}
+
+        def request(cache):
+            started.wait()
+            return cache.get_or_compute("B", compute)
+
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(request, workers * 4))
+        assert results == [{"value": 42}] * 8
+        assert len(calls) == 1
+        assert sum(cache.stats.coalesced for cache in workers) == 7
+
+
+def test_predict_without_sender_uses_default_features():
+    """Transactions without a sender are not pooled into one history; no features are stored for them"""
+    rng = random.Random(14)
+    with app.app_context():
+        db.create_all()
+        feature_engine.invalidate()
+        feature_cache.clear()
+        seed_history(rng, [None, "A"])
+        client = app.test_client()
+
+        anonymous = {key: value for key, value in payload("A", 250).items() if key != "sender_id"}
+        body = client.post("/model/predict", json=anonymous).get_json()
+        assert body["features_used"]["Total Trx"] == 1 and body["features_used"]["Avg top Volumes"] == 250
+
+        response = client.post("/model/predict/batch", json=[anonymous, payload("A", 250)])
+        assert response.status_code == 201, response.get_json()
+        assert SenderFeatures.query.filter(SenderFeatures.sender_id.is_(None)).count() == 0
+        assert SenderFeatures.query.filter_by(sender_id="A").count() == 1
+        db.drop_all()
+
+
+def test_batch_predict_rejects_non_array():
+    with app.app_context():
+        db.create_all()
+        response = app.test_client().post("/model/predict/batch", json={"sender_id": "A"})
+        assert response.status_code == 400
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    print("🔍 Testing prediction endpoints...")
+    print("=" * 50)
+
+    test_batch_predict_matches_single_predict()
+    test_inference_model_matches_estimator()
+    test_compiled_forest_matches_sklearn()
+    test_compiled_forest_normalizes_leaf_counts()
+    test_registry_loads_lazily_and_memory_maps_compiled_export()
+    test_registry_hot_swap_drains_in_flight_requests()
+    test_registry_names_reloads_by_content()
+    test_model_version_routes_reach_every_worker()
+    test_model_watcher_starts_with_the_first_request()
+    test_predict_commits_once()
+    test_predict_serves_fresh_stored_features()
+    test_feature_cache_serves_hot_senders_until_invalidated()
+    test_update_by_another_worker_is_not_served_stale()
+    test_predict_without_sender_uses_default_features()
+    test_memory_cache_evicts_and_expires()
+    test_shared_cache_is_visible_across_workers_and_computes_once()
+    test_batch_predict_rejects_non_array()
+
+    print("=" * 50)
+    print("✅ Prediction endpoint test completed!")
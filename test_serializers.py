@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the precompiled row serializers, the fast JSON
+provider and /transactions/all_stream
+"""
+import sys
+import os
+import json
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date as werkzeug_http_date
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import CustomerTransaction, Transaction
+from app.utils import serializers
+from app.utils.serializers import FastJSONProvider, http_date, row_serializer
+from sqlalchemy import event
+
+app = create_app('testing')
+
+
+def reflective(obj):
+    """What to_dict used to do"""
+    return {c.name: getattr(obj, c.name) for c in obj.__table__.columns}
+
+
+def test_row_serializers():
+    """to_dict returns exactly the columns, by name, for both models"""
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Transaction(mtn="M1", sender_id="S1", sending_date=datetime(2024, 3, 1, 9, 30), total_sale=12.5),
+            CustomerTransaction(customer_id="C1", total_sale=3.0, is_flagged=True),
+        ])
+        db.session.commit()
+        for model in (Transaction, CustomerTransaction):
+            obj = model.query.first()
+            assert obj.to_dict() == reflective(obj)
+            assert list(obj.to_dict()) == [c.name for c in model.__table__.columns]
+
+        single = row_serializer(Transaction.__table__, ["mtn"])
+        assert single(Transaction.query.first()) == {"mtn": "M1"}
+        db.drop_all()
+
+
+def test_http_date():
+    """The fast formatter matches werkzeug for naive, aware and date values"""
+    values = [
+        datetime(2024, 2, 29, 23, 59, 59, 999999),
+        datetime(1999, 12, 31, 0, 0, 1),
+        datetime(2024, 7, 4, 12, 0, tzinfo=timezone(timedelta(hours=-5))),
+        datetime(2024, 1, 1, 1, 0, tzinfo=timezone(timedelta(hours=3))),
+        date(2023, 10, 8),
+    ]
+    for day in range(7):
+        values.append(datetime(2024, 6, 10 + day, 8, 5, 3))
+    for value in values:
+        assert http_date(value) == werkzeug_http_date(value), value
+
+
+def test_json_provider():
+    """jsonify() output decodes to what Flask's own provider produces, with and without orjson"""
+    payload = {
+        "b": [datetime(2024, 5, 1, 10, 0, 0, 123), date(2024, 5, 2), None, True, 1.5],
+        "a": {"nested": Decimal("1.10"), "id": uuid.UUID(int=7)},
+        "text": "café",
+    }
+    expected = DefaultJSONProvider(app).dumps(payload)
+    for encoder in ("orjson", "stdlib"):
+        app.config["JSON_ENCODER"] = encoder
+        provider = FastJSONProvider(app)
+        assert provider.use_orjson == (encoder == "orjson" and serializers.orjson is not None)
+        assert json.loads(provider.dumps(payload)) == json.loads(expected)
+        # Sorted keys like Flask's provider
+        assert list(json.loads(provider.dumps({"z": 1, "a": 2}))) == ["a", "z"]
+        # Past orjson's 64-bit ints: handed to the stdlib encoder
+        assert provider.dumps({"big": 2 ** 70}) == '{"big": 1180591620717411303424}'
+
+    app.config["JSON_ENCODER"] = "orjson"
+    with app.test_request_context():
+        response = app.json.response({"when": datetime(2024, 5, 1, 10, 0)})
+        assert response.get_json() == {"when": "Wed, 01 May 2024 10:00:00 GMT"}
+
+
+def test_all_stream():
+    """/all_stream writes one JSON object per row with ISO dates"""
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Transaction(mtn=f"M{i}", sender_id="S1", sending_date=datetime(2024, 1, 1) + timedelta(hours=i),
+                        total_sale=float(i))
+            for i in range(1203)
+        ])
+        db.session.commit()
+        response = app.test_client().get("/transactions/all_stream")
+        assert response.status_code == 200
+        lines = response.data.decode().splitlines()
+        assert len(lines) == 1203
+        first = json.loads(lines[0])
+        expected = Transaction.query.order_by(Transaction.id).first().to_dict()
+        expected["sending_date"] = expected["sending_date"].isoformat()
+        assert first == expected
+        assert json.loads(lines[-1])["sending_date"] == "2024-02-20T02:00:00"
+        db.drop_all()
+
+
+def test_fields_projection():
+    """?fields= narrows the SELECT and the response, and keeps cursors working"""
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Transaction(mtn=f"M{i}", sender_id="S1", sender_email=f"s{i}@example.com",
+                        sending_date=datetime(2024, 1, 1) + timedelta(hours=i), total_sale=float(i))
+            for i in range(5)
+        ])
+        db.session.add_all([CustomerTransaction(customer_id=f"C{i}", is_flagged=True) for i in range(3)])
+        db.session.commit()
+        client = app.test_client()
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            body = client.get("/transactions/by-sender?sender_id=S1&per_page=2&fields=total_sale, mtn,mtn").get_json()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+        assert [set(t) for t in body["transactions"]] == [{"total_sale", "mtn"}] * 2
+        assert [t["mtn"] for t in body["transactions"]] == ["M4", "M3"]
+        page_select = [statement for statement in statements if "LIMIT" in statement]
+        assert page_select and "sender_email" not in page_select[0]
+
+        following = client.get(f"/transactions/by-sender?sender_id=S1&per_page=2&fields=mtn&cursor={body['next_cursor']}")
+        assert [t["mtn"] for t in following.get_json()["transactions"]] == ["M2", "M1"]
+
+        assert all(list(t) == ["id"] for t in client.get("/transactions/all?limit=3&fields=id").get_json())
+        assert client.get("/transactions/all_page?fields=id").get_json()["transactions"][0] == {"id": 1}
+        lines = client.get("/transactions/all_stream?fields=mtn,sending_date").data.decode().splitlines()
+        assert json.loads(lines[0]) == {"mtn": "M0", "sending_date": "2024-01-01T00:00:00"}
+
+        body = client.get("/customer-transactions/flagged?fields=customer_id,is_flagged").get_json()
+        assert body["transactions"][0] == {"customer_id": "C2", "is_flagged": True}
+
+        for url in ("/transactions/by-status?status=x&fields=mtn,nope", "/transactions/all?fields=nope",
+                    "/transactions/all_stream?fields=nope", "/customer-transactions/all?fields=nope"):
+            response = client.get(url)
+            assert response.status_code == 400 and response.get_json()["error"] == "Unknown fields: nope", url
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    print("🔍 Testing row serializers and JSON encoding...")
+    print("=" * 50)
+
+    test_row_serializers()
+    test_http_date()
+    test_json_provider()
+    test_all_stream()
+    test_fields_projection()
+
+    print("=" * 50)
+    print("✅ Serializer test completed!")
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the /stats figures, both the single grouped query and
+the incrementally maintained dashboard_stats summary, match counting the rows
+one by one
+"""
+import sys
+import os
+import random
+from unittest.mock import patch
+
+from sqlalchemy import event, insert
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import CustomerTransaction, DashboardStats, Transaction
+from app.utils import dashboard_stats
+from app.utils.dashboard_stats import reconcile_dashboard_stats, record_inserts
+from app.utils.stats import status_summary
+
+app = create_app('testing')
+
+STATUSES = ["Genuine", "Suspicious", None, "Unknown"]
+
+
+def reference_stats(rows):
+    """The figures the old per-metric queries produced"""
+    by_customer = {}
+    for customer, status, _ in rows:
+        by_customer.setdefault(customer, set()).add(status)
+    genuine_only = sum(1 for s in by_customer.values() if "Genuine" in s and "Suspicious" not in s)
+    suspicious_only = sum(1 for s in by_customer.values() if "Suspicious" in s and "Genuine" not in s)
+    return {
+        "total_transactions": len(rows),
+        "total_customers": len(by_customer),
+        "genuine_transactions": sum(1 for _, s, _ in rows if s == "Genuine"),
+        "suspicious_transactions": sum(1 for _, s, _ in rows if s == "Suspicious"),
+        "genuine_customers": genuine_only,
+        "suspicious_customers": suspicious_only,
+        "mixed_customers": len(by_customer) - genuine_only - suspicious_only,
+        "total_volume": sum(v for _, _, v in rows),
+        "genuine_volume": sum(v for _, s, v in rows if s == "Genuine"),
+        "suspicious_volume": sum(v for _, s, v in rows if s == "Suspicious"),
+    }
+
+
+def assert_stats_match(actual, expected):
+    for name, value in expected.items():
+        assert abs(actual[name] - value) < 1e-6, f"{name}: {actual[name]} != {value}"
+
+
+def random_rows(rng, count):
+    # A few transactions without a sender form their own group, as in the old DISTINCT queries
+    return [(None if rng.random() < 0.05 else f"S{rng.randint(0, 30)}",
+             rng.choice(STATUSES), float(rng.randint(1, 500))) for _ in range(count)]
+
+
+class StatementCounter:
+    def __init__(self):
+        self.statements = []
+
+    def __enter__(self):
+        event.listen(db.engine, "before_cursor_execute", self.record)
+        return self.statements
+
+    def __exit__(self, *exc):
+        event.remove(db.engine, "before_cursor_execute", self.record)
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+def test_status_summary_matches_reference():
+    """The grouped query agrees with a row-by-row count, in one SQL statement"""
+    rng = random.Random(11)
+    with app.app_context():
+        db.create_all()
+
+        # Empty tables report zeros
+        assert_stats_match(status_summary(Transaction, Transaction.sender_id), reference_stats([]))
+
+        rows = random_rows(rng, 400)
+        db.session.add_all([Transaction(sender_id=c, sender_status_detail=s, total_sale=v) for c, s, v in rows])
+        db.session.add_all([
+            CustomerTransaction(customer_id=c or "anonymous", sender_status_detail=s, total_sale=v) for c, s, v in rows
+        ])
+        db.session.commit()
+
+        with StatementCounter() as statements:
+            assert_stats_match(status_summary(Transaction, Transaction.sender_id), reference_stats(rows))
+        assert len(statements) == 1, statements
+        assert_stats_match(
+            status_summary(CustomerTransaction, CustomerTransaction.customer_id),
+            reference_stats([(c or "anonymous", s, v) for c, s, v in rows]),
+        )
+        db.drop_all()
+
+
+def test_dashboard_stats_follow_inserts():
+    """The summary row tracks inserts incrementally and matches a full recompute"""
+    rng = random.Random(13)
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+
+        # The first read builds the summary
+        assert_stats_match(client.get("/transactions/stats").get_json(), reference_stats([]))
+
+        rows = []
+        for _ in range(6):
+            batch = random_rows(rng, rng.randint(1, 80))
+            transactions = [Transaction(sender_id=c, sender_status_detail=s, total_sale=v) for c, s, v in batch]
+            db.session.add_all(transactions)
+            db.session.flush()
+            record_inserts(transactions)
+            db.session.commit()
+            rows.extend(batch)
+
+            with StatementCounter() as statements:
+                body = client.get("/transactions/stats").get_json()
+            assert len(statements) == 1, statements
+            assert_stats_match(body, reference_stats(rows))
+
+        # A genuine-only sender becomes mixed through the API write path
+        genuine_only = next(c for c in {r[0] for r in rows}
+                            if {s for cc, s, _ in rows if cc == c} & {"Genuine", "Suspicious"} == {"Genuine"})
+        response = client.post("/transactions/create", json={
+            "sender_id": genuine_only, "sender_status_detail": "Suspicious", "total_sale": 10.0,
+        })
+        assert response.status_code == 201, response.get_json()
+        rows.append((genuine_only, "Suspicious", 10.0))
+        assert_stats_match(client.get("/transactions/stats").get_json(), reference_stats(rows))
+
+        # Rows written behind the summary's back are picked up by the reconcile job
+        db.session.add(Transaction(sender_id="S999", sender_status_detail="Suspicious", total_sale=5.0))
+        db.session.commit()
+        rows.append(("S999", "Suspicious", 5.0))
+        drift = reconcile_dashboard_stats()
+        assert drift["transactions"]["total_transactions"] == (len(rows) - 1, len(rows))
+        assert_stats_match(client.get("/transactions/stats").get_json(), reference_stats(rows))
+
+        # A summary flagged stale is rebuilt on the next read
+        db.session.add(Transaction(sender_id="S998", sender_status_detail="Genuine", total_sale=1.0))
+        DashboardStats.query.filter_by(scope="transactions").update({"is_stale": True})
+        db.session.commit()
+        rows.append(("S998", "Genuine", 1.0))
+        assert_stats_match(client.get("/transactions/stats").get_json(), reference_stats(rows))
+        assert not DashboardStats.query.filter_by(scope="transactions").one().is_stale
+
+        body = client.get("/customer-transactions/stats").get_json()
+        assert body["data_source"] == "live_customer_transactions" and body["total_transactions"] == 0
+
+        # A rejected customer transaction is reported as such and leaves the summary alone
+        response = client.post("/customer-transactions/create", json={"sender_id": "S1", "total_sale": 3.0})
+        assert response.status_code == 400 and "Invalid customer transaction" in response.get_json()["error"]
+        assert not DashboardStats.query.filter_by(scope="customer_transactions").one().is_stale
+        response = client.post("/customer-transactions/create", json={"customer_id": "C1", "total_sale": 3.0})
+        assert response.status_code == 201
+        assert client.get("/customer-transactions/stats").get_json()["total_transactions"] == 1
+        db.drop_all()
+
+
+def test_concurrent_first_reads_share_the_summary_row():
+    """A summary row created by another reader between the lookup and the insert is reused, not duplicated"""
+    rng = random.Random(16)
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        rows = random_rows(rng, 40)
+        db.session.add_all([Transaction(sender_id=c, sender_status_detail=s, total_sale=v) for c, s, v in rows])
+        db.session.commit()
+
+        create_summary_row = dashboard_stats._create_summary_row
+
+        def after_another_reader(scope):
+            db.session.execute(insert(DashboardStats.__table__).values(scope=scope))
+            create_summary_row(scope)
+
+        # ON CONFLICT DO NOTHING, then the savepoint fallback used on other databases
+        for insert_row in (dashboard_stats.dialect_insert, lambda dialect_name: None):
+            with patch.object(dashboard_stats, "_create_summary_row", after_another_reader), \
+                    patch.object(dashboard_stats, "dialect_insert", insert_row):
+                response = client.get("/transactions/stats")
+            assert response.status_code == 200, response.get_json()
+            assert_stats_match(response.get_json(), reference_stats(rows))
+            assert DashboardStats.query.filter_by(scope="transactions").count() == 1
+            DashboardStats.query.delete()
+            db.session.commit()
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    print("🔍 Testing stats endpoints...")
+    print("=" * 50)
+
+    test_status_summary_matches_reference()
+    test_dashboard_stats_follow_inserts()
+    test_concurrent_first_reads_share_the_summary_row()
+
+    print("=" * 50)
+    print("✅ Stats endpoints test completed!")
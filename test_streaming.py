@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the NDJSON /all_stream endpoints of transactions and
+customer transactions: filters, batching and gzip encoding
+"""
+import sys
+import os
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from app.models import CustomerTransaction, Transaction
+
+app = create_app('testing')
+
+
+def seed():
+    db.session.add_all([
+        Transaction(mtn=f"M{i}", sender_id=f"S{i % 3}", status="Paid" if i % 2 else "Pending",
+                    sending_date=datetime(2024, 1, 1) + timedelta(days=i), total_sale=float(i))
+        for i in range(30)
+    ])
+    db.session.add_all([
+        CustomerTransaction(customer_id=f"C{i % 2}", sender_id=f"S{i}", total_sale=float(i), is_flagged=i == 3,
+                            sending_date=datetime(2024, 1, 1) + timedelta(days=i))
+        for i in range(7)
+    ])
+    db.session.commit()
+
+
+def read_lines(response, data=None):
+    assert response.status_code == 200, response.data
+    assert response.mimetype == "application/x-ndjson"
+    data = response.data if data is None else data
+    return [json.loads(line) for line in data.decode().splitlines()]
+
+
+def test_stream_filters_and_batches():
+    """Every row, in id order and in batches; filters narrow the SELECT"""
+    with app.app_context():
+        db.create_all()
+        seed()
+        client = app.test_client()
+
+        response = client.get("/transactions/all_stream?batch_size=7")
+        chunks = [chunk for chunk in response.response if chunk]
+        assert len(chunks) == 5  # 30 rows in batches of 7
+        rows = read_lines(response, b"".join(chunks))
+        assert [row["mtn"] for row in rows] == [f"M{i}" for i in range(30)]
+        assert rows[0]["sending_date"] == "2024-01-01T00:00:00" and rows[0]["total_sale"] == 0.0
+
+        rows = read_lines(client.get("/transactions/all_stream?start=2024-01-05&end=2024-01-10T00:00&sender_id=S1"))
+        assert [row["mtn"] for row in rows] == ["M4", "M7"]
+        # A bare end date includes the whole day, a time stops at it
+        db.session.add(Transaction(mtn="LATE", sender_id="S2", sending_date=datetime(2024, 1, 31, 15, 30)))
+        db.session.commit()
+        rows = read_lines(client.get("/transactions/all_stream?start=2024-01-30&end=2024-01-31&fields=mtn"))
+        assert [row["mtn"] for row in rows] == ["M29", "LATE"]
+        rows = read_lines(client.get("/transactions/all_stream?start=2024-01-30&end=2024-01-31T00:00&fields=mtn"))
+        assert [row["mtn"] for row in rows] == ["M29"]
+        rows = read_lines(client.get("/transactions/all_stream?end=2024-01-01&fields=mtn"))
+        assert [row["mtn"] for row in rows] == ["M0"]
+
+        rows = read_lines(client.get("/transactions/all_stream?status=Paid&fields=mtn"))
+        assert rows[:2] == [{"mtn": "M1"}, {"mtn": "M3"}] and len(rows) == 15
+
+        rows = read_lines(client.get("/customer-transactions/all_stream?customer_id=C1&fields=sender_id,is_flagged"))
+        assert rows == [{"sender_id": f"S{i}", "is_flagged": i == 3} for i in (1, 3, 5)]
+
+        # The Parquet/Arrow export shares the filters
+        response = client.get("/transactions/export?format=arrow&sender_id=S1&status=Paid")
+        assert response.status_code == 200, response.data
+        exported = pa.ipc.open_stream(io.BytesIO(response.data)).read_all()
+        assert exported.column("mtn").to_pylist() == ["M1", "M7", "M13", "M19", "M25"]
+
+        for url in ("/transactions/all_stream?start=yesterday", "/transactions/all_stream?customer_id=C1",
+                    "/transactions/all_stream?batch_size=0", "/customer-transactions/all_stream?fields=nope"):
+            response = client.get(url)
+            assert response.status_code == 400, url
+        db.drop_all()
+
+
+def test_stream_gzip():
+    """The body is gzip-encoded only when the client asks for it"""
+    with app.app_context():
+        db.create_all()
+        seed()
+        client = app.test_client()
+
+        plain = client.get("/transactions/all_stream")
+        assert "Content-Encoding" not in plain.headers
+
+        response = client.get("/transactions/all_stream?batch_size=4", headers={"Accept-Encoding": "gzip, deflate"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert gzip.decompress(response.data) == plain.data
+
+        response = client.get("/transactions/all_stream", headers={"Accept-Encoding": "gzip;q=0, identity"})
+        assert "Content-Encoding" not in response.headers and response.data == plain.data
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    print("🔍 Testing NDJSON streaming...")
+    print("=" * 50)
+
+    test_stream_filters_and_batches()
+    test_stream_gzip()
+
+    print("=" * 50)
+    print("✅ Streaming test completed!")